@@ -0,0 +1,87 @@
+# scripts/bench/bench_kb_docs.py
+"""
+Micro-benchmark: kb_docs reads/writes per second, legacy per-call
+connections vs the pooled WAL engine in src.agent.storage.db, plus the
+single-transaction bulk path used by law ingestion.
+
+    python scripts/bench/bench_kb_docs.py [--n 2000]
+"""
+import argparse, json, os, sqlite3, sys, tempfile, time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.agent.storage import db
+
+# ---- legacy path: what every helper did before the engine ------------------
+def _legacy_conn(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _legacy_init(path):
+    with _legacy_conn(path) as c:
+        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='schedules' LIMIT 1").fetchone()
+        c.execute("PRAGMA table_info(schedules)").fetchall()
+        c.execute("PRAGMA table_info(schedules)").fetchall()
+        c.execute("PRAGMA table_info(schedules)").fetchall()
+        c.execute(
+            "CREATE TABLE IF NOT EXISTS kb_docs (doc_id TEXT PRIMARY KEY, title TEXT, text TEXT, "
+            "meta_json TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        )
+        c.commit()
+
+def legacy_add(path, doc_id, title, text, meta):
+    _legacy_init(path)
+    with _legacy_conn(path) as c:
+        c.execute(
+            "INSERT INTO kb_docs (doc_id, title, text, meta_json) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(doc_id) DO UPDATE SET title=excluded.title, text=excluded.text, meta_json=excluded.meta_json",
+            (doc_id, title, text, json.dumps(meta, ensure_ascii=False)),
+        )
+        c.commit()
+
+def legacy_get(path, doc_id):
+    _legacy_init(path)
+    with _legacy_conn(path) as c:
+        return c.execute("SELECT doc_id, title, text, meta_json, created_at FROM kb_docs WHERE doc_id = ?", (doc_id,)).fetchone()
+
+# ---- harness -----------------------------------------------------------------
+def _rate(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    dt = time.perf_counter() - t0
+    return n / dt if dt > 0 else float("inf")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000)
+    args = ap.parse_args()
+    body = "Статья 1. Заемщик вправе досрочно погасить кредит без комиссий. " * 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        pooled_db = os.path.join(tmp, "pooled.db")
+        _legacy_init(legacy_db)
+        db.init_schema(pooled_db)
+
+        rows = [
+            ("legacy write", _rate(lambda i: legacy_add(legacy_db, f"d{i}", f"t{i}", body, {"i": i}), args.n)),
+            ("legacy read", _rate(lambda i: legacy_get(legacy_db, f"d{i % args.n}"), args.n)),
+            ("pooled write", _rate(lambda i: db.add_kb_doc(f"d{i}", f"t{i}", body, {"i": i}, db_path=pooled_db), args.n)),
+            ("pooled read", _rate(lambda i: db.get_kb_doc(f"d{i % args.n}", db_path=pooled_db), args.n)),
+        ]
+        docs = ({"doc_id": f"law#{i:05d}", "title": f"Статья {i}", "text": body, "meta": {"i": i}} for i in range(args.n))
+        t0 = time.perf_counter()
+        db.replace_law_docs("law", docs, db_path=pooled_db)
+        rows.append(("bulk write", args.n / max(time.perf_counter() - t0, 1e-9)))
+        db.close_engines()
+
+    print(f"{'path':<14}{'ops/sec':>12}   (n={args.n})")
+    for name, rate in rows:
+        print(f"{name:<14}{rate:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
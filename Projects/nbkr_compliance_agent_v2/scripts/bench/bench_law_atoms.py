@@ -0,0 +1,62 @@
+# scripts/bench/bench_law_atoms.py
+"""
+Rule-atom extraction over law blocks: re.search of every rule's ".*" pattern
+on every block (the previous _atoms_from_blocks) vs the compiled extractor
+(trigger_keywords stem prefilter + bounded patterns on the lowercased block). Blocks come from the laws/ corpus,
+repeated --repeat times; --long adds one long article line that matches no
+rule (the backtracking case).
+
+    python scripts/bench/bench_law_atoms.py [--dirs laws laws_inbox] [--repeat 50] [--long 4000]
+"""
+import argparse, json, re, sys, time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.agent.ingest.batch import resolve_law_files
+from src.agent.ingest.laws_ingest import _RULES, _atoms_from_blocks, iter_blocks, iter_law_lines
+
+NAIVE_RULES = [rx for rx, _, _, _ in _RULES]
+
+def naive(blocks):
+    return [(b.get("ref", ""), i) for b in blocks for i, rx in enumerate(NAIVE_RULES)
+            if re.search(rx, b.get("body", ""), flags=re.IGNORECASE)]
+
+def compiled(blocks):
+    titles = {}
+    out = []
+    for a in _atoms_from_blocks(blocks, "bench"):
+        out.append((a["ref"], titles.setdefault(a["title"], len(titles))))
+    return out
+
+def _sec(fn, blocks, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        res = fn(blocks)
+    return (time.perf_counter() - t0) / reps, res
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dirs", nargs="+", default=["laws"])
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--long", type=int, default=4000, help="chars of the synthetic non-matching line (0 = none)")
+    ap.add_argument("--reps", type=int, default=3)
+    args = ap.parse_args()
+
+    corpus = [b for f in resolve_law_files(args.dirs) for b in iter_blocks(iter_law_lines(f))]
+    # one line with a rule's first parts over and over but never its last one
+    long = [{"ref": "long", "body": ("досрочное " + "без условий " * args.long)[:args.long] + "\n"}] if args.long else []
+    results = []
+    for name, blocks in [("laws", corpus * args.repeat), ("laws+long", corpus * args.repeat + long)]:
+        naive_s, a = _sec(naive, blocks, args.reps)
+        comp_s, b = _sec(compiled, blocks, args.reps)
+        # rule order is the same in both, so titles map to the same indices
+        agree = sorted(a) == sorted(b)
+        results.append({"set": name, "blocks": len(blocks), "agree": agree,
+                        "naive_blocks_per_sec": round(len(blocks) / naive_s, 1),
+                        "compiled_blocks_per_sec": round(len(blocks) / comp_s, 1)})
+    print(json.dumps({"corpus_blocks": len(corpus), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# scripts/bench/bench_load.py
+"""
+Load test: N concurrent uploads to /analyze while /health is polled, to show
+that analysis no longer stalls the event loop and that overload turns into
+429s instead of unbounded latency.
+
+    uvicorn src.app:app --port 8000 &
+    python scripts/bench/bench_load.py --url http://localhost:8000 --file contracts/sample.pdf \
+        --concurrency 16 --requests 64
+
+Without --file a small text PDF is generated with PyMuPDF.
+"""
+import argparse, asyncio, json, statistics, sys, time
+from pathlib import Path
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+def _sample_pdf(pages: int = 3) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 60), f"Кредитный договор, стр. {i + 1} из {pages}")
+        page.insert_text((50, 90), "Досрочное погашение возможно при предварительном уведомлении за 30 дней.")
+        page.insert_text((50, 120), "Неустойка составляет 20% от суммы просроченного платежа.")
+    return doc.tobytes()
+
+def _pct(xs, p):
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))], 1)
+
+def _summary(lat):
+    return {"n": len(lat), "p50_ms": _pct(lat, 50), "p99_ms": _pct(lat, 99),
+            "mean_ms": round(statistics.fmean(lat), 1) if lat else None}
+
+async def _upload(client, url, payload, name, goal, sem, lat, codes):
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            r = await client.post(f"{url}/analyze", data={"goal": goal},
+                                  files={"file": (name, payload, "application/pdf")})
+            code = r.status_code
+        except httpx.HTTPError as e:
+            code = type(e).__name__
+        ms = (time.perf_counter() - t0) * 1000
+        codes[code] = codes.get(code, 0) + 1
+        if code == 200:
+            lat.append(ms)
+
+async def _poll_health(client, url, stop, lat):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            await client.get(f"{url}/health")
+            lat.append((time.perf_counter() - t0) * 1000)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.05)
+
+async def main_async(args):
+    payload = Path(args.file).read_bytes() if args.file else _sample_pdf()
+    name = Path(args.file).name if args.file else "sample.pdf"
+    sem = asyncio.Semaphore(args.concurrency)
+    analyze_lat, health_lat, codes = [], [], {}
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        poller = asyncio.create_task(_poll_health(client, args.url, stop, health_lat))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(
+            _upload(client, args.url, payload, name, args.goal, sem, analyze_lat, codes)
+            for _ in range(args.requests)
+        ))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await poller
+        try:
+            exec_stats = (await client.get(f"{args.url}/debug/exec")).json()
+        except Exception:
+            exec_stats = None
+    print(json.dumps({
+        "requests": args.requests, "concurrency": args.concurrency, "wall_s": round(wall, 2),
+        "throughput_rps": round(codes.get(200, 0) / wall, 2) if wall else None,
+        "status_codes": {str(k): v for k, v in codes.items()},
+        "analyze": _summary(analyze_lat),
+        "health_during_load": _summary(health_lat),
+        "exec": exec_stats,
+    }, ensure_ascii=False, indent=2))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--file", default=None, help="PDF to upload (default: generated sample)")
+    ap.add_argument("--goal", default="compliance check")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=64)
+    ap.add_argument("--timeout", type=float, default=300.0)
+    asyncio.run(main_async(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# scripts/bench/bench_rule_engine.py
+"""
+Rule matching cost vs rule-base size: per-rule substring checks on a freshly
+lowercased text (what PolicyPlugin.flag did) vs one RuleEngine.scan().
+
+    python scripts/bench/bench_rule_engine.py [--chars 60000] [--rules 4 40 400]
+"""
+import argparse, json, random, sys, time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.agent.rules.engine import RuleEngine
+from src.agent.storage.db import fetch_rule_atoms
+
+_ALPHA = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+def _word(rnd, lo=4, hi=10):
+    return "".join(rnd.choice(_ALPHA) for _ in range(rnd.randint(lo, hi)))
+
+def synthetic_atoms(n, rnd):
+    atoms = list(fetch_rule_atoms())
+    while len(atoms) < n:
+        atoms.append({
+            "code": f"synthetic_{len(atoms)}",
+            "hints_any": [_word(rnd) for _ in range(4)],
+            "must_not": [_word(rnd) for _ in range(2)],
+            "must_have": [f"{_word(rnd)} {_word(rnd)}"],
+        })
+    return atoms[:n]
+
+def naive(text, atoms):
+    out = {}
+    for a in atoms:
+        low = text.lower()
+        out[a["code"]] = (
+            any(t.lower() in text.lower() for t in a.get("hints_any") or []),
+            all(t.lower() in low for t in a.get("must_have") or []),
+            any(t.lower() in low for t in a.get("must_not") or []),
+        )
+    return out
+
+def compiled(engine, text, atoms):
+    scan = engine.scan(text)
+    return {a["code"]: (scan.any(a.get("hints_any") or []), scan.all(a.get("must_have") or []),
+                        scan.any(a.get("must_not") or [])) for a in atoms}
+
+def _ms(fn, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        res = fn()
+    return (time.perf_counter() - t0) * 1000 / reps, res
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chars", type=int, default=60000)
+    ap.add_argument("--rules", type=int, nargs="+", default=[4, 40, 400])
+    ap.add_argument("--reps", type=int, default=5)
+    args = ap.parse_args()
+    rnd = random.Random(7)
+    parts, size = [], 0
+    while size < args.chars:
+        w = _word(rnd, 2, 12)
+        parts.append(w)
+        size += len(w) + 1
+    text = " ".join(parts)
+    rows = []
+    for n in args.rules:
+        atoms = synthetic_atoms(n, rnd)
+        t0 = time.perf_counter()
+        engine = RuleEngine(atoms)
+        build_ms = (time.perf_counter() - t0) * 1000
+        naive_ms, a = _ms(lambda: naive(text, atoms), args.reps)
+        comp_ms, b = _ms(lambda: compiled(engine, text, atoms), args.reps)
+        assert a == b, "compiled engine disagrees with substring checks"
+        rows.append({"rules": n, "terms": len(engine.terms), "naive_ms": round(naive_ms, 2),
+                     "engine_ms": round(comp_ms, 2), "engine_build_ms": round(build_ms, 2)})
+    print(json.dumps({"chars": len(text), "results": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
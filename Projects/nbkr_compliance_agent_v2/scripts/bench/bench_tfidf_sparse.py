@@ -0,0 +1,88 @@
+# scripts/bench/bench_tfidf_sparse.py
+"""
+Dense vs sparse TF-IDF retrieval: peak RSS, index build time and query latency
+on a synthetic corpus of law-like chunks (same char_wb 3-5 / 6000-feature
+vectorizer as src.agent.rag.backend).
+
+    python scripts/bench/bench_tfidf_sparse.py --n 50000          # both modes
+    python scripts/bench/bench_tfidf_sparse.py --n 50000 --mode sparse
+
+Each mode runs in its own subprocess so ru_maxrss is not shared. The dense
+mode keeps float32 numpy rows (cheaper than the list-of-floats embed() used
+to return), so its numbers are a lower bound.
+"""
+import argparse, json, random, resource, subprocess, sys, time
+
+import numpy as np
+
+WORDS = (
+    "заемщик кредитор банк кредит договор неустойка штраф пеня комиссия погашение досрочное "
+    "процентная ставка срок платеж уведомление согласие уступка требования залог имущество "
+    "перечень расходов приложение обязательство сумма период выплаты график валюта "
+    "потребитель услуги тариф обслуживание счет процент годовых просрочка взыскание суд"
+).split()
+
+ENDINGS = ["", "а", "ы", "у", "ом", "ой", "ами", "ах", "ого", "ему", "ие", "ия", "ий"]
+
+def _corpus(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    # inflected forms + numbers/refs so char n-grams vary like real articles
+    def word():
+        r = rnd.random()
+        if r < 0.1:
+            return f"{rnd.randint(1, 999)}"
+        if r < 0.15:
+            return f"п.{rnd.randint(1, 60)}({rnd.randint(1, 12)})"
+        return rnd.choice(WORDS) + rnd.choice(ENDINGS)
+    return [" ".join(word() for _ in range(rnd.randint(40, 120))) for _ in range(n)]
+
+def _run(mode: str, n: int, queries: int) -> dict:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    docs = _corpus(n)
+    qs = _corpus(queries, seed=11)
+    vec = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), max_features=6000, dtype=np.float32)
+    vec.fit(docs[: min(n, 5000)])
+
+    t0 = time.perf_counter()
+    if mode == "dense":
+        mat = np.vstack([vec.transform(docs[i:i + 1000]).toarray() for i in range(0, n, 1000)]).astype(np.float32)
+    else:
+        mat = vec.transform(docs).tocsr()
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for q in qs:
+        if mode == "dense":
+            scores = mat @ vec.transform([q]).toarray().ravel()
+        else:
+            scores = mat @ vec.transform([q]).toarray().ravel()  # CSR x 1-D: SpMV
+        top = np.argpartition(-scores, 4)[:5]
+    per_query_ms = (time.perf_counter() - t0) / max(1, len(qs)) * 1000
+
+    return {
+        "mode": mode, "n": n, "build_s": round(build, 2), "query_ms": round(per_query_ms, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50000)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--mode", choices=["dense", "sparse", "both"], default="both")
+    args = ap.parse_args()
+
+    if args.mode != "both":
+        print(json.dumps(_run(args.mode, args.n, args.queries)))
+        return
+
+    print(f"{'mode':<8}{'n':>8}{'build s':>10}{'query ms':>10}{'peak RSS MB':>13}")
+    for mode in ("dense", "sparse"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--n", str(args.n), "--queries", str(args.queries)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{r['mode']:<8}{r['n']:>8}{r['build_s']:>10}{r['query_ms']:>10}{r['peak_rss_mb']:>13}")
+
+if __name__ == "__main__":
+    main()
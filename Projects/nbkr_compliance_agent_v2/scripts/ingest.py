@@ -0,0 +1,39 @@
+# scripts/ingest.py
+"""
+Parallel law ingestion: parse every .docx/.pdf/.txt under the given folders
+or globs in a process pool and write them to SQLite in batched transactions.
+Each file becomes one law_id (its file name without extension).
+
+    python -m scripts.ingest laws laws_inbox "crawl/**/*.txt" [--changed-only] [--workers 8]
+"""
+import argparse, json, logging, sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.agent.ingest.batch import ingest_laws
+from src.agent.storage import db
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("targets", nargs="+", help="files, folders (recursive) or glob patterns")
+    ap.add_argument("--changed-only", action="store_true", help="skip files the manifest already has at this parser version")
+    ap.add_argument("--workers", type=int, default=None, help="parser processes (default INGEST_WORKERS / CPU count)")
+    ap.add_argument("--per-file", action="store_true", help="include per-file results in the printed summary")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    def progress(f):
+        if f["status"] == "ingested":
+            print(f"  {f['law_id']}: {f['blocks']} blocks (+{f['aliased']} duplicates, {f['near']} near), {f['atoms']} atoms, "
+                  f"parsed in {f['parse_ms']:.0f} ms", flush=True)
+        else:
+            print(f"  {f['law_id']}: {f['status']} {f.get('error', '')}".rstrip(), flush=True)
+
+    db.init_schema()
+    stats = ingest_laws(args.targets, changed_only=args.changed_only, workers=args.workers, progress=progress)
+    if not args.per_file:
+        stats.pop("per_file")
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    sys.exit(1 if stats["failed"] else 0)
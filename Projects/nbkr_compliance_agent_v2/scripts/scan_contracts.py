@@ -0,0 +1,26 @@
+# scripts/scan_contracts.py
+"""
+Batch compliance sweep over a contracts folder (default SCHED_SCAN_DIR).
+Files already analysed for the same goal (by content hash) are skipped, so a
+re-run after an interruption resumes where it stopped.
+
+    python -m scripts.scan_contracts [--dir contracts] [--goal "..."] [--workers 8] [--no-resume]
+"""
+import argparse, json, logging, sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.agent.scan import scan_folder
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default=None, help="folder to scan (default SCHED_SCAN_DIR)")
+    ap.add_argument("--goal", default=None, help="analysis goal (default SCAN_GOAL)")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default SCAN_WORKERS / CPU count)")
+    ap.add_argument("--no-resume", action="store_true", help="start a new scan_runs row instead of continuing an unfinished one")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    summary = scan_folder(args.dir, goal=args.goal, workers=args.workers, resume=not args.no_resume)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
@@ -0,0 +1,53 @@
+# scripts/warm_translations.py
+"""
+Pre-translate every fixed rule template (rule titles, reasons and fixes
+from the policy rules, report/enrich.py Russian templates) into the translation memory,
+so report i18n is served from SQLite / the in-process LRU.
+
+    python -m scripts.warm_translations [--purge]
+
+--purge first drops expired rows and rows from other TM_VERSIONs.
+"""
+import argparse, asyncio, json, sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.agent.storage import db
+from src.agent.i18n import TranslationBatcher, guess_lang, translation_memory
+from src.agent.report import enrich
+from src.plugins.translate_plugin import TranslatePlugin
+
+TARGETS = ("en", "ru", "ky")
+
+def template_strings():
+    out = []
+    for a in db.fetch_rule_atoms():
+        out += [a.get("title") or "", a.get("title_ru") or ""]
+        out.append(enrich._reason_long(a.get("title_ru") or a.get("title") or "", []))
+        out += (a.get("reasons") or {}).values()
+        out += (a.get("fixes") or {}).values()
+    out += enrich.FIX_TEMPLATES.values()
+    return [s for s in dict.fromkeys(out) if s]
+
+async def warm() -> dict:
+    plugin = TranslatePlugin(None)
+    b = TranslationBatcher(plugin.translate_many)
+    strings = template_strings()
+    for s in strings:
+        for tgt in TARGETS:
+            if tgt != guess_lang(s):
+                b.add(s, tgt)
+    batches = await b.run()
+    return {"strings": len(strings), "batches": batches, "configured": plugin._configured(),
+            **translation_memory().stats()}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--purge", action="store_true")
+    args = ap.parse_args()
+    db.init_schema()
+    if args.purge:
+        print({"purged": db.tm_purge(keep_version=translation_memory().version)})
+    print(json.dumps(asyncio.run(warm()), ensure_ascii=False))
@@ -0,0 +1,159 @@
+# src/agent/execution.py
+from __future__ import annotations
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+class Overloaded(Exception):
+    """Raised when a request or a stage queue is full; the API maps it to 429."""
+
+    def __init__(self, what: str, retry_after: int = 1) -> None:
+        super().__init__(f"{what} is at capacity")
+        self.what = what
+        self.retry_after = retry_after
+
+class Stage:
+    """
+    Bounded executor for one blocking stage (OCR, policy, ...).
+
+    At most `workers` calls run at once and at most `queue` more may wait;
+    anything beyond that is rejected with Overloaded instead of piling up.
+    Coroutine functions are run to completion on a private loop inside the
+    worker thread, so async plugin methods with blocking bodies are offloaded too.
+    """
+
+    def __init__(self, name: str, workers: int, queue: int) -> None:
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.queue = max(0, int(queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"stage-{name}")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @staticmethod
+    def _call(fn: Callable[..., Any], args, kwargs) -> Any:
+        res = fn(*args, **kwargs)
+        if inspect.isawaitable(res):
+            return asyncio.run(res)
+        return res
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            if self._pending >= self.workers + self.queue:
+                self.rejected += 1
+                raise Overloaded(f"stage '{self.name}'")
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, functools.partial(self._call, fn, args, kwargs))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "queue": self.queue, "pending": self._pending, "rejected": self.rejected}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+class ExecutionLayer:
+    """
+    Stage executors plus request-level admission control.
+
+    `admit()` bounds the number of analyze requests in flight
+    (EXEC_MAX_INFLIGHT); stages are configured by EXEC_<STAGE>_WORKERS and
+    EXEC_<STAGE>_QUEUE. Page OCR itself already fans out to the process pool
+    in ocr_plugin, so the OCR stage only needs threads to keep the event loop free.
+    """
+
+    DEFAULTS = {"ocr": (2, 8), "policy": (4, 16)}
+
+    def __init__(self, max_inflight: Optional[int] = None) -> None:
+        self.max_inflight = max_inflight if max_inflight is not None else int(os.getenv("EXEC_MAX_INFLIGHT", "16"))
+        self._inflight = 0
+        self.rejected = 0
+        self._stages: Dict[str, Stage] = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str) -> Stage:
+        st = self._stages.get(name)
+        if st is None:
+            with self._lock:
+                st = self._stages.get(name)
+                if st is None:
+                    w, q = self.DEFAULTS.get(name, (2, 8))
+                    key = name.upper()
+                    st = Stage(name, int(os.getenv(f"EXEC_{key}_WORKERS", str(w))), int(os.getenv(f"EXEC_{key}_QUEUE", str(q))))
+                    self._stages[name] = st
+        return st
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await self.stage(stage).run(fn, *args, **kwargs)
+
+    def try_acquire(self) -> None:
+        """Take a request slot or raise Overloaded; pair with release(). Event loop thread only."""
+        if self._inflight >= self.max_inflight:
+            self.rejected += 1
+            raise Overloaded("analyze")
+        self._inflight += 1
+
+    def release(self) -> None:
+        self._inflight -= 1
+
+    def acquire_slot(self) -> Callable[[], None]:
+        """
+        try_acquire() for slots that outlive the handler (streamed responses):
+        returns a release callable that frees the slot once however often it
+        is called, so the body and the response wrapper may both call it.
+        """
+        self.try_acquire()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.release()
+        return release
+
+    @asynccontextmanager
+    async def admit(self):
+        self.try_acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self._inflight, "max_inflight": self.max_inflight, "rejected": self.rejected,
+            "stages": {n: s.stats() for n, s in self._stages.items()},
+        }
+
+    def shutdown(self) -> None:
+        for s in self._stages.values():
+            s.shutdown()
+        self._stages = {}
+
+_EXEC: Optional[ExecutionLayer] = None
+
+def get_execution() -> ExecutionLayer:
+    global _EXEC
+    if _EXEC is None:
+        _EXEC = ExecutionLayer()
+    return _EXEC
+
+def shutdown_execution() -> None:
+    global _EXEC
+    if _EXEC is not None:
+        _EXEC.shutdown()
+        _EXEC = None
@@ -0,0 +1,228 @@
+# src/agent/i18n.py
+from __future__ import annotations
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+import weakref
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+TranslateMany = Callable[[List[str], str], Awaitable[List[str]]]
+
+class TranslationBatcher:
+    """
+    Collects (text, target_lang) pairs for a whole report, drops duplicates,
+    and translates them as a few batched calls run concurrently under a
+    semaphore. Latency grows with the number of batches, not of flags.
+
+        b = TranslationBatcher(translate_many)
+        b.add(text, "en"); ...
+        await b.run()
+        b.get(text, "en")
+    """
+
+    def __init__(self, translate_many: TranslateMany, batch_size: int = 0, concurrency: int = 0) -> None:
+        self.translate_many = translate_many
+        self.batch_size = batch_size or int(os.getenv("TRANSLATE_BATCH_SIZE", "20"))
+        self.concurrency = concurrency or int(os.getenv("TRANSLATE_CONCURRENCY", "4"))
+        self._pending: Dict[str, List[str]] = {}
+        self._done: Dict[Tuple[str, str], str] = {}
+
+    def add(self, text: str, target: str) -> None:
+        if not text or (text, target) in self._done:
+            return
+        bucket = self._pending.setdefault(target, [])
+        if text not in bucket:
+            bucket.append(text)
+
+    def get(self, text: str, target: str) -> str:
+        if not text:
+            return text
+        return self._done.get((text, target), text)
+
+    async def run(self) -> int:
+        """Translate everything added since the last run; returns the number of batches sent."""
+        pending, self._pending = self._pending, {}
+        batches = [
+            (target, texts[i:i + self.batch_size])
+            for target, texts in pending.items()
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if not batches:
+            return 0
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(target: str, texts: List[str]) -> None:
+            async with sem:
+                try:
+                    out = await self.translate_many(texts, target)
+                except Exception:
+                    out = texts
+            for src, dst in zip(texts, out):
+                self._done[(src, target)] = dst or src
+
+        await asyncio.gather(*(one(t, xs) for t, xs in batches))
+        return len(batches)
+
+TranslateOne = Callable[[str, str], Awaitable[str]]
+
+class TranslationScheduler:
+    """
+    Runs single-text translations concurrently: identical (text, target)
+    inputs are deduped, at most `concurrency` calls run at once, and a request
+    for a pair already in flight awaits that call instead of starting another.
+    Failed calls resolve to the source text, as Orchestrator._tr does; if the
+    caller running a call is cancelled, its followers start their own.
+    """
+
+    def __init__(self, translate_fn: TranslateOne, concurrency: int = 0) -> None:
+        self.translate_fn = translate_fn
+        self.concurrency = concurrency or int(os.getenv("TRANSLATE_CONCURRENCY", "4"))
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[Tuple[str, str], "asyncio.Future[str]"] = {}
+
+    async def translate(self, text: str, target: str) -> str:
+        if not text:
+            return text
+        key = (text, target)
+        while True:
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise  # this caller was cancelled, not the call it awaited
+                # the caller running it went away (client gone, timeout): run our own
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self._sem:
+                res = await self.translate_fn(text, target)
+            fut.set_result(res or text)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception:
+            fut.set_result(text)
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+        return fut.result()
+
+    async def translate_all(self, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Translate every distinct pair concurrently; returns {(text, target): translation}."""
+        uniq = list(dict.fromkeys(p for p in pairs if p[0]))
+        res = await asyncio.gather(*(self.translate(t, tgt) for t, tgt in uniq))
+        return dict(zip(uniq, res))
+
+_SCHEDULERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[TranslateOne, TranslationScheduler]]" = weakref.WeakKeyDictionary()
+
+def scheduler_for(translate_fn: TranslateOne) -> TranslationScheduler:
+    """Scheduler shared by all callers of `translate_fn` on the running loop, so duplicates coalesce across reports."""
+    per_loop = _SCHEDULERS.setdefault(asyncio.get_running_loop(), {})
+    sch = per_loop.get(translate_fn)
+    if sch is None:
+        sch = per_loop[translate_fn] = TranslationScheduler(translate_fn)
+    return sch
+
+# ---- translation memory --------------------------------------------------------
+_WS = re.compile(r"\s+")
+_CYR = re.compile(r"[\u0400-\u04FF]")
+_KY = re.compile(r"[ңөүҢӨҮ]")
+
+def normalize_text(text: str) -> str:
+    return _WS.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+def guess_lang(text: str) -> str:
+    """Cheap source-language guess for memory keys: ky / ru / en."""
+    if _KY.search(text or ""):
+        return "ky"
+    return "ru" if _CYR.search(text or "") else "en"
+
+class TranslationMemory:
+    """
+    Translation memory: SQLite table `translation_memory` with an in-process
+    LRU in front. Keys hash (version, source lang, target lang, model,
+    normalized text); bumping TM_VERSION invalidates everything at once and
+    TM_TTL_DAYS (0 = never) expires rows individually.
+    """
+
+    def __init__(self, version: Optional[str] = None, ttl_days: Optional[float] = None,
+                 lru_size: Optional[int] = None, db_path: Optional[str] = None) -> None:
+        self.version = version or os.getenv("TM_VERSION", "1")
+        self.ttl_sec = float(ttl_days if ttl_days is not None else os.getenv("TM_TTL_DAYS", "90")) * 86400
+        self.lru_size = lru_size or int(os.getenv("TM_LRU_SIZE", "4096"))
+        self.db_path = db_path
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.db_hits = self.misses = 0
+
+    def key(self, text: str, src: str, tgt: str, model: str) -> str:
+        raw = "\x1f".join((self.version, src, tgt, model, normalize_text(text)))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, value: str) -> None:
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, texts: List[str], tgt: str, model: str, src: Optional[str] = None) -> Dict[str, str]:
+        """Known translations for `texts` (text -> translation); misses are absent."""
+        from src.agent.storage import db
+        keys = {t: self.key(t, src or guess_lang(t), tgt, model) for t in texts if t}
+        out: Dict[str, str] = {}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for t, k in keys.items():
+                v = self._lru.get(k)
+                if v is None:
+                    missing[k] = t
+                else:
+                    self._lru.move_to_end(k)
+                    out[t] = v
+            self.hits += len(out)
+        if missing:
+            found = db.tm_get_many(list(missing), db_path=self.db_path)
+            with self._lock:
+                for k, v in found.items():
+                    self._remember(k, v)
+                    out[missing[k]] = v
+                self.db_hits += len(found)
+                self.misses += len(missing) - len(found)
+        return out
+
+    def put_many(self, pairs: Dict[str, str], tgt: str, model: str, src: Optional[str] = None) -> None:
+        from src.agent.storage import db
+        expires = time.time() + self.ttl_sec if self.ttl_sec > 0 else None
+        rows = []
+        with self._lock:
+            for text, out in pairs.items():
+                if not text or not out:
+                    continue
+                sl = src or guess_lang(text)
+                k = self.key(text, sl, tgt, model)
+                self._remember(k, out)
+                rows.append((k, sl, tgt, model, self.version, text, out, expires))
+        if rows:
+            db.tm_put_many(rows, db_path=self.db_path)
+
+    def stats(self) -> Dict[str, int]:
+        return {"lru_hits": self.hits, "db_hits": self.db_hits, "misses": self.misses,
+                "lru_size": len(self._lru), "version": self.version}
+
+_TM: Optional[TranslationMemory] = None
+
+def translation_memory() -> TranslationMemory:
+    global _TM
+    if _TM is None:
+        _TM = TranslationMemory()
+    return _TM
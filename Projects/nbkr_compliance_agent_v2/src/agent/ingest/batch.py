@@ -0,0 +1,225 @@
+# src/agent/ingest/batch.py
+from __future__ import annotations
+import glob
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.agent.ingest import dedup
+from src.agent.ingest.laws_ingest import PARSER_VERSION, _READERS, law_docs
+from src.agent.storage import db
+
+log = logging.getLogger(__name__)
+
+LAW_EXTENSIONS = tuple(_READERS)
+
+def resolve_law_files(targets: Iterable[str], match: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """
+    Absolute paths of the law files named by `targets`: files, directories
+    (searched recursively) or glob patterns ("laws_inbox/*.docx", "crawl/**/*.txt").
+    `match(path)` can narrow the result further.
+    """
+    out: Dict[str, None] = {}
+    for t in targets:
+        if os.path.isdir(t):
+            found = glob.glob(os.path.join(glob.escape(t), "**", "*"), recursive=True)
+        elif glob.has_magic(t):
+            found = glob.glob(t, recursive=True)
+        else:
+            found = [t]
+        for p in sorted(found):
+            name = os.path.basename(p)
+            if name.startswith(("~$", ".")) or not name.lower().endswith(LAW_EXTENSIONS) or not os.path.isfile(p):
+                continue
+            if match is None or match(p):
+                out[os.path.abspath(p)] = None
+    return list(out)
+
+def law_id_for(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def parse_law_file(path: str, law_id: str, known_sha: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Worker side: hash and parse one file. If its hash equals `known_sha` (same
+    parser version, only the mtime moved) the parse is skipped.
+    """
+    t0 = time.perf_counter()
+    st = os.stat(path)
+    sha = _sha256(path)
+    out = {"path": path, "law_id": law_id, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+    if known_sha == sha:
+        return {**out, "unchanged": True, "parse_ms": round((time.perf_counter() - t0) * 1000, 1)}
+    atoms: List[Dict[str, Any]] = []
+    docs = list(law_docs(path, law_id, atoms))
+    if dedup.enabled():
+        for d in docs:
+            d["content_hash"], d["simhash"] = dedup.signature(d["text"])
+    return {**out, "unchanged": False, "docs": docs, "atoms": atoms,
+            "parse_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # spawned, like the job pools: callers (the laws refresher) live in a threaded app
+    ctx = multiprocessing.get_context(os.getenv("INGEST_START_METHOD", "spawn"))
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+
+def ingest_laws(targets: Iterable[str], changed_only: bool = False, workers: Optional[int] = None,
+                match: Optional[Callable[[str], bool]] = None,
+                progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Ingest every law file under `targets` (see resolve_law_files), one law_id
+    per file (its stem).
+
+    Files are hashed and parsed in INGEST_WORKERS processes (default CPU count;
+    a single file is parsed inline); this process is the only SQLite writer and
+    commits the parsed blocks, atoms and manifest rows every INGEST_BATCH_DOCS
+    blocks in one transaction. The RAG index is refreshed once at the end.
+    Blocks duplicating a block of another law exactly are stored as aliases of
+    it instead of new kb_docs rows; SimHash near duplicates are stored and
+    linked to it (LAWS_DEDUP=0 disables both).
+
+    changed_only skips files whose manifest row has the current PARSER_VERSION
+    and the same size + mtime, or the same SHA-256. `progress` is called with
+    each file's result (path, law_id, blocks, atoms, parse_ms, status).
+    """
+    t0 = time.perf_counter()
+    workers = max(1, workers or int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1))))
+    batch_docs = max(1, int(os.getenv("INGEST_BATCH_DOCS", "5000")))
+    files = resolve_law_files(targets, match)
+    manifest = db.get_law_manifest() if changed_only else {}
+    stats: Dict[str, Any] = {"files": len(files), "ingested": 0, "unchanged": 0, "failed": 0, "blocks": 0,
+                             "aliased": 0, "near": 0, "atoms": 0, "requeued": 0}
+    per_file: List[Dict[str, Any]] = []
+
+    todo: List[Tuple[str, str, Optional[str]]] = []
+    for path in files:
+        rec = manifest.get(path)
+        known_sha = None
+        if rec and rec["parser_version"] == PARSER_VERSION:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st and rec["size"] == st.st_size and rec["mtime_ns"] == st.st_mtime_ns:
+                stats["unchanged"] += 1
+                continue
+            known_sha = rec["sha256"]
+        todo.append((path, law_id_for(path), known_sha))
+
+    # laws re-ingested in this run are matched against each other in file order
+    index = dedup.DedupIndex.load(exclude_laws={t[1] for t in todo}) if todo and dedup.enabled() else None
+    pending: List[Dict[str, Any]] = []
+    pending_docs = 0
+
+    def flush() -> None:
+        nonlocal pending_docs
+        if not pending:
+            return
+        n = db.replace_law_docs_batch(
+            [(r["law_id"], r["docs"], r["atoms"], r["sigs"]) for r in pending],
+            [(r["path"], r["law_id"], r["size"], r["mtime_ns"], r["sha256"], PARSER_VERSION) for r in pending],
+        )
+        stats["requeued"] += n["requeued"]
+        pending.clear()
+        pending_docs = 0
+
+    def collect(path: str, law_id: str, res: Optional[Dict[str, Any]], err: Optional[str]) -> None:
+        nonlocal pending_docs
+        if err is not None:
+            stats["failed"] += 1
+            log.warning("[laws_ingest] %s: %s", path, err)
+            info = {"path": path, "law_id": law_id, "status": "failed", "error": err}
+        elif res["unchanged"]:
+            # touched but identical content (copy, checkout): just refresh stat fields
+            db.touch_law_manifest(path, res["size"], res["mtime_ns"])
+            stats["unchanged"] += 1
+            info = {"path": path, "law_id": law_id, "status": "unchanged", "parse_ms": res["parse_ms"]}
+        else:
+            parsed = len(res["docs"])
+            res["docs"], res["sigs"] = index.collapse(law_id, res["docs"]) if index else (res["docs"], [])
+            near = sum(1 for sig in res["sigs"] if sig[9])
+            pending.append(res)
+            pending_docs += parsed
+            stats["ingested"] += 1
+            stats["blocks"] += len(res["docs"])
+            stats["aliased"] += parsed - len(res["docs"])
+            stats["near"] += near
+            stats["atoms"] += len(res["atoms"])
+            info = {"path": path, "law_id": law_id, "status": "ingested", "blocks": len(res["docs"]),
+                    "aliased": parsed - len(res["docs"]), "near": near, "atoms": len(res["atoms"]),
+                    "parse_ms": res["parse_ms"]}
+            if pending_docs >= batch_docs:
+                flush()
+        per_file.append(info)
+        if progress:
+            progress(info)
+
+    workers = min(workers, len(todo)) or 1
+    if workers == 1:
+        for path, law_id, known_sha in todo:
+            try:
+                res = parse_law_file(path, law_id, known_sha)
+            except Exception as e:
+                collect(path, law_id, None, f"{type(e).__name__}: {e}")
+                continue
+            collect(path, law_id, res, None)
+    else:
+        with _pool(workers) as pool:
+            inflight: Dict[Future, Tuple[str, str]] = {}
+            it = iter(todo)
+            while True:
+                while len(inflight) < workers * 2:
+                    nxt = next(it, None)
+                    if nxt is None:
+                        break
+                    inflight[pool.submit(parse_law_file, *nxt)] = nxt[:2]
+                if not inflight:
+                    break
+                ready, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in ready:
+                    path, law_id = inflight.pop(fut)
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        collect(path, law_id, None, f"{type(e).__name__}: {e}")
+                        continue
+                    collect(path, law_id, res, None)
+    flush()
+
+    if stats["ingested"]:
+        try:
+            from src.agent.rag import backend as be
+            if hasattr(be, "rebuild_index_if_needed"):
+                be.rebuild_index_if_needed()
+            else:
+                be.warmup()
+        except Exception as e:
+            log.warning("[laws_ingest] index refresh failed: %s", e)
+
+    elapsed = time.perf_counter() - t0
+    parsed = [f["parse_ms"] for f in per_file if f["status"] == "ingested"]
+    stats.update({
+        "workers": workers,
+        "elapsed_sec": round(elapsed, 2),
+        "files_per_sec": round(stats["files"] / elapsed, 2) if elapsed else 0.0,
+        "blocks_per_sec": round((stats["blocks"] + stats["aliased"]) / elapsed, 1) if elapsed else 0.0,
+        "parse_ms_avg": round(sum(parsed) / len(parsed), 1) if parsed else 0.0,
+        "parse_ms_max": max(parsed) if parsed else 0.0,
+        "per_file": per_file,
+    })
+    if stats["ingested"] or stats["failed"]:
+        log.info("[laws_ingest] %d ingested (%d blocks, %d aliased, %d near duplicates, %d atoms), %d unchanged, "
+                 "%d failed in %.2fs (%.1f files/s, %.0f blocks/s)", stats["ingested"], stats["blocks"], stats["aliased"],
+                 stats["near"], stats["atoms"],
+                 stats["unchanged"], stats["failed"], elapsed, stats["files_per_sec"], stats["blocks_per_sec"])
+    return stats
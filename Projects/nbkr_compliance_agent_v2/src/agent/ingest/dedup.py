@@ -0,0 +1,134 @@
+# src/agent/ingest/dedup.py
+from __future__ import annotations
+import hashlib
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.agent.storage import db
+
+_WORD = re.compile(r"\w+")
+_SHIFTS = np.arange(64, dtype=np.uint64)
+_MASK = (1 << 64) - 1
+
+def enabled() -> bool:
+    return os.getenv("LAWS_DEDUP", "1").lower() not in ("0", "false", "no")
+
+def content_hash(text: str) -> str:
+    """Hash of the text with case and whitespace normalised."""
+    return hashlib.sha256(" ".join((text or "").lower().split()).encode("utf-8")).hexdigest()
+
+def simhash(text: str, k: int = 3, min_tokens: Optional[int] = None) -> Optional[int]:
+    """
+    64-bit SimHash over word k-shingles (signed, to fit an SQLite INTEGER), or
+    None for blocks shorter than LAWS_DEDUP_MIN_TOKENS words, where a few
+    changed words already flip many bits.
+    """
+    if min_tokens is None:
+        min_tokens = int(os.getenv("LAWS_DEDUP_MIN_TOKENS", "30"))
+    toks = _WORD.findall((text or "").lower())
+    if len(toks) < max(min_tokens, k):
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(" ".join(toks[i:i + k]).encode("utf-8"), digest_size=8).digest(), "little")
+         for i in range(len(toks) - k + 1)),
+        dtype=np.uint64,
+    )
+    ones = ((hashes[:, None] >> _SHIFTS) & np.uint64(1)).sum(axis=0)
+    fp = int(sum(1 << i for i in np.flatnonzero(ones * 2 > len(hashes))))
+    return fp - (1 << 64) if fp >= 1 << 63 else fp
+
+def signature(text: str) -> Tuple[str, Optional[int]]:
+    return content_hash(text), simhash(text)
+
+def _bands(fp: int, n: int) -> List[Tuple[int, int]]:
+    # n disjoint bit ranges: two fingerprints within n-1 bits agree on at least one
+    fp &= _MASK
+    edges = [round(64 * i / n) for i in range(n + 1)]
+    return [(i, (fp >> edges[i]) & ((1 << (edges[i + 1] - edges[i])) - 1)) for i in range(n)]
+
+class DedupIndex:
+    """
+    Law blocks already in kb_docs, looked up by exact content hash and by
+    SimHash within LAWS_DEDUP_MAX_BITS bits (banded, so a lookup only compares
+    against fingerprints sharing a band). Matches are only taken from other
+    laws: a law never collapses its own blocks.
+
+    Exact duplicates are collapsed, and so are near duplicates within
+    LAWS_DEDUP_COLLAPSE_BITS bits (default 0: the same word sequence, differing
+    only in punctuation, case or spacing; negative collapses exact ones only).
+    A wider SimHash hit is merely similar text, and a few bits can be a changed
+    term or article number ("шести" -> "двенадцати месяцев"), so those keep
+    their own kb_docs row and only record the block they resemble.
+    """
+
+    def __init__(self, max_bits: Optional[int] = None, collapse_bits: Optional[int] = None) -> None:
+        self.max_bits = max(0, max_bits if max_bits is not None else int(os.getenv("LAWS_DEDUP_MAX_BITS", "6")))
+        self.collapse_bits = (collapse_bits if collapse_bits is not None
+                              else int(os.getenv("LAWS_DEDUP_COLLAPSE_BITS", "0")))
+        self.n_bands = self.max_bits + 1
+        self.exact: Dict[str, Tuple[str, str]] = {}
+        self.bands: Dict[Tuple[int, int], List[Tuple[int, str, str]]] = {}
+
+    @classmethod
+    def load(cls, exclude_laws: Iterable[str] = ()) -> "DedupIndex":
+        """Index of the stored blocks, minus laws about to be re-ingested."""
+        skip: Set[str] = set(exclude_laws)
+        idx = cls()
+        for doc_id, law_id, chash, fp in db.law_doc_signatures():
+            if law_id not in skip:
+                idx.add(doc_id, law_id, chash, fp)
+        return idx
+
+    def add(self, doc_id: str, law_id: str, chash: Optional[str], fp: Optional[int]) -> None:
+        if chash and chash not in self.exact:
+            self.exact[chash] = (doc_id, law_id)
+        if fp is not None:
+            for band in _bands(fp, self.n_bands):
+                self.bands.setdefault(band, []).append((fp & _MASK, doc_id, law_id))
+
+    def match(self, law_id: str, chash: Optional[str], fp: Optional[int]) -> Optional[Tuple[str, str, int]]:
+        """(canonical doc_id, "exact" | "near", bit distance) of a stored duplicate, or None."""
+        hit = self.exact.get(chash) if chash else None
+        if hit and hit[1] != law_id:
+            return hit[0], "exact", 0
+        if fp is None:
+            return None
+        fp &= _MASK
+        best = None
+        for band in _bands(fp, self.n_bands):
+            for other, doc_id, other_law in self.bands.get(band, ()):
+                if other_law == law_id:
+                    continue
+                d = bin(fp ^ other).count("1")
+                if d <= self.max_bits and (best is None or d < best[2]):
+                    best = (doc_id, "near", d)
+        return best
+
+    def collapse(self, law_id: str, docs: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple]]:
+        """
+        Split one law's docs into those to store and law_doc_sigs rows for all
+        of them; exact duplicates and near ones within collapse_bits get the
+        canonical doc_id instead of a kb_docs row, other near duplicates are
+        stored and linked to the block they resemble.
+        Docs may carry precomputed "content_hash"/"simhash" (see signature()).
+        """
+        kept: List[Dict[str, Any]] = []
+        sigs: List[Tuple] = []
+        for d in docs:
+            if "content_hash" in d:
+                chash, fp = d["content_hash"], d.get("simhash")
+            else:
+                chash, fp = signature(d.get("text", ""))
+            meta = d.get("meta") or {}
+            m = self.match(law_id, chash, fp)
+            if m and (m[1] == "exact" or m[2] <= self.collapse_bits):
+                sigs.append((d["doc_id"], law_id, chash, fp, m[0], m[1], m[2], meta.get("ref"), meta.get("source"), None))
+                continue
+            kept.append(d)
+            near = m or (None, None, None)
+            sigs.append((d["doc_id"], law_id, chash, fp, None, near[1], near[2], meta.get("ref"), meta.get("source"), near[0]))
+            self.add(d["doc_id"], law_id, chash, fp)
+        return kept, sigs
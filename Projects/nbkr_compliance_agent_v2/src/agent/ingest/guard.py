@@ -1,26 +1,80 @@
-import os, re
+import logging, os, threading
 from pathlib import Path
+from typing import Dict, Optional
 from src.agent.storage import db
-from src.agent.ingest.laws_ingest import ingest_law_file
+from src.agent.ingest.batch import ingest_laws, resolve_law_files
+
+log = logging.getLogger(__name__)
+
+_LOCK = threading.Lock()
+_refresher: Optional[threading.Thread] = None
+_stop = threading.Event()
 
 def _looks_like_law_file(stem: str) -> bool:
     # strict version: only auto-ingest files starting with "law"
     return stem.lower().startswith("law")
 
-def ensure_laws_up_to_date(laws_dir: str | None = None) -> None:
+def ensure_laws_up_to_date(laws_dir: str | None = None) -> Dict[str, int]:
     """
-    Safe to call on every request/scan: ingests any law*.{docx,pdf,txt}
-    found under laws_dir (env LAWS_DIR or ./laws).
+    Ingests any new or changed law*.{docx,pdf,txt} found under laws_dir
+    (env LAWS_DIR or ./laws) through ingest_laws(changed_only=True): files
+    are compared against the persisted manifest by (size, mtime) first and by
+    SHA-256 only when those differ, so an unchanged corpus costs one stat()
+    per file; changed ones are parsed in parallel and written in one batch.
     """
-    db.init_schema()
     base = laws_dir or os.getenv("LAWS_DIR", "laws")
     root = Path(base)
     root.mkdir(exist_ok=True)
-    for fp in root.rglob("*"):
-        if not fp.is_file(): continue
-        if fp.suffix.lower() not in (".docx", ".pdf", ".txt"): continue
-        if not _looks_like_law_file(fp.stem): continue
+    with _LOCK:
+        files = resolve_law_files([str(root)], lambda p: _looks_like_law_file(Path(p).stem))
+        res = ingest_laws(files, changed_only=True)
+        seen = set(files)
+        # manifest keys are abspath()s (resolve_law_files), so no symlink resolution here either
+        root_key = os.path.abspath(str(root))
+        gone = [p for p in db.get_law_manifest() if p.startswith(root_key + os.sep) and p not in seen]
+        if db.delete_law_manifest(gone):
+            _refresh_index()
+
+    return {"checked": res["files"], "ingested": res["ingested"], "unchanged": res["unchanged"],
+            "failed": res["failed"], "removed": len(gone)}
+
+def _refresh_index() -> None:
+    try:
+        from src.agent.rag import backend as be
+        be.rebuild_index_if_needed()
+    except Exception as e:
+        log.warning("[laws_ingest] index refresh failed: %s", e)
+
+def _refresh_loop(laws_dir: Optional[str], interval_sec: float) -> None:
+    while not _stop.is_set():
         try:
-            ingest_law_file(str(fp), fp.stem)
+            ensure_laws_up_to_date(laws_dir)
         except Exception as e:
-            print(f"[laws_ingest][WARN] {fp}: {e}")
+            log.warning("[laws_ingest] refresh failed: %s", e)
+        # also embeds kb_docs written outside laws/ (crawler, API); a no-op when nothing changed
+        _refresh_index()
+        _stop.wait(interval_sec)
+
+def start_laws_refresher(laws_dir: str | None = None, interval_sec: float = 60.0) -> threading.Thread:
+    """
+    Run ensure_laws_up_to_date() and a vector store sync in a daemon thread:
+    once immediately, then every interval_sec. Keeps law ingestion and
+    embedding off the request path.
+    """
+    global _refresher
+    if _refresher is not None and _refresher.is_alive():
+        return _refresher
+    _stop.clear()
+    _refresher = threading.Thread(
+        target=_refresh_loop, args=(laws_dir, max(1.0, float(interval_sec))),
+        name="laws-refresher", daemon=True,
+    )
+    _refresher.start()
+    return _refresher
+
+def stop_laws_refresher(timeout: float = 5.0) -> None:
+    global _refresher
+    _stop.set()
+    if _refresher is not None:
+        _refresher.join(timeout)
+    _refresher = None
@@ -1,48 +1,189 @@
-from typing import List, Dict
-import os, re
-from docx import Document            # pip install python-docx
+from typing import Dict, Iterable, Iterator, List, Optional
+import os, re, zipfile
+import xml.etree.ElementTree as ET
 import fitz                          # pip install PyMuPDF
+from src.agent.ingest import dedup
 from src.agent.storage import db
 
-def _read_docx(path: str) -> str:
-    doc = Document(path)
-    return "\n".join(p.text for p in doc.paragraphs)
+# Bump whenever block or atom extraction changes so the manifest re-ingests every file.
+PARSER_VERSION = "7"
 
-def _read_pdf(path: str) -> str:
+# ---- streaming readers ------------------------------------------------------------
+# docx/pdf readers yield paragraphs/pages; _lines() splits them exactly as
+# "\n".join(pieces).splitlines() would, one piece at a time.
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_RUN_CHARS = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+def _iter_docx(path: str) -> Iterator[str]:
+    """
+    Text of each body-level paragraph (python-docx's doc.paragraphs / .text,
+    hyperlink runs included), streamed from word/document.xml with iterparse;
+    finished paragraphs and tables are dropped, so memory stays flat.
+    """
+    with zipfile.ZipFile(path) as z, z.open("word/document.xml") as f:
+        stack: List[str] = []
+        body = None
+        buf: List[str] = []
+        for ev, el in ET.iterparse(f, events=("start", "end")):
+            if ev == "start":
+                stack.append(el.tag)
+                if el.tag == _W + "body":
+                    body = el
+                continue
+            tag = stack.pop()
+            n = len(stack)  # depth of the parent; document=1, body=2, paragraph=3
+            if n >= 3 and stack[2] == _W + "p" and stack[1] == _W + "body":
+                # run content directly in w:p/w:r or w:p/w:hyperlink/w:r
+                inner = stack[3:]
+                if inner == [_W + "r"] or inner == [_W + "hyperlink", _W + "r"]:
+                    if tag == _W + "t":
+                        buf.append(el.text or "")
+                    elif tag == _W + "br":
+                        buf.append("\n" if el.get(_W + "type", "textWrapping") == "textWrapping" else "")
+                    elif tag in _RUN_CHARS:
+                        buf.append(_RUN_CHARS[tag])
+            elif n == 2 and body is not None:
+                if tag == _W + "p":
+                    yield "".join(buf)
+                    buf = []
+                body.clear()
+
+def _iter_pdf(path: str) -> Iterator[str]:
     doc = fitz.open(path)
-    return "\n".join(p.get_text("text") for p in doc)
+    try:
+        for page in doc:
+            yield page.get_text("text")
+    finally:
+        doc.close()
 
-def _read_txt(path: str) -> str:
-    return open(path, "r", encoding="utf-8", errors="ignore").read()
+def _iter_txt(path: str) -> Iterator[str]:
+    # already lines: splitting each keeps read().splitlines() semantics
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            yield from line.splitlines()
 
-def _extract_blocks(text: str) -> List[Dict]:
-    blocks: List[Dict] = []
-    cur = {"ref": "", "title": "", "body": ""}
-    for line in text.splitlines():
-        if re.match(r"^(Пункт|Статья|\d+\.)", line.strip(), flags=re.IGNORECASE):
-            if cur["body"].strip():
-                blocks.append(cur)
-            cur = {"ref": line.strip()[:180], "title": line.strip()[:180], "body": ""}
+def _lines(pieces: Iterable[str]) -> Iterator[str]:
+    """splitlines() of "\\n".join(pieces) without building the joined string."""
+    prev: Optional[str] = None
+    for p in pieces:
+        if prev is not None:
+            yield from (prev + "\n").splitlines()
+        prev = p
+    if prev is not None:
+        yield from prev.splitlines()
+
+_READERS = {".docx": _iter_docx, ".pdf": _iter_pdf, ".txt": _iter_txt}
+
+def iter_law_lines(path: str) -> Iterator[str]:
+    ext = os.path.splitext(path)[1].lower()
+    reader = _READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"Unsupported laws file: {path}")
+    return reader(path) if ext == ".txt" else _lines(reader(path))
+
+# ---- blocks -------------------------------------------------------------------------
+_HEAD = re.compile(r"^(Пункт|Статья|\d+\.)", re.IGNORECASE)
+_ARTICLE = re.compile(r"^Статья\s*(\d+(?:[.\-]\d+)*)", re.IGNORECASE)
+_POINT = re.compile(r"^Пункт\s*(\d+(?:\.\d+)*)(?:\s*\((\d+)\))?", re.IGNORECASE)
+_NUMBERED = re.compile(r"^(\d+(?:\.\d+)*)")
+
+def _ref_path(hier: Dict[str, Optional[str]]) -> str:
+    parts = []
+    if hier.get("article"):
+        parts.append(f"ст. {hier['article']}")
+    if hier.get("point"):
+        parts.append(f"п. {hier['point']}" + (f".{hier['subpoint']}" if hier.get("subpoint") else ""))
+    return " ".join(parts)
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[Dict]:
+    """
+    Split law text into blocks at "Статья" / "Пункт" / "N." heading lines.
+    Bodies are list-join buffers (linear in the article length). Each block
+    carries `hier` ({"article", "point", "subpoint"}) and `ref_path` (e.g.
+    "ст. 5 п. 21.7"), tracked across headings: an article resets its points,
+    and "7.1." or "Пункт 7(1)" is point 7, subpoint 1.
+    """
+    hier: Dict[str, Optional[str]] = {"article": None, "point": None, "subpoint": None}
+    ref = ""
+    cur_hier = dict(hier)
+    buf: List[str] = []
+    has_text = False
+    for line in lines:
+        s = line.strip()
+        if _HEAD.match(s):
+            if has_text:
+                yield {"ref": ref, "title": ref, "body": "\n".join(buf) + "\n", "hier": cur_hier, "ref_path": _ref_path(cur_hier)}
+            m = _ARTICLE.match(s)
+            if m:
+                hier = {"article": m.group(1), "point": None, "subpoint": None}
+            else:
+                m = _POINT.match(s)
+                if m:
+                    hier = {**hier, "point": m.group(1), "subpoint": m.group(2)}
+                else:
+                    nums = _NUMBERED.match(s).group(1).split(".")
+                    hier = {**hier, "point": nums[0], "subpoint": ".".join(nums[1:]) or None}
+            ref = s[:180]
+            cur_hier = hier
+            buf = []
+            has_text = False
         else:
-            cur["body"] += line + "\n"
-    if cur["body"].strip():
-        blocks.append(cur)
-    return blocks
+            buf.append(line)
+            has_text = has_text or bool(s)
+    if has_text:
+        yield {"ref": ref, "title": ref, "body": "\n".join(buf) + "\n", "hier": cur_hier, "ref_path": _ref_path(cur_hier)}
 
-def _atoms_from_blocks(blocks: List[Dict], law_id: str) -> List[Dict]:
+def _extract_blocks(text: str) -> List[Dict]:
+    return list(iter_blocks(text.splitlines()))
+
+# ---- rule atoms -----------------------------------------------------------------------
+# (trigger_regex, trigger_keywords, title, severity); trigger_regex is stored with
+# each atom as written here.
+_RULES = [
+    (r"досроч\w+.*без.*(комисс|штраф|платеж)", ["досрочное", "без комиссий"],
+     "Right to early repayment without fees", "high"),
+    (r"неусто\w+.*(не\s*б(о|а)лее|не\s*выс(е|ш)е).*процентн\w|10\s*%", ["неустойка", "10%", "процентная ставка"],
+     "Penalty limits", "high"),
+    (r"уступк\w* требовани\w*.*(исключительно|только).*с соглас", ["уступка", "согласия заемщика"],
+     "Cession requires borrower consent", "high"),
+]
+
+# Execution form of a trigger_regex: run on the lowercased block (faster than
+# IGNORECASE) with every ".*" gap bounded to _MAX_GAP chars, so a long article
+# without a match costs a bounded scan per candidate instead of the quadratic
+# backtracking of ".*X.*Y". ("\w+.*" and "\w*.*" match what "\w.*" and ".*" do.)
+_MAX_GAP = 400
+_GAP = ".{0,%d}?" % _MAX_GAP
+
+def _bounded(rx: str) -> str:
+    return rx.replace(r"\w+.*", r"\w.*").replace(r"\w*.*", ".*").replace(".*", _GAP)
+
+# Prefilter: a rule only runs on blocks containing the stem (first word, at most
+# _STEM_LEN chars) of one of its trigger_keywords. Every branch of every pattern
+# above starts from such a stem, so skipped blocks could not have matched.
+# A few substring tests per rule are cheaper than one regex alternation scan.
+_STEM_LEN = 6
+_WORD = re.compile(r"\w+")
+
+def _stem(keyword: str) -> str:
+    m = _WORD.search(keyword.lower())
+    return m.group()[:_STEM_LEN] if m else ""
+
+_COMPILED = [
+    (re.compile(_bounded(rx)), tuple(dict.fromkeys(filter(None, map(_stem, kws)))), rx, kws, title, sev)
+    for rx, kws, title, sev in _RULES
+]
+
+def _atoms_from_blocks(blocks: Iterable[Dict], law_id: str) -> List[Dict]:
     out = []
-    RULES = [
-        (r"досроч\w+.*без.*(комисс|штраф|платеж)", ["досрочное", "без комиссий"],
-         "Right to early repayment without fees", "high"),
-        (r"неусто\w+.*(не\s*б(о|а)лее|не\s*выс(е|ш)е).*процентн\w|10\s*%", ["неустойка", "10%", "процентная ставка"],
-         "Penalty limits", "high"),
-        (r"уступк\w* требовани\w*.*(исключительно|только).*с соглас", ["уступка", "согласия заемщика"],
-         "Cession requires borrower consent", "high"),
-    ]
     for b in blocks:
         body = b.get("body", ""); ref = b.get("ref", "")
-        for rx, kws, title, sev in RULES:
-            if re.search(rx, body, flags=re.IGNORECASE):
+        low = body.lower()
+        for crx, stems, rx, kws, title, sev in _COMPILED:
+            if not any(s in low for s in stems):
+                continue
+            if crx.search(low):
                 out.append({
                     "law_id": law_id,
                     "ref": ref,
@@ -56,33 +197,34 @@ def _atoms_from_blocks(blocks: List[Dict], law_id: str) -> List[Dict]:
                 })
     return out
 
+def law_docs(path: str, law_id: str, atoms: List[Dict]) -> Iterator[Dict]:
+    """
+    kb_docs rows for one law file, parsed lazily; rule atoms found along the
+    way are appended to `atoms` (complete once the generator is exhausted).
+    """
+    source = os.path.basename(path)
+    for i, b in enumerate(iter_blocks(iter_law_lines(path))):
+        atoms.extend(_atoms_from_blocks([b], law_id))
+        yield {
+            "doc_id": f"{law_id}#{i:05d}",
+            "law_id": law_id,
+            "title": (b.get("title") or law_id)[:200],
+            "text": b.get("body", ""),
+            "meta": {"law_id": law_id, "ref": b.get("ref", ""), "ref_path": b["ref_path"], "hier": b["hier"],
+                     "lang": "ru", "tags": [], "source": source},
+        }
+
 def ingest_law_file(path: str, law_id: str):
-    ext = os.path.splitext(path)[1].lower()
-    if ext == ".docx":
-        text = _read_docx(path)
-    elif ext == ".pdf":
-        text = _read_pdf(path)
-    elif ext == ".txt":
-        text = _read_txt(path)
-    else:
+    if os.path.splitext(path)[1].lower() not in _READERS:
         raise ValueError(f"Unsupported laws file: {path}")
 
-    db.init_schema()
-    blocks = _extract_blocks(text)
-
-    docs = [{
-        "law_id": law_id,
-        "ref": b.get("ref", ""),
-        "title": (b.get("title") or law_id)[:200],
-        "body": b.get("body", ""),
-        "lang": "ru",
-        "tags": []
-    } for b in blocks]
-    db.insert_kb_docs(docs)
-
-    atoms = _atoms_from_blocks(blocks, law_id)
-    if atoms:
-        db.insert_rule_atoms(atoms)
+    # replace_law_docs consumes the docs generator before reading `atoms`
+    atoms: List[Dict] = []
+    docs: Iterable[Dict] = law_docs(path, law_id, atoms)
+    sigs: List[tuple] = []
+    if dedup.enabled():
+        docs, sigs = dedup.DedupIndex.load(exclude_laws=[law_id]).collapse(law_id, docs)
+    counts = db.replace_law_docs(law_id, docs, atoms, sigs=sigs)
 
     try:
         from src.agent.rag import backend as be
@@ -93,4 +235,4 @@ def ingest_law_file(path: str, law_id: str):
     except Exception:
         pass
 
-    return {"docs": len(docs), "atoms": len(atoms)}
+    return counts
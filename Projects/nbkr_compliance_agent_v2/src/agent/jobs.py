@@ -0,0 +1,198 @@
+# src/agent/jobs.py
+from __future__ import annotations
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from src.agent.execution import Overloaded
+from src.agent.orchestrator import AnalyzeInput, Orchestrator, content_hash
+from src.agent.storage import db
+
+log = logging.getLogger(__name__)
+
+# ---- worker side ---------------------------------------------------------------
+_ORCH: Optional[Orchestrator] = None
+_ORCH_LOCK = threading.Lock()
+
+def worker_orchestrator() -> Orchestrator:
+    """One kernel + orchestrator per worker process, shared by its threads."""
+    global _ORCH
+    if _ORCH is None:
+        with _ORCH_LOCK:
+            if _ORCH is None:
+                from src.agent.kernel import build_kernel
+                _ORCH = Orchestrator(asyncio.run(build_kernel()))
+    return _ORCH
+
+def init_worker_process(nice: int = 0) -> None:
+    # each job process OCRs its pages inline; parallelism comes from the pool size
+    os.environ["OCR_WORKERS"] = "1"
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
+def worker_pool(workers: int, nice: int = 0) -> ProcessPoolExecutor:
+    """
+    Process pool whose workers each build their own kernel (spawned: the app
+    process has threads). `nice` lowers the workers' CPU priority, for
+    background sweeps that must not slow interactive requests.
+    """
+    ctx = multiprocessing.get_context(os.getenv("JOBS_START_METHOD", "spawn"))
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker_process, initargs=(nice,))
+
+def run_job(job_id: str, goal: str, file_bytes: bytes, filename: Optional[str], content_type: Optional[str]) -> str:
+    """Run one queued job to completion and store its result; returns the final status."""
+    db.start_job(job_id)
+    data = AnalyzeInput(goal=goal, file_bytes=file_bytes, filename=filename, content_type=content_type)
+    retries = int(os.getenv("JOBS_RETRIES", "3"))
+    try:
+        for attempt in range(retries + 1):
+            try:
+                res = asyncio.run(worker_orchestrator().analyze(data))
+                break
+            except Overloaded as e:
+                # stages shared with interactive requests are full; a job can wait
+                if attempt >= retries:
+                    raise
+                time.sleep(e.retry_after)
+        db.finish_job(job_id, res, (res.get("run_summary") or {}).get("timings_ms") or {})
+        return "done"
+    except Exception as e:
+        log.exception("[jobs] %s failed", job_id)
+        db.fail_job(job_id, f"{type(e).__name__}: {e}")
+        return "error"
+
+# ---- queue ---------------------------------------------------------------------
+class JobQueue:
+    """
+    Bounded pool for analyses submitted through POST /jobs.
+
+    JOBS_MODE=process (default) runs jobs in JOBS_WORKERS worker processes
+    (default: CPU count), each with its own kernel, so throughput scales with
+    cores; JOBS_MODE=thread runs them on threads sharing the app's orchestrator.
+    At most JOBS_QUEUE jobs wait beyond the running ones, further submissions
+    raise Overloaded. Identical (file hash, goal) submissions return the
+    existing job instead of queueing another.
+
+    Jobs are owned by the queue that created them, which renews their lease
+    every JOBS_HEARTBEAT_SEC. Jobs whose owner stopped heartbeating for
+    JOBS_LEASE_SEC (killed or restarted process) are marked `interrupted` by
+    any live queue, and no longer count as duplicates.
+    """
+
+    def __init__(self, workers: Optional[int] = None, mode: Optional[str] = None, queue: Optional[int] = None,
+                 orchestrator: Optional[Orchestrator] = None) -> None:
+        global _ORCH
+        self.mode = (mode or os.getenv("JOBS_MODE", "process")).lower()
+        self.workers = max(1, workers or int(os.getenv("JOBS_WORKERS", str(os.cpu_count() or 1))))
+        self.queue = max(0, queue if queue is not None else int(os.getenv("JOBS_QUEUE", "64")))
+        if self.mode == "thread" and orchestrator is not None:
+            _ORCH = orchestrator
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = self.deduplicated = self.rejected = 0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.heartbeat_sec = max(0.1, float(os.getenv("JOBS_HEARTBEAT_SEC", "20")))
+        self._pool = self._make_pool()
+        self._stop = threading.Event()
+        self._reclaim()
+        self._beat = threading.Thread(target=self._heartbeat_loop, name="jobs-heartbeat", daemon=True)
+        self._beat.start()
+
+    def _reclaim(self) -> None:
+        stale = db.fail_stale_jobs()
+        if stale:
+            log.warning("[jobs] marked %d abandoned queued/running jobs as interrupted", stale)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_sec):
+            try:
+                db.heartbeat_jobs(self.owner)
+                self._reclaim()
+            except Exception as e:
+                log.warning("[jobs] heartbeat failed: %s", e)
+
+    def _make_pool(self) -> Executor:
+        if self.mode == "process":
+            return worker_pool(self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+
+    def submit(self, goal: str, file_bytes: bytes, filename: Optional[str] = None,
+               content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Queue an analysis; returns {"job_id", "status", "deduplicated"}. Blocking (SQLite)."""
+        file_hash = content_hash(AnalyzeInput(goal=goal, file_bytes=file_bytes))
+        existing = db.find_job(file_hash, goal)
+        if existing:
+            self.deduplicated += 1
+            return {"job_id": existing["job_id"], "status": existing["status"], "deduplicated": True}
+        with self._lock:
+            if self._pending >= self.workers + self.queue:
+                self.rejected += 1
+                raise Overloaded("jobs", retry_after=5)
+            self._pending += 1
+        try:
+            job_id, created = db.create_job(uuid.uuid4().hex, file_hash, goal, filename, owner=self.owner)
+            if not created:
+                self._release()
+                self.deduplicated += 1
+                return {"job_id": job_id, "status": (db.get_job(job_id) or {}).get("status"), "deduplicated": True}
+            try:
+                fut = self._pool.submit(run_job, job_id, goal, file_bytes, filename, content_type)
+            except Exception as e:
+                db.fail_job(job_id, f"{type(e).__name__}: {e}")
+                raise
+        except Exception:
+            self._release()
+            raise
+        fut.add_done_callback(functools.partial(self._done, job_id))
+        self.submitted += 1
+        return {"job_id": job_id, "status": "queued", "deduplicated": False}
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _done(self, job_id: str, fut: Future) -> None:
+        self._release()
+        exc = None if fut.cancelled() else fut.exception()
+        if fut.cancelled() or exc is not None:
+            # the worker died (or the pool shut down) before it could record the outcome
+            db.fail_job(job_id, "cancelled" if fut.cancelled() else f"{type(exc).__name__}: {exc}")
+        if isinstance(exc, BrokenExecutor):
+            with self._lock:
+                if not getattr(self._pool, "_broken", False):
+                    return  # already replaced by another failed future's callback
+                log.error("[jobs] worker pool broke (%s); starting a new one", exc)
+                old, self._pool = self._pool, self._make_pool()
+            old.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "owner": self.owner, "workers": self.workers, "queue": self.queue,
+                "pending": self._pending, "submitted": self.submitted, "deduplicated": self.deduplicated,
+                "rejected": self.rejected}
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+_JOBS: Optional[JobQueue] = None
+
+def get_jobs(orchestrator: Optional[Orchestrator] = None) -> JobQueue:
+    global _JOBS
+    if _JOBS is None:
+        _JOBS = JobQueue(orchestrator=orchestrator)
+    return _JOBS
+
+def shutdown_jobs() -> None:
+    global _JOBS
+    if _JOBS is not None:
+        _JOBS.shutdown()
+        _JOBS = None
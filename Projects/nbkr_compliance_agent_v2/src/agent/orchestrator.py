@@ -1,8 +1,14 @@
 # src/agent/orchestrator.py
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import asyncio
+import hashlib
+import time
+
+from src.agent.execution import ExecutionLayer, get_execution
+from src.agent.i18n import TranslationBatcher
+from src.agent.storage import db
 
 def _resolve(kernel, name: str):
     """
@@ -39,9 +45,15 @@ class AnalyzeInput:
     filename: Optional[str] = None
     content_type: Optional[str] = None
 
+def content_hash(data: AnalyzeInput) -> str:
+    """sha256 of the uploaded bytes (or of the text); reports are deduplicated on it together with the goal."""
+    raw = data.file_bytes if data.file_bytes is not None else (data.text or "").encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
 class Orchestrator:
-    def __init__(self, kernel):
+    def __init__(self, kernel, execution: Optional[ExecutionLayer] = None):
         self.kernel = kernel
+        self.execution = execution or get_execution()
         self.ocr = _resolve(kernel, "ocr")
         self.policy = _resolve(kernel, "policy")
         self.rag = _resolve(kernel, "rag")
@@ -79,23 +91,58 @@ class Orchestrator:
         except Exception:
             return text
 
-    async def _build_i18n(self, item: Dict[str, Any]) -> Dict[str, Any]:
+    async def _translate_many(self, texts: List[str], target: str) -> List[str]:
+        many = getattr(self.translate, "translate_many", None) if self.translate else None
+        if callable(many):
+            try:
+                return await self._maybe_await(many(texts=texts, target_lang=target))
+            except Exception:
+                return texts
+        return list(await asyncio.gather(*(self._tr(t, target) for t in texts)))
+
+    @staticmethod
+    def _i18n_sources(item: Dict[str, Any]) -> Dict[str, str]:
+        fix = item.get("suggested_fix") or {}
+        why_en = item.get("reason_long") or ""
+        return {
+            "why_en": why_en,
+            "why_ru": item.get("reason_long_ru") or "",
+            "ky_base": why_en or item.get("reason_long_ru") or "",
+            "offending_ru": item.get("offending_text") or "",
+            "fix_ru": fix.get("ru", ""),
+            "fix_en": fix.get("en", ""),
+            "fix_ky": fix.get("ky", ""),
+        }
+
+    def _i18n_collect(self, item: Dict[str, Any], b: TranslationBatcher) -> None:
+        src = self._i18n_sources(item)
+        if not src["why_ru"]:
+            b.add(src["why_en"], "ru")
+        b.add(src["ky_base"], "ky")
+        b.add(src["offending_ru"], "en")
+        b.add(src["offending_ru"], "ky")
+        if not src["fix_en"]:
+            b.add(src["fix_ru"], "en")
+        if not src["fix_ky"]:
+            b.add(src["fix_ru"], "ky")
+
+    def _i18n_fill(self, item: Dict[str, Any], b: TranslationBatcher) -> Dict[str, Any]:
+        src = self._i18n_sources(item)
         title_en = item.get("title") or ""
         title_ru = item.get("title_ru") or title_en
         title_ky = item.get("title_ky") or title_en
 
-        why_en = item.get("reason_long") or ""
-        why_ru = item.get("reason_long_ru") or await self._tr(why_en, "ru")
-        base_for_ky = why_en or why_ru
-        why_ky = await self._tr(base_for_ky, "ky")
+        why_en = src["why_en"]
+        why_ru = src["why_ru"] or b.get(why_en, "ru")
+        why_ky = b.get(src["ky_base"], "ky")
 
-        offending_ru = item.get("offending_text") or ""
-        offending_en = await self._tr(offending_ru, "en")
-        offending_ky = await self._tr(offending_ru, "ky")
+        offending_ru = src["offending_ru"]
+        offending_en = b.get(offending_ru, "en")
+        offending_ky = b.get(offending_ru, "ky")
 
-        fix_ru = (item.get("suggested_fix") or {}).get("ru", "")
-        fix_en = (item.get("suggested_fix") or {}).get("en", "") or await self._tr(fix_ru, "en")
-        fix_ky = (item.get("suggested_fix") or {}).get("ky", "") or await self._tr(fix_ru, "ky")
+        fix_ru = src["fix_ru"]
+        fix_en = src["fix_en"] or b.get(fix_ru, "en")
+        fix_ky = src["fix_ky"] or b.get(fix_ru, "ky")
 
         return {
             "ru": {"title": title_ru, "summary": title_ru, "why": why_ru, "offending_text": offending_ru, "suggested_fix": fix_ru},
@@ -103,31 +150,82 @@ class Orchestrator:
             "ky": {"title": title_ky, "summary": title_ky, "why": why_ky, "offending_text": offending_ky, "suggested_fix": fix_ky},
         }
 
-    async def analyze(self, data: AnalyzeInput, persist_report: bool = False) -> Dict[str, Any]:
-        # 1) OCR or text
+    async def _build_i18n_all(self, items: List[Dict[str, Any]]) -> int:
+        """Fill `i18n` for every flag with one batched translation pass; returns batches sent."""
+        b = TranslationBatcher(self._translate_many)
+        for item in items:
+            self._i18n_collect(item, b)
+        batches = await b.run()
+        for item in items:
+            item["i18n"] = self._i18n_fill(item, b)
+        return batches
+
+    async def _build_i18n(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        await self._build_i18n_all([item])
+        return item["i18n"]
+
+    async def _extract(self, data: AnalyzeInput) -> Tuple[str, Dict[str, Any]]:
         if data.text and data.text.strip():
-            full_text = data.text
-            ocr_meta = {"lang": "RU", "pages": 1}
-        else:
-            assert self.ocr, "OCR plugin not available"
-            content_type = data.content_type or "application/pdf"
-            ocr_res = await self._maybe_await(self.ocr.extract(file_bytes=data.file_bytes, content_type=content_type))
-            if isinstance(ocr_res, tuple) and len(ocr_res) == 2:
-                full_text, meta = ocr_res
-                ocr_meta = {"lang": (meta or {}).get("lang", ""), "pages": (meta or {}).get("pages", 1)}
-            elif isinstance(ocr_res, dict):
-                full_text = ocr_res.get("text", "")
-                ocr_meta = {"lang": ocr_res.get("lang", ""), "pages": ocr_res.get("pages", 1)}
-            else:
-                full_text, ocr_meta = (str(ocr_res or "")), {"lang": "", "pages": 1}
-
-        # 2) Policy
+            return data.text, {"lang": "RU", "pages": 1}
+        assert self.ocr, "OCR plugin not available"
+        content_type = data.content_type or "application/pdf"
+        ocr_res = await self.execution.run("ocr", self.ocr.extract, file_bytes=data.file_bytes, content_type=content_type)
+        if isinstance(ocr_res, tuple) and len(ocr_res) == 2:
+            full_text, meta = ocr_res
+            return full_text, {"lang": (meta or {}).get("lang", ""), "pages": (meta or {}).get("pages", 1)}
+        if isinstance(ocr_res, dict):
+            return ocr_res.get("text", ""), {"lang": ocr_res.get("lang", ""), "pages": ocr_res.get("pages", 1)}
+        return str(ocr_res or ""), {"lang": "", "pages": 1}
+
+    async def analyze_stream(self, data: AnalyzeInput, persist_report: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        The analysis pipeline as a sequence of events:
+          {"event": "ocr", ...}                    text extracted
+          {"event": "flag", "index", "item"}       one per rule hit, before citations
+          {"event": "citations", "index", "citations", "law"}
+          {"event": "i18n", "index", "i18n"}       after the batched translation pass
+          {"event": "done", "result"}              the same payload analyze() returns
+        Yielded dicts are live objects; serialize them when received.
+        With persist_report the result and stage timings are stored in `reports`
+        and the row's id is returned as result["report_id"].
+        """
+        trace = []
+        t = t0 = time.perf_counter()
+        ms = lambda: round((time.perf_counter() - t) * 1000, 1)
+
+        # 1) OCR or text
+        full_text, ocr_meta = await self._extract(data)
+        ocr_obs = {"ok": bool(full_text), "chars": len(full_text), "lang": ocr_meta.get("lang",""), "pages": ocr_meta.get("pages",1)}
+        trace.append({"step": "ocr", "tool": "ocr.extract", "args": {"content_type": data.content_type or "application/pdf"},
+                      "observation": ocr_obs, "ms": ms()})
+        yield {"event": "ocr", **ocr_obs}
+
+        # 2) Policy: rule hits first, citations in one batched lookup after
         assert self.policy, "Policy plugin not available"
-        flags = await self._maybe_await(self.policy.flag(full_text=full_text, ocr_meta=ocr_meta)) or []
+        t = time.perf_counter()
+        evaluate = getattr(self.policy, "evaluate", None)
+        attach = getattr(self.policy, "attach_citations", None)
+        if callable(evaluate) and callable(attach):
+            flags = await self.execution.run("policy", evaluate, full_text=full_text, ocr_meta=ocr_meta) or []
+            for i, f in enumerate(flags):
+                yield {"event": "flag", "index": i, "item": f}
+            flags = await self.execution.run("policy", attach, flags) or flags
+            for i, f in enumerate(flags):
+                yield {"event": "citations", "index": i, "citations": f.get("citations", []), "law": f.get("law")}
+        else:
+            flags = await self.execution.run("policy", self.policy.flag, full_text=full_text, ocr_meta=ocr_meta) or []
+            for i, f in enumerate(flags):
+                yield {"event": "flag", "index": i, "item": f}
+        trace.append({"step": "policy@pass1", "tool": "policy.flag", "args": {"lang": ocr_meta.get("lang","RU")},
+                      "observation": {"items": len(flags)}, "ms": ms()})
 
-        # 3) i18n
-        for f in flags:
-            f["i18n"] = await self._build_i18n(f)
+        # 3) i18n (one batched pass for the whole report)
+        t = time.perf_counter()
+        i18n_batches = await self._build_i18n_all(flags)
+        trace.append({"step": "i18n@pass1", "tool": "translate", "args": {"targets": ["en","ky"]},
+                      "observation": {"ok": True, "batches": i18n_batches}, "ms": ms()})
+        for i, f in enumerate(flags):
+            yield {"event": "i18n", "index": i, "i18n": f["i18n"]}
 
         # 4) Evidence
         evidence = []
@@ -135,22 +233,28 @@ class Orchestrator:
             for c in f.get("citations", []):
                 evidence.append(c)
 
-        return {
+        trace.append({"step": "decide@pass1", "tool": "agent", "args": {}, "observation": {"status": "stop"}})
+        timings = {s["step"].split("@")[0]: s["ms"] for s in trace if "ms" in s}
+        timings["total"] = round((time.perf_counter() - t0) * 1000, 1)
+        result = {
             "goal": data.goal,
             "entities": {"names": [], "roles": []},
             "flags": {"items": flags},
             "evidence": evidence,
             "translations": {"original_lang": ocr_meta.get("lang", "")},
-            "agent_trace": [
-                {"step": "ocr", "tool": "ocr.extract", "args": {"content_type": data.content_type or "application/pdf"},
-                 "observation": {"ok": bool(full_text), "chars": len(full_text), "lang": ocr_meta.get("lang",""), "pages": ocr_meta.get("pages",1)}},
-                {"step": "policy@pass1", "tool": "policy.flag", "args": {"lang": ocr_meta.get("lang","RU")},
-                 "observation": {"items": len(flags)}},
-                {"step": "i18n@pass1", "tool": "translate", "args": {"targets": ["en","ky"]},
-                 "observation": {"ok": True}},
-                {"step": "decide@pass1", "tool": "agent", "args": {}, "observation": {"status": "stop"}},
-            ],
+            "agent_trace": trace,
             "run_summary": {"used": {
                 "ocr": True, "policy_llm_generate": True, "policy_llm_judge": True, "rag": True, "translate": True
-            }}
+            }, "timings_ms": timings}
         }
+        if persist_report:
+            result["report_id"] = await asyncio.to_thread(
+                db.save_report, data.filename or "", data.goal, content_hash(data), result, timings)
+        yield {"event": "done", "result": result}
+
+    async def analyze(self, data: AnalyzeInput, persist_report: bool = False) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        async for ev in self.analyze_stream(data, persist_report=persist_report):
+            if ev["event"] == "done":
+                result = ev["result"]
+        return result
@@ -1,21 +1,33 @@
 from __future__ import annotations
-import os, sqlite3, numpy as np
-from typing import List, Sequence
+import os, numpy as np
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
 
 # Force TF-IDF if downloads are blocked (air-gapped / corp proxy)
 _FORCE_TFIDF = os.getenv("RAG_EMBED_FORCE_TFIDF", "0") == "1"
 
 _model = None           # sentence-transformers model (optional)
 _vectorizer = None      # sklearn TF-IDF vectorizer
+_vectorizer_corpus = None  # corpus fingerprint the vectorizer was fit on (None = seed corpus)
+_tfidf_sig = None       # (mtime_ns, size) of the loaded file, to notice refits by other processes
 _tfidf_ready = False
-_DB = None
 
-def _db_path() -> str:
-    global _DB
-    if _DB: return _DB
-    from src.settings import settings
-    _DB = settings.SQLITE_PATH
-    return _DB
+_SEED_CORPUS = [
+    "seed", "credit agreement", "APR disclosure",
+    "досрочное погашение кредита", "комиссия за досрочное погашение",
+    "раскрытие комиссий", "персональные данные согласие"
+]
+
+def _tfidf_path() -> Path:
+    from src.settings import DATA_DIR
+    return Path(os.getenv("RAG_TFIDF_PATH", str(DATA_DIR / "tfidf.joblib")))
+
+def _file_sig(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 def _load_st_model(name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
     if _FORCE_TFIDF:
@@ -29,34 +41,125 @@ def _load_st_model(name: str = "sentence-transformers/paraphrase-multilingual-Mi
             _model = None
     return _model
 
+def _corpus_fingerprint() -> Optional[List[int]]:
+    """[latest kb_changes seq, kb_docs count] at fit time, or None while kb_docs is empty."""
+    from src.agent.storage import db
+    n = db.kb_doc_count()
+    return [db.kb_change_seq(), n] if n else None
+
+def _fit_tfidf():
+    """Fit on kb_docs (the seed corpus while it is empty); returns (vectorizer, corpus fingerprint)."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from src.agent.storage import db
+    vec = TfidfVectorizer(analyzer="char_wb", ngram_range=(3,5), max_features=6000, dtype=np.float32)
+    fp = _corpus_fingerprint()  # taken first: docs written during the fit count as drift, not lost
+    corpus = [d["text"] for d in db.iter_kb_docs() if d["text"]] if fp else []
+    if not corpus:
+        fp, corpus = None, _SEED_CORPUS
+    vec.fit(corpus)
+    return vec, fp
+
 def _ensure_tfidf():
-    """Fit ONE TF-IDF (char_wb 3–5 n-grams) on KB corpus, so vectors have consistent shape."""
-    global _vectorizer, _tfidf_ready
+    """
+    Load the persisted TF-IDF (char_wb 3–5 n-grams; vocabulary + IDF) or fit ONE
+    on the KB corpus and persist it, so vectors have a consistent shape across
+    processes and restarts do not refit. A fit on the seed corpus (empty KB)
+    is kept in memory only; rebuild_index_if_needed() refits once docs exist.
+    """
+    global _vectorizer, _vectorizer_corpus, _tfidf_sig, _tfidf_ready
+    path = _tfidf_path()
     if _tfidf_ready and _vectorizer is not None:
-        return
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    _vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(3,5), max_features=6000)
-    conn = sqlite3.connect(_db_path())
-    rows = conn.execute("SELECT text FROM kb_docs").fetchall()
-    conn.close()
-    corpus = [t for (t,) in rows if t] or [
-        "seed", "credit agreement", "APR disclosure",
-        "досрочное погашение кредита", "комиссия за досрочное погашение",
-        "раскрытие комиссий", "персональные данные согласие"
-    ]
-    _vectorizer.fit(corpus)
+        sig = _file_sig(path)
+        if sig is None or sig == _tfidf_sig:
+            return
+    import joblib
+    sig = _file_sig(path)
+    vec = fp = None
+    if sig is not None:
+        try:
+            saved = joblib.load(path)
+            if isinstance(saved, dict):
+                vec, fp = saved["vectorizer"], saved.get("corpus")
+            else:  # bare vectorizer from before fingerprints: stale, refit on next sync
+                vec = saved
+        except Exception:
+            vec = None
+    if vec is None:
+        vec, fp = _fit_tfidf()
+        sig = _persist_tfidf(vec, fp)
+    _vectorizer, _vectorizer_corpus, _tfidf_sig = vec, fp, sig
     _tfidf_ready = True
 
+def _persist_tfidf(vec, fp) -> Optional[Tuple[int, int]]:
+    if fp is None:
+        return None
+    import joblib
+    path = _tfidf_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        joblib.dump({"vectorizer": vec, "corpus": fp}, tmp)
+        os.replace(tmp, path)
+    except Exception:
+        return None
+    return _file_sig(path)
+
+def tfidf_stale() -> bool:
+    """
+    True when the vectorizer should be refit: it was fit on the seed corpus and
+    kb_docs now has rows, or more than RAG_TFIDF_REFIT_SHARE (default 0.2) of
+    the documents it was fit on changed since. Smaller deltas are embedded with
+    the current vocabulary; refit_tfidf() forces a refit.
+    """
+    from src.agent.storage import db
+    _ensure_tfidf()
+    if not _vectorizer_corpus:
+        return db.kb_doc_count() > 0
+    seq, n = _vectorizer_corpus
+    _, changed = db.kb_changes_since(seq)
+    if changed is None:  # log pruned past the fit: drift unknown
+        return True
+    share = max(0.0, float(os.getenv("RAG_TFIDF_REFIT_SHARE", "0.2")))
+    return len(changed) > share * n
+
+def refit_tfidf():
+    """Refit on the current kb_docs and persist; the sparse store is rebuilt on next sync."""
+    global _vectorizer, _vectorizer_corpus, _tfidf_sig, _tfidf_ready
+    from src.agent.rag.vector_store import writer_lock
+    with writer_lock():
+        vec, fp = _fit_tfidf()
+        _vectorizer, _vectorizer_corpus, _tfidf_sig = vec, fp, _persist_tfidf(vec, fp)
+        _tfidf_ready = True
+
 def warmup():
     """Call once on startup to ensure TF-IDF is fitted before any request."""
     embed("warmup")
+    try:
+        rebuild_index_if_needed()
+    except Exception:
+        pass
 
 def _to_1d(a) -> np.ndarray:
     arr = np.asarray(a, dtype=float)
     return arr.reshape(-1) if arr.ndim == 2 else arr
 
-def embed(texts: Sequence[str] | str):
+def uses_tfidf() -> bool:
+    return _load_st_model() is None
+
+def embed_sparse(texts: Sequence[str] | str):
+    """TF-IDF vectors as an L2-normalized CSR matrix (one row per text); never densified."""
+    _ensure_tfidf()
+    texts = [texts] if isinstance(texts, str) else list(texts)
+    return _vectorizer.transform(texts).tocsr()
+
+def embed(texts: Sequence[str] | str, sparse: bool = False):
+    """
+    Dense lists by default (back-compat). With sparse=True in TF-IDF mode, return
+    a CSR matrix instead of densifying 6000-dim char n-gram vectors.
+    """
     mdl = _load_st_model()
+    if sparse and mdl is None:
+        return embed_sparse(texts)
     single = isinstance(texts, str)
     texts = [texts] if single else list(texts)
 
@@ -71,7 +174,18 @@ def embed(texts: Sequence[str] | str):
         return _to_1d(arr[0]).tolist()
     return [_to_1d(row).tolist() for row in arr]
 
-def cosine_sim(a: Sequence[float], b: Sequence[float]) -> float:
+def cosine_sim(a, b) -> float:
+    if hasattr(a, "multiply") or hasattr(b, "multiply"):  # scipy.sparse rows
+        import scipy.sparse as sp
+        from scipy.sparse.linalg import norm as spnorm
+        va, vb = sp.csr_matrix(a), sp.csr_matrix(b)
+        if va.shape != vb.shape:
+            d = min(va.shape[1], vb.shape[1])
+            va, vb = va[:, :d], vb[:, :d]
+        da, db = spnorm(va), spnorm(vb)
+        if da == 0 or db == 0:
+            return 0.0
+        return float(va.multiply(vb).sum() / (da * db))
     va, vb = _to_1d(a), _to_1d(b)
     if va.shape != vb.shape:
         d = min(va.shape[0], vb.shape[0])
@@ -81,6 +195,120 @@ def cosine_sim(a: Sequence[float], b: Sequence[float]) -> float:
         return 0.0
     return float(np.dot(va, vb) / (da * db))
 
+# ---- dense vector index over kb_docs ------------------------------------------------
+_store = None
+
+def vector_store():
+    """VectorStore for the active embedding space (created lazily, one per process)."""
+    global _store
+    from src.agent.rag.vector_store import VectorStore, SparseVectorStore
+    mdl = _load_st_model()
+    if mdl is not None:
+        dim = int(mdl.get_sentence_embedding_dimension())
+        name, cls = f"st_{dim}", VectorStore
+    else:
+        import hashlib
+        _ensure_tfidf()
+        vocab = sorted(_vectorizer.vocabulary_.items(), key=lambda kv: kv[1])
+        fp = hashlib.sha1("\x1f".join(k for k, _ in vocab).encode("utf-8")).hexdigest()[:10]
+        dim, name, cls = len(vocab), f"tfidf_{fp}", SparseVectorStore
+    if _store is None or _store.name != name:
+        _store = cls(name, dim)
+    return _store
+
+def vector_store_version() -> Tuple[str, int]:
+    """(name, version) of the active store; readers use it to notice new generations without embedding."""
+    from src.agent.storage import db
+    store = vector_store()
+    return store.name, db.vec_store_version(store.name)
+
+def _drop_stale_stores(keep: str, old=None) -> None:
+    """Remove TF-IDF stores built with an earlier vocabulary (their dims no longer match)."""
+    import shutil
+    from src.agent.rag.vector_store import _vectors_dir
+    from src.agent.storage import db
+    names = {p.name for p in _vectors_dir().glob("tfidf_*")} | ({old.name} if old is not None else set())
+    for name in names - {keep}:
+        if name.startswith("tfidf_"):
+            db.vec_rows_commit(name, [], [], kb_seq=0, reset=True)
+            shutil.rmtree(_vectors_dir() / name, ignore_errors=True)
+
+def rebuild_index_if_needed(batch: int = 256) -> dict:
+    """
+    Bring the vector store in line with kb_docs using the kb_changes log:
+    only new/updated docs are embedded and appended, deleted ones tombstoned.
+    Falls back to a full rebuild on first use or if the log was pruned, and
+    after a TF-IDF refit (the vectorizer follows the corpus, see tfidf_stale()).
+    Runs under the vector store writer lock, so concurrent callers (ingestion,
+    the laws refresher, warmup in each worker) take turns instead of racing
+    for the same rows.
+    """
+    from src.agent.rag.vector_store import writer_lock
+    with writer_lock():
+        return _rebuild_index(batch)
+
+def _rebuild_index(batch: int) -> dict:
+    from src.agent.storage import db
+    if uses_tfidf() and tfidf_stale():
+        old = _store
+        refit_tfidf()
+        _drop_stale_stores(keep=vector_store().name, old=old)
+    store = vector_store()
+    state = db.vec_store_state(store.name, store.dim)
+    seq, changed = db.kb_changes_since(state["kb_seq"])
+    if changed == [] and seq == state["kb_seq"]:
+        return {"embedded": 0, "deleted": 0}
+
+    embedded = deleted = 0
+    if changed is None or state["kb_seq"] == 0:
+        store.reset()
+        docs = db.iter_kb_docs()
+    else:
+        docs = iter(db.get_kb_docs(changed))
+        gone = set(changed)
+        found = []
+        for d in docs:
+            gone.discard(d["doc_id"]); found.append(d)
+        if gone:
+            store.delete(sorted(gone)); deleted = len(gone)
+        docs = iter(found)
+
+    buf = []
+    for d in docs:
+        buf.append(d)
+        if len(buf) >= batch:
+            embedded += store.add([x["doc_id"] for x in buf], embed([x["text"] for x in buf], sparse=True))
+            buf = []
+    embedded += store.add([x["doc_id"] for x in buf], embed([x["text"] for x in buf], sparse=True) if buf else [], kb_seq=seq)
+    return {"embedded": embedded, "deleted": deleted}
+
+def search_kb_many(queries: Sequence[str], top_k: int = 5) -> List[List[Tuple[str, float]]]:
+    """(doc_id, cosine) top-k per query from the vector store; the queries are embedded in one call."""
+    queries = list(queries)
+    if not queries:
+        return []
+    store = vector_store()
+    vecs = embed(queries, sparse=True)
+    return [store.search(vecs[i], top_k=top_k) for i in range(len(queries))]
+
+def search_kb(query: str, top_k: int = 5) -> List[dict]:
+    """Semantic top-k over kb_docs via the vector store (no per-pair cosine loop)."""
+    from src.agent.storage import db
+    hits = search_kb_many([query], top_k=top_k)[0]
+    ids = [doc_id for doc_id, _ in hits]
+    rows = {d["doc_id"]: d for d in db.get_kb_docs(ids)}
+    aliases = db.doc_aliases(ids)
+    out = []
+    for doc_id, score in hits:
+        d = rows.get(doc_id)
+        if d:
+            hit = {**d, "snippet": d["text"][:400], "score": round(score, 4)}
+            if doc_id in aliases:
+                # the same text also appears in these (deduplicated) law blocks
+                hit["aliases"] = aliases[doc_id]
+            out.append(hit)
+    return out
+
 def chunk_text(text: str, target_tokens: int = 200) -> List[str]:
     text = (text or "").strip()
     if not text:
@@ -0,0 +1,353 @@
+# src/agent/rag/bm25.py
+from __future__ import annotations
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.agent.storage import db
+
+log = logging.getLogger(__name__)
+
+_TOKEN_RX = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RX.findall((text or "").lower()) if len(t) > 2]
+
+def _refs(payload: Dict[str, Any]) -> Set[str]:
+    return {payload.get("ref") or "", *(payload.get("alias_refs") or ())}
+
+class BM25Index:
+    """
+    In-memory inverted index (token -> {doc: tf}) with Okapi BM25 scoring.
+    Documents are keyed by an external string key and can be added/replaced/
+    removed one at a time, so the index can follow the corpus incrementally.
+    A document is listed under its payload's "ref" and any "alias_refs".
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_len: Dict[int, int] = {}
+        self.payload: Dict[int, Dict[str, Any]] = {}
+        self.by_ref: Dict[str, Set[int]] = {}
+        self._ids: Dict[str, int] = {}
+        self._next = 0
+        self._total_len = 0
+        self._by_ref_order: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, key: str, text: str, payload: Dict[str, Any]) -> None:
+        if key in self._ids:
+            self.remove(key)
+        i = self._next
+        self._next += 1
+        self._ids[key] = i
+        tf = Counter(tokenize(text))
+        for tok, n in tf.items():
+            self.postings.setdefault(tok, {})[i] = n
+        length = sum(tf.values())
+        self.doc_len[i] = length
+        self._total_len += length
+        self.payload[i] = {**payload, "_key": key, "_tokens": tuple(tf)}
+        for ref in _refs(payload):
+            self.by_ref.setdefault(ref, set()).add(i)
+        self._by_ref_order = None
+
+    def remove(self, key: str) -> None:
+        i = self._ids.pop(key, None)
+        if i is None:
+            return
+        p = self.payload.pop(i)
+        for tok in p["_tokens"]:
+            plist = self.postings.get(tok)
+            if plist is not None:
+                plist.pop(i, None)
+                if not plist:
+                    del self.postings[tok]
+        self._total_len -= self.doc_len.pop(i)
+        for ref in _refs(p):
+            ids = self.by_ref.get(ref)
+            if ids is not None:
+                ids.discard(i)
+                if not ids:
+                    del self.by_ref[ref]
+        self._by_ref_order = None
+
+    def idf(self, tok: str) -> float:
+        n, df = len(self.doc_len), len(self.postings.get(tok, ()))
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def token_scores(self, tokens: Iterable[str]) -> Dict[str, Dict[int, float]]:
+        """Per-token BM25 contributions {token: {doc: score}}; shared by queries in a batch."""
+        out: Dict[str, Dict[int, float]] = {}
+        if not self.doc_len:
+            return out
+        avgdl = self._total_len / len(self.doc_len) or 1.0
+        k1, b = self.k1, self.b
+        for tok in set(tokens):
+            plist = self.postings.get(tok)
+            if not plist:
+                continue
+            idf = self.idf(tok)
+            out[tok] = {
+                i: idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * self.doc_len[i] / avgdl))
+                for i, tf in plist.items()
+            }
+        return out
+
+    def score_tokens(self, tokens: Iterable[str]) -> Dict[int, float]:
+        """BM25 score for every document that contains at least one query token."""
+        scores: Dict[int, float] = {}
+        for contrib in self.token_scores(tokens).values():
+            for i, v in contrib.items():
+                scores[i] = scores.get(i, 0.0) + v
+        return scores
+
+    def ref_order(self) -> List[int]:
+        """All doc ids ordered by ref; used to pad results when few docs match."""
+        if self._by_ref_order is None:
+            self._by_ref_order = sorted(self.payload, key=lambda i: self.payload[i].get("ref") or "")
+        return self._by_ref_order
+
+def _bounded(bm25: float) -> float:
+    # Saturating map into [0, 0.5) so a law_hint match (+1.0) always ranks first,
+    # as with the previous substring-count heuristic (the semantic part adds < 0.5).
+    return 0.5 * bm25 / (bm25 + 5.0)
+
+def _copy_hit(r: Dict[str, Any]) -> Dict[str, Any]:
+    hit = dict(r)
+    if "aliases" in hit:
+        hit["aliases"] = [dict(a) for a in hit["aliases"]]
+    return hit
+
+class LawIndex:
+    """
+    BM25 index over the laws file (db.list_laws()) plus kb_docs. Refreshes at
+    most every `refresh_sec`: the laws file is re-read when its (mtime, size)
+    changes and kb_docs rows are re-indexed from the kb_changes log, so only
+    touched documents are reprocessed.
+
+    Law blocks collapsed into a kb_docs row as exact duplicates (other laws
+    with the same provision, see ingest.dedup) are returned with the hit under
+    "aliases", and their refs count for the law_hint boost.
+
+    kb_docs rows also get RAG_SEMANTIC_WEIGHT x cosine from the embedding
+    vector store (rag.backend); this finds inflected or paraphrased wording
+    that shares no BM25 token. The store is written by ingestion and the laws
+    refresher only: refresh() just notices its new generations (one
+    vec_stores read) and never embeds anything itself.
+    """
+
+    def __init__(self, refresh_sec: float = 1.0) -> None:
+        self.refresh_sec = refresh_sec
+        self.index = BM25Index()
+        self._lock = threading.RLock()
+        self._laws_sig: Any = object()
+        self._laws_keys: List[str] = []
+        self._kb_seq = 0
+        self._vec_gen: Any = None
+        self._checked_at = 0.0
+        self.version = 0
+        self._memo: "OrderedDict[Tuple[str, Optional[str], int, int], List[Dict[str, Any]]]" = OrderedDict()
+        self.memo_size = int(os.getenv("RAG_MEMO_SIZE", "1024"))
+        self.semantic_weight = min(0.49, max(0.0, float(os.getenv("RAG_SEMANTIC_WEIGHT", "0.3"))))
+
+    # ---- sync -------------------------------------------------------------------
+    def _sync_laws(self) -> bool:
+        sig = db.laws_signature()
+        if sig == self._laws_sig:
+            return False
+        for k in self._laws_keys:
+            self.index.remove(k)
+        self._laws_keys = []
+        for n, r in enumerate(db.list_laws()):
+            key = f"laws:{n}"
+            self.index.add(key, r["text"], {"law_id": r["law_id"], "ref": r["ref"], "title": r["title"], "text": r["text"]})
+            self._laws_keys.append(key)
+        self._laws_sig = sig
+        return True
+
+    def _add_kb(self, d: Dict[str, Any], aliases: List[Dict[str, Any]]) -> None:
+        meta = d.get("meta") or {}
+        aliases = [{"law_id": a["law_id"], "ref": a["ref"] or "", "doc_id": a["doc_id"]} for a in aliases]
+        self.index.add(f"kb:{d['doc_id']}", d["text"], {
+            "law_id": d.get("law_id") or meta.get("law_id") or d["doc_id"],
+            "ref": meta.get("ref") or d.get("title") or "",
+            "title": d.get("title") or "",
+            "text": d["text"],
+            "aliases": aliases,
+            "alias_refs": [a["ref"] for a in aliases if a["ref"]],
+        })
+
+    def _add_kb_many(self, docs: Iterable[Dict[str, Any]], batch: int = 1000) -> None:
+        buf: List[Dict[str, Any]] = []
+        for d in docs:
+            buf.append(d)
+            if len(buf) >= batch:
+                self._add_kb_batch(buf)
+                buf = []
+        self._add_kb_batch(buf)
+
+    def _add_kb_batch(self, docs: List[Dict[str, Any]]) -> None:
+        aliases = db.doc_aliases([d["doc_id"] for d in docs]) if docs else {}
+        for d in docs:
+            self._add_kb(d, aliases.get(d["doc_id"], []))
+
+    def _sync_kb(self) -> bool:
+        seq, changed = db.kb_changes_since(self._kb_seq)
+        if changed == [] and seq == self._kb_seq:
+            return False
+        if changed is None or self._kb_seq == 0:
+            for k in [k for k in self.index._ids if k.startswith("kb:")]:
+                self.index.remove(k)
+            self._add_kb_many(db.iter_kb_docs())
+        else:
+            for doc_id in changed:
+                self.index.remove(f"kb:{doc_id}")
+            self._add_kb_many(db.get_kb_docs(changed))
+        self._kb_seq = seq
+        return True
+
+    def _sync_vector_gen(self) -> bool:
+        # a new store generation changes semantic scores, so memoized hits must go
+        try:
+            from src.agent.rag import backend as be
+            gen = be.vector_store_version()
+        except Exception as e:
+            log.warning("[rag] vector store check failed: %s", e)
+            return False
+        if gen == self._vec_gen:
+            return False
+        self._vec_gen = gen
+        return True
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_sec:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.refresh_sec:
+                return
+            changed = self._sync_laws()
+            changed = self._sync_kb() or changed
+            if self.semantic_weight > 0:
+                changed = self._sync_vector_gen() or changed
+            if changed:
+                self.version += 1
+            self._checked_at = time.monotonic()
+
+    # ---- query ------------------------------------------------------------------
+    def _semantic(self, queries: List[str], k: int) -> Dict[str, Dict[int, float]]:
+        """Weighted cosine of the kb_docs nearest to each query, keyed by index doc id."""
+        if self.semantic_weight <= 0 or not queries:
+            return {}
+        try:
+            from src.agent.rag import backend as be
+            hits = be.search_kb_many(queries, top_k=max(4 * k, 20))
+        except Exception as e:
+            log.warning("[rag] semantic lookup failed, BM25 only: %s", e)
+            return {}
+        out: Dict[str, Dict[int, float]] = {}
+        for q, res in zip(queries, hits):
+            row = out[q] = {}
+            for doc_id, cos in res:
+                i = self.index._ids.get(f"kb:{doc_id}")
+                if i is not None and cos > 0:
+                    row[i] = self.semantic_weight * min(1.0, cos)
+        return out
+
+    def _rank(self, scores: Dict[int, float], law_hint: Optional[str], k: int,
+              semantic: Optional[Dict[int, float]] = None) -> List[Dict[str, Any]]:
+        idx = self.index
+        scores = {i: _bounded(s) for i, s in scores.items()}
+        for i, v in (semantic or {}).items():
+            scores[i] = scores.get(i, 0.0) + v
+        if law_hint:
+            for i in idx.by_ref.get(law_hint, ()):
+                scores[i] = scores.get(i, 0.0) + 1.0
+        ref = lambda i: idx.payload[i].get("ref") or ""
+        best: List[Tuple[float, str, int]] = heapq.nsmallest(k, ((-s, ref(i), i) for i, s in scores.items()))
+        if len(best) < k:
+            for i in idx.ref_order():
+                if len(best) >= k:
+                    break
+                if i not in scores:
+                    best.append((0.0, ref(i), i))
+        out = []
+        for neg, _, i in best:
+            p = idx.payload[i]
+            hit = {
+                "law_id": p["law_id"],
+                "ref": p["ref"],
+                "title": p["title"],
+                "snippet": p["text"][:400],
+                "full_text": p["text"],
+                "score": round(max(0.0, -neg), 4),
+            }
+            if p.get("aliases"):
+                # the same text is also this provision of these laws
+                hit["aliases"] = p["aliases"]
+            out.append(hit)
+        return out
+
+    def search_many(self, queries: List[str], law_hints: Optional[List[Optional[str]]] = None,
+                    top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """
+        Top-k for several queries at once, in input order. Each distinct token is
+        scored against its posting list once for the whole batch, and results
+        are memoized by (query, law_hint, top_k, index version), so repeated
+        rule lookups across requests are dictionary hits until the corpus changes.
+        """
+        self.refresh()
+        k = max(1, int(top_k))
+        hints = list(law_hints) if law_hints is not None else [None] * len(queries)
+        out: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        with self._lock:
+            todo: Dict[Tuple[str, Optional[str]], List[int]] = {}
+            for pos, (q, h) in enumerate(zip(queries, hints)):
+                key = (q or "", h, k, self.version)
+                hit = self._memo.get(key)
+                if hit is not None:
+                    self._memo.move_to_end(key)
+                    out[pos] = hit
+                else:
+                    todo.setdefault((q or "", h), []).append(pos)
+            if todo:
+                toks = {q: set(tokenize(q)) for q, _ in todo}
+                contrib = self.index.token_scores(set().union(*toks.values()))
+                sem = self._semantic([q for q in toks if q], k)
+                for (q, h), positions in todo.items():
+                    scores: Dict[int, float] = {}
+                    for t in toks[q]:
+                        for i, v in contrib.get(t, {}).items():
+                            scores[i] = scores.get(i, 0.0) + v
+                    res = self._rank(scores, h, k, sem.get(q))
+                    self._memo[(q, h, k, self.version)] = res
+                    for p in positions:
+                        out[p] = res
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+        # callers attach results to reports; hand out copies of the memoized rows
+        return [[_copy_hit(r) for r in res or []] for res in out]
+
+    def search(self, query: str, top_k: int = 3, law_hint: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self.search_many([query], [law_hint], top_k=top_k)[0]
+
+_SHARED: Optional[LawIndex] = None
+_SHARED_LOCK = threading.Lock()
+
+def shared_index() -> LawIndex:
+    global _SHARED
+    if _SHARED is None:
+        with _SHARED_LOCK:
+            if _SHARED is None:
+                _SHARED = LawIndex(refresh_sec=float(os.getenv("RAG_INDEX_REFRESH_SEC", "1.0")))
+    return _SHARED
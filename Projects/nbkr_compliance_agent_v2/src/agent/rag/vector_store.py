@@ -0,0 +1,358 @@
+# src/agent/rag/vector_store.py
+from __future__ import annotations
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.agent.storage import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialized within one process only
+    fcntl = None
+
+def _vectors_dir() -> Path:
+    from src.settings import DATA_DIR
+    return Path(os.getenv("RAG_VECTORS_DIR", str(DATA_DIR / "vectors")))
+
+class _WriterLock:
+    """Reentrant exclusive lock: an RLock between threads, flock() on `path` between processes."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def __enter__(self) -> "_WriterLock":
+        self._rlock.acquire()
+        if self._depth == 0:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fh = open(self.path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                self._rlock.release()
+                raise
+            self._fh = fh
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            fh, self._fh = self._fh, None
+            fh.close()  # drops the flock
+        self._rlock.release()
+
+_WRITER_LOCKS: Dict[str, _WriterLock] = {}
+_WRITER_LOCKS_GUARD = threading.Lock()
+
+def writer_lock(root: Optional[Path] = None) -> _WriterLock:
+    """
+    The lock every vector store writer holds while it appends, flushes or
+    rebuilds (`<vectors dir>/.writer.lock`). Ingestion, the laws refresher and
+    each worker's warmup may all sync the same store; without it two of them
+    could claim the same next row.
+    """
+    path = os.path.abspath(Path(root or _vectors_dir()) / ".writer.lock")
+    with _WRITER_LOCKS_GUARD:
+        lock = _WRITER_LOCKS.get(path)
+        if lock is None:
+            lock = _WRITER_LOCKS[path] = _WriterLock(Path(path))
+        return lock
+
+def normalize(vecs) -> np.ndarray:
+    arr = np.asarray(vecs, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+class VectorStore:
+    """
+    Dense vector store: L2-normalized float32 rows in `<dir>/<name>.npy`, opened
+    with mmap so every worker process maps the same page-cache pages, plus a
+    row -> doc_id map (with tombstones) in the vec_rows table.
+
+    Writes are append-only: updating a document tombstones its old row and
+    appends a new one. The file is preallocated and grown by doubling (copy to
+    a temp file + atomic rename), so readers holding the old mapping keep a
+    valid view. Writers take writer_lock(), so they are serialized across
+    threads and processes; readers never lock.
+    """
+
+    def __init__(self, name: str, dim: int, root: Optional[Path] = None,
+                 db_path: Optional[str] = None, refresh_sec: float = 1.0) -> None:
+        self.name, self.dim = name, int(dim)
+        self.root = Path(root or _vectors_dir())
+        self.path = self.root / f"{name}.npy"
+        self.db_path = db_path
+        self.refresh_sec = refresh_sec
+        self._lock = threading.Lock()
+        self._mat: Optional[np.ndarray] = None
+        self._file_sig: Optional[Tuple[int, int]] = None
+        self._doc_ids: List[str] = []
+        self._live = np.zeros(0, dtype=bool)
+        self._version = -1
+        self._checked_at = 0.0
+        db.vec_store_state(self.name, self.dim, db_path=db_path)
+
+    # ---- read side -------------------------------------------------------------
+    def _sig(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_sec:
+            return
+        with self._lock:
+            ver = db.vec_store_version(self.name, db_path=self.db_path)
+            sig = self._sig()
+            if ver != self._version:
+                rows = db.vec_rows_load(self.name, db_path=self.db_path)
+                self._doc_ids = [d for _, d, _ in rows]
+                self._live = np.fromiter((not dead for _, _, dead in rows), dtype=bool, count=len(rows))
+            if sig != self._file_sig or ver != self._version:
+                self._mat = self._load_matrix() if sig is not None else None
+                self._file_sig = sig
+            self._version = ver
+            self._checked_at = time.monotonic()
+
+    def _load_matrix(self):
+        return np.load(self.path, mmap_mode="r")
+
+    def __len__(self) -> int:
+        self.refresh()
+        return int(self._live.sum())
+
+    def search(self, query_vec: Sequence[float], top_k: int = 5) -> List[Tuple[str, float]]:
+        """Cosine top-k via one matrix-vector product over the mapped rows."""
+        self.refresh()
+        mat, live, doc_ids = self._mat, self._live, self._doc_ids
+        n = len(doc_ids)
+        if mat is None or n == 0 or not live.any():
+            return []
+        q = normalize(query_vec)[0]
+        if q.shape[0] != self.dim:
+            raise ValueError(f"query dim {q.shape[0]} != store dim {self.dim}")
+        scores = np.asarray(mat[:n] @ q, dtype=np.float32)
+        scores[~live] = -np.inf
+        k = int(min(max(1, top_k), live.sum()))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(doc_ids[i], float(scores[i])) for i in top]
+
+    # ---- write side ------------------------------------------------------------
+    def _capacity(self) -> int:
+        if not self.path.exists():
+            return 0
+        return int(np.load(self.path, mmap_mode="r").shape[0])
+
+    def _ensure_capacity(self, n_used: int, need: int) -> None:
+        cap = self._capacity()
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2, 1024)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".npy.tmp")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(new_cap, self.dim))
+        if n_used and cap:
+            out[:n_used] = np.load(self.path, mmap_mode="r")[:n_used]
+        out.flush()
+        del out
+        os.replace(tmp, self.path)
+
+    def add(self, doc_ids: Sequence[str], vectors, kb_seq: Optional[int] = None) -> int:
+        """Append vectors for `doc_ids` (replacing any live rows for those ids)."""
+        vecs = normalize(vectors) if len(doc_ids) else np.zeros((0, self.dim), np.float32)
+        if vecs.shape[1] != self.dim:
+            raise ValueError(f"vector dim {vecs.shape[1]} != store dim {self.dim}")
+        with writer_lock(self.root):
+            n = db.vec_store_state(self.name, self.dim, db_path=self.db_path)["rows"]
+            if len(doc_ids):
+                self._ensure_capacity(n, n + len(doc_ids))
+                mm = np.load(self.path, mmap_mode="r+")
+                mm[n:n + len(doc_ids)] = vecs
+                mm.flush()
+                del mm
+            db.vec_rows_commit(
+                self.name, [(n + i, d) for i, d in enumerate(doc_ids)], list(doc_ids),
+                kb_seq=kb_seq, db_path=self.db_path,
+            )
+        return len(doc_ids)
+
+    def delete(self, doc_ids: Sequence[str], kb_seq: Optional[int] = None) -> None:
+        with writer_lock(self.root):
+            db.vec_rows_commit(self.name, [], list(doc_ids), kb_seq=kb_seq, db_path=self.db_path)
+
+    def reset(self) -> None:
+        """Drop every row (used before a full rebuild); the file is reused."""
+        with writer_lock(self.root):
+            db.vec_rows_commit(self.name, [], [], kb_seq=0, reset=True, db_path=self.db_path)
+
+    def compact(self) -> None:
+        """Rewrite the matrix without tombstoned rows."""
+        with writer_lock(self.root):
+            self._compact()
+
+    def _compact(self) -> None:
+        rows = db.vec_rows_load(self.name, db_path=self.db_path)
+        keep = [(r, d) for r, d, dead in rows if not dead]
+        if len(keep) == len(rows) or not self.path.exists():
+            return
+        src = np.load(self.path, mmap_mode="r")
+        tmp = self.path.with_suffix(".npy.tmp")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(max(len(keep), 1024), self.dim))
+        if keep:
+            out[:len(keep)] = src[[r for r, _ in keep]]
+        out.flush()
+        del out, src
+        os.replace(tmp, self.path)
+        kb_seq = db.vec_store_state(self.name, self.dim, db_path=self.db_path)["kb_seq"]
+        db.vec_rows_commit(self.name, [(i, d) for i, (_, d) in enumerate(keep)], [],
+                           kb_seq=kb_seq, reset=True, db_path=self.db_path)
+
+class SparseVectorStore(VectorStore):
+    """
+    CSR variant for TF-IDF vectors: data/indices/indptr live as three .npy
+    files per segment directory (`<dir>/<name>/g<N>/`) that are mmapped, and
+    `<dir>/<name>/CURRENT` lists the live segments in row order. Vectors are
+    never densified; top-k is one sparse matrix-vector product per segment.
+
+    Added rows are buffered and written on flush() (or on add(..., kb_seq=...),
+    which marks the end of a sync batch) as a new delta segment, so a sync
+    costs O(new rows) instead of rewriting the whole matrix. The flush after
+    RAG_SPARSE_MAX_SEGMENTS segments (default 8) merges them into one.
+    """
+
+    def __init__(self, name: str, dim: int, root: Optional[Path] = None,
+                 db_path: Optional[str] = None, refresh_sec: float = 1.0) -> None:
+        super().__init__(name, dim, root=root, db_path=db_path, refresh_sec=refresh_sec)
+        self.dir = self.root / name
+        self.path = self.dir / "CURRENT"
+        self.max_segments = max(1, int(os.getenv("RAG_SPARSE_MAX_SEGMENTS", "8")))
+        self._pending: List[Tuple[List[str], Any]] = []
+
+    def _segments(self) -> List[str]:
+        try:
+            return self.path.read_text(encoding="utf-8").split()
+        except OSError:
+            return []
+
+    def _load_segment(self, seg: str):
+        import scipy.sparse as sp
+        gen = self.dir / seg
+        data = np.load(gen / "data.npy", mmap_mode="r")
+        indices = np.load(gen / "indices.npy", mmap_mode="r")
+        indptr = np.load(gen / "indptr.npy", mmap_mode="r")
+        return sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, self.dim), copy=False)
+
+    def _load_matrix(self):
+        return [self._load_segment(seg) for seg in self._segments()]
+
+    def search(self, query_vec, top_k: int = 5) -> List[Tuple[str, float]]:
+        import scipy.sparse as sp
+        from scipy.sparse.linalg import norm as spnorm
+        self.refresh()
+        segs, live, doc_ids = self._mat, self._live, self._doc_ids
+        if not segs or len(doc_ids) == 0 or not live.any():
+            return []
+        q = sp.csr_matrix(query_vec, dtype=np.float32)
+        if q.shape[1] != self.dim:
+            raise ValueError(f"query dim {q.shape[1]} != store dim {self.dim}")
+        qn = spnorm(q)
+        if qn == 0:
+            return []
+        # one query row is tiny; CSR x 1-D vector is a plain SpMV over each segment
+        qv = q.toarray().ravel() / qn
+        scores = np.concatenate([np.asarray(m @ qv).ravel() for m in segs])
+        n = min(len(doc_ids), len(scores))
+        scores, live = scores[:n], live[:n]
+        if not live.any():
+            return []
+        scores[~live] = -np.inf
+        k = int(min(max(1, top_k), live.sum()))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(doc_ids[i], float(scores[i])) for i in top]
+
+    def _write_segment(self, mat, keep: Sequence[str] = ()) -> None:
+        """Write `mat` as a new segment after `keep` and drop every other segment."""
+        import scipy.sparse as sp
+        mat = sp.csr_matrix(mat, dtype=np.float32)
+        gens = [int(p.name[1:]) for p in self.dir.glob("g*") if p.name[1:].isdigit()] if self.dir.exists() else []
+        gen = self.dir / f"g{max(gens, default=0) + 1}"
+        gen.mkdir(parents=True, exist_ok=True)
+        np.save(gen / "data.npy", mat.data)
+        np.save(gen / "indices.npy", mat.indices.astype(np.int32, copy=False))
+        np.save(gen / "indptr.npy", mat.indptr.astype(np.int64, copy=False))
+        live = list(keep) + [gen.name]
+        tmp = self.dir / "CURRENT.tmp"
+        tmp.write_text("\n".join(live), encoding="utf-8")
+        os.replace(tmp, self.path)
+        for old in self.dir.glob("g*"):
+            if old.name not in live:
+                try:  # open mappings stay valid on POSIX; Windows may refuse, retry next time
+                    for f in old.iterdir():
+                        f.unlink()
+                    old.rmdir()
+                except OSError:
+                    pass
+
+    def _current(self, n: int):
+        import scipy.sparse as sp
+        segs = self._load_matrix() if n else []
+        if not segs:
+            return sp.csr_matrix((0, self.dim), dtype=np.float32)
+        return sp.vstack(segs, format="csr")[:n]
+
+    def add(self, doc_ids: Sequence[str], vectors, kb_seq: Optional[int] = None) -> int:
+        if len(doc_ids):
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"vector dim {vectors.shape[1]} != store dim {self.dim}")
+            self._pending.append((list(doc_ids), vectors))
+        if kb_seq is not None:
+            self.flush(kb_seq)
+        return len(doc_ids)
+
+    def flush(self, kb_seq: Optional[int] = None) -> None:
+        import scipy.sparse as sp
+        pending, self._pending = self._pending, []
+        ids = [d for chunk, _ in pending for d in chunk]
+        with writer_lock(self.root):
+            n = db.vec_store_state(self.name, self.dim, db_path=self.db_path)["rows"]
+            if pending:
+                delta = sp.vstack([m for _, m in pending], format="csr")
+                names = self._segments() if n else []
+                rows = sum(self._load_segment(seg).shape[0] for seg in names)
+                if rows == n and len(names) < self.max_segments:
+                    self._write_segment(delta, keep=names)
+                else:  # merge; also drops rows a failed flush wrote past the row map
+                    self._write_segment(sp.vstack([self._current(n), delta], format="csr"))
+            db.vec_rows_commit(self.name, [(n + i, d) for i, d in enumerate(ids)], ids,
+                               kb_seq=kb_seq, db_path=self.db_path)
+
+    def reset(self) -> None:
+        self._pending = []
+        super().reset()
+
+    def _compact(self) -> None:
+        rows = db.vec_rows_load(self.name, db_path=self.db_path)
+        keep = [(r, d) for r, d, dead in rows if not dead]
+        if len(keep) == len(rows) or not self.path.exists():
+            return
+        self._write_segment(self._current(len(rows))[[r for r, _ in keep]])
+        kb_seq = db.vec_store_state(self.name, self.dim, db_path=self.db_path)["kb_seq"]
+        db.vec_rows_commit(self.name, [(i, d) for i, (_, d) in enumerate(keep)], [],
+                           kb_seq=kb_seq, reset=True, db_path=self.db_path)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 def _split_sentences(text: str) -> List[str]:
     if not text: return []
@@ -12,91 +12,127 @@ def _split_sentences(text: str) -> List[str]:
             if s: out.append(s)
     return out
 
-def _choose_excerpt(contract_text: str, atom_summary: str, llm_snippet: str, window: int = 220) -> str:
-    # 1) Prefer LLM snippet if provided
-    if llm_snippet and len(llm_snippet.strip()) >= 20:
-        return llm_snippet.strip()
-    # 2) Sentence similarity (TF-IDF -> fallback to token-overlap)
-    sents = _split_sentences(contract_text)
-    if not sents: return ""
-    try:
-        from sklearn.feature_extraction.text import TfidfVectorizer
-        from sklearn.metrics.pairwise import cosine_similarity
-        vec = TfidfVectorizer(ngram_range=(1,2), min_df=1, max_features=20000)
-        X = vec.fit_transform(sents)
-        q = vec.transform([atom_summary or ""])
-        sims = cosine_similarity(q, X).ravel()
-        i = int(sims.argmax())
+class SentenceIndex:
+    """
+    Sentences of one contract, split and TF-IDF vectorized once; any number of
+    finding summaries are then ranked with one sparse matrix product. Falls back
+    to token-overlap (Jaccard) over precomputed token sets without sklearn.
+    """
+
+    def __init__(self, contract_text: str) -> None:
+        self.sents = _split_sentences(contract_text)
+        self._vec = self._X = None
+        self._tokens: Optional[List[set]] = None
+        if not self.sents:
+            return
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._vec = TfidfVectorizer(ngram_range=(1,2), min_df=1, max_features=20000)
+            self._X = self._vec.fit_transform(self.sents)
+        except Exception:
+            self._vec = self._X = None
+            self._tokens = [set(x.lower().split()) for x in self.sents]
+
+    def best(self, summaries: List[str]) -> List[int]:
+        """Index of the best-matching sentence for each summary (first on ties)."""
+        if not self.sents:
+            return [-1] * len(summaries)
+        if self._vec is not None:
+            # rows are L2-normalized, so Q @ X.T is cosine similarity
+            sims = (self._vec.transform([q or "" for q in summaries]) @ self._X.T).toarray()
+            return [int(i) for i in sims.argmax(axis=1)]
+        out = []
+        for q in summaries:
+            sq = set((q or "").lower().split())
+            best_i, best_sc = 0, -1.0
+            for i, st in enumerate(self._tokens):
+                sc = len(st & sq) / max(1, len(st | sq))
+                if sc > best_sc: best_i, best_sc = i, sc
+            out.append(best_i)
+        return out
+
+    def excerpt(self, i: int, window: int = 220) -> str:
+        if i < 0:
+            return ""
+        sents = self.sents
         left  = (sents[i-1] + ". ") if i-1 >= 0 else ""
         right = (". " + sents[i+1]) if i+1 < len(sents) else ""
         ex = (left + sents[i] + right).strip()
         return ex[:window*2] if len(ex) > window*2 else ex
-    except Exception:
-        # token overlap
-        def score(a: str, b: str) -> float:
-            sa, sb = set(a.lower().split()), set(b.lower().split())
-            return len(sa & sb) / max(1, len(sa | sb))
-        best_i, best_sc = 0, -1.0
-        for i, s in enumerate(sents):
-            sc = score(s, atom_summary or "")
-            if sc > best_sc: best_i, best_sc = i, sc
-        left  = (sents[best_i-1] + ". ") if best_i-1 >= 0 else ""
-        right = (". " + sents[best_i+1]) if best_i+1 < len(sents) else ""
-        ex = (left + sents[best_i] + right).strip()
-        return ex[:window*2] if len(ex) > window*2 else ex
+
+def _choose_excerpt(contract_text: str, atom_summary: str, llm_snippet: str, window: int = 220,
+                    index: Optional[SentenceIndex] = None) -> str:
+    # 1) Prefer LLM snippet if provided
+    if llm_snippet and len(llm_snippet.strip()) >= 20:
+        return llm_snippet.strip()
+    # 2) Sentence similarity (TF-IDF -> fallback to token-overlap)
+    index = index or SentenceIndex(contract_text)
+    return index.excerpt(index.best([atom_summary or ""])[0], window)
+
+# Fixed Russian templates; also pre-translated by scripts/warm_translations.py.
+REASON_TAIL = (
+    "По сути, формулировка ограничивает права заемщика и противоречит обязательным требованиям НБКР. "
+    "Она создает риск необоснованных расходов для клиента и снижает прозрачность условий. "
+    "Требуется привести договор в соответствие с нормами и исключить двусмысленность."
+)
+
+FIX_TEMPLATES: Dict[str, str] = {
+    "prepayment": (
+        "Заменить условие о досрочном погашении на: "
+        "«Заемщик вправе погасить кредит полностью или частично в любое время "
+        "без взимания каких-либо комиссий, штрафных санкций и иных платежей. "
+        "Проценты начисляются только до фактической даты досрочного погашения»."
+    ),
+    "penalty": (
+        "Скорректировать пункт о неустойке: "
+        "«Размер неустойки не превышает процентную ставку по кредиту; "
+        "суммарный размер всех штрафов/пеней за весь срок кредита — не более 10% от суммы кредита»."
+    ),
+    "cession": (
+        "Исключить право уступки без согласия заемщика и указать: "
+        "«Уступка права требования допускается исключительно при наличии письменного согласия заемщика»."
+    ),
+    "default": "Сформулировать пункт в соответствии с нормами НБКР, исключив односторонние права и неполные раскрытия.",
+}
 
 def _reason_long(rule_title: str, law_titles: List[str]) -> str:
     parts = [f"Данный пункт договора нарушает правило: «{rule_title}». "]
     if law_titles:
         parts.append("Соответствующие нормы: " + "; ".join(law_titles) + ". ")
-    parts.append(
-        "По сути, формулировка ограничивает права заемщика и противоречит обязательным требованиям НБКР. "
-        "Она создает риск необоснованных расходов для клиента и снижает прозрачность условий. "
-        "Требуется привести договор в соответствие с нормами и исключить двусмысленность."
-    )
+    parts.append(REASON_TAIL)
     return "".join(parts)
 
 def _suggested_fix(rule_title: str) -> str:
     lt = (rule_title or "").lower()
     if "early repayment" in lt or "досроч" in lt:
-        return (
-            "Заменить условие о досрочном погашении на: "
-            "«Заемщик вправе погасить кредит полностью или частично в любое время "
-            "без взимания каких-либо комиссий, штрафных санкций и иных платежей. "
-            "Проценты начисляются только до фактической даты досрочного погашения»."
-        )
+        return FIX_TEMPLATES["prepayment"]
     if "penalty" in lt or "неусто" in lt:
-        return (
-            "Скорректировать пункт о неустойке: "
-            "«Размер неустойки не превышает процентную ставку по кредиту; "
-            "суммарный размер всех штрафов/пеней за весь срок кредита — не более 10% от суммы кредита»."
-        )
+        return FIX_TEMPLATES["penalty"]
     if "cession" in lt or "уступк" in lt:
-        return (
-            "Исключить право уступки без согласия заемщика и указать: "
-            "«Уступка права требования допускается исключительно при наличии письменного согласия заемщика»."
-        )
-    return (
-        "Сформулировать пункт в соответствии с нормами НБКР, исключив односторонние права и неполные раскрытия."
-    )
+        return FIX_TEMPLATES["cession"]
+    return FIX_TEMPLATES["default"]
 
 def enrich_findings_ai(findings: List[Dict[str, Any]], contract_text: str) -> List[Dict[str, Any]]:
     """
     Add real contract excerpt, detailed reason, and elaborate fix — AI-only (no regex).
     """
+    # findings without a usable LLM snippet are ranked together against one sentence index
+    need = [i for i, it in enumerate(findings) if len((it.get("offending_text") or "").strip()) < 20]
+    ranked: Dict[int, str] = {}
+    if need:
+        index = SentenceIndex(contract_text)
+        picks = index.best([findings[i].get("summary") or findings[i].get("title") or "" for i in need])
+        ranked = {i: index.excerpt(j) for i, j in zip(need, picks)}
+
     out = []
-    for it in findings:
+    for n, it in enumerate(findings):
         rule_title = it.get("title") or it.get("summary") or ""
         law_titles = []
         for c in it.get("citations", []) or []:
             t = c.get("title") or c.get("ref")
             if t: law_titles.append(t)
 
-        excerpt = _choose_excerpt(
-            contract_text=contract_text,
-            atom_summary=it.get("summary") or it.get("title") or "",
-            llm_snippet=it.get("offending_text") or "",
-        )
+        excerpt = ranked[n] if n in ranked else (it.get("offending_text") or "").strip()
         it["clause_excerpt"] = excerpt
         it["reason_long"]    = _reason_long(rule_title, law_titles)
         it["suggested_fix"]  = _suggested_fix(rule_title)
@@ -106,25 +142,25 @@ def enrich_findings_ai(findings: List[Dict[str, Any]], contract_text: str) -> Li
 async def add_multilang(items: List[Dict[str, Any]], translate_fn) -> List[Dict[str, Any]]:
     """
     Populate multi_lang with true translations (EN, KY). RU stays original.
+    All (text, lang) pairs of the report are deduped and translated concurrently
+    (TRANSLATE_CONCURRENCY), so shared templates are translated once.
     """
+    from src.agent.i18n import scheduler_for
+    fields = ("clause_excerpt", "reason_long", "suggested_fix")
+    pairs = [(it.get(f) or "", lang) for it in items for f in fields for lang in ("en", "ky")]
+    done = await scheduler_for(translate_fn).translate_all(pairs)
+    tr = lambda text, lang: done.get((text, lang), text) if text else text
+
     out = []
     for it in items:
         ru_ex = it.get("clause_excerpt") or ""
         ru_why = it.get("reason_long") or ""
         ru_fix = it.get("suggested_fix") or ""
 
-        en_ex = await translate_fn(ru_ex, "en")
-        en_why = await translate_fn(ru_why, "en")
-        en_fix = await translate_fn(ru_fix, "en")
-
-        ky_ex = await translate_fn(ru_ex, "ky")
-        ky_why = await translate_fn(ru_why, "ky")
-        ky_fix = await translate_fn(ru_fix, "ky")
-
         it["multi_lang"] = {
             "ru": {"excerpt": ru_ex, "why": ru_why, "fix": ru_fix},
-            "en": {"excerpt": en_ex, "why": en_why, "fix": en_fix},
-            "ky": {"excerpt": ky_ex, "why": ky_why, "fix": ky_fix},
+            "en": {"excerpt": tr(ru_ex, "en"), "why": tr(ru_why, "en"), "fix": tr(ru_fix, "en")},
+            "ky": {"excerpt": tr(ru_ex, "ky"), "why": tr(ru_why, "ky"), "fix": tr(ru_fix, "ky")},
         }
         out.append(it)
     return out
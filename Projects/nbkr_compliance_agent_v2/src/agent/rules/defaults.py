@@ -0,0 +1,114 @@
+# src/agent/rules/defaults.py
+"""
+Built-in policy rules, seeded into rule_atoms / rule_support when the table
+has no policy rules yet. After seeding, the database is the source of truth.
+
+Predicate DSL (JSON): {"all": [...]}, {"any": [...]}, {"not": p},
+{"ref": "hints_any" | "must_not" | "must_have"}, {"terms_any": [...]},
+{"terms_all": [...]}, {"regex": "..."}. A missing predicate means
+hints_any AND (must_not present OR must_have missing).
+"""
+from __future__ import annotations
+from typing import Any, Dict, List
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "code": "prepayment_no_fees",
+        "law_ref": "П.21(7)",
+        "title": "Right to early repayment without fees",
+        "title_ru": "Право на досрочное погашение без комиссий",
+        "title_ky": "Комиссиясыз мөөнөтүнөн мурда төлөө укугу",
+        "mandatory": True,
+        "hints_any": ["досроч", "предварительного уведомления", "погасить", "погашение"],
+        "must_not": ["комисс", "штраф", "иной платеж"],
+        "must_have": [],
+        "predicate": {"all": [
+            {"ref": "hints_any"},
+            {"any": [
+                {"regex": "30\\s*дн"},
+                {"terms_any": ["предварительного уведомления"]},
+                {"terms_any": ["комисси", "штраф", "иной платеж"]},
+            ]},
+        ]},
+        "severity": "high",
+        "confidence": 0.85,
+        "reasons": {
+            "en": "Borrower must be able to prepay at any time without any commissions or penalties; a 30-day notice requirement is not compliant with NBKR П.21(7).",
+            "ru": "Заемщик должен иметь право досрочно погашать кредит в любое время без комиссий и штрафов; требование 30-дневного уведомления не соответствует НБКР П.21(7).",
+        },
+        "fixes": {
+            "ru": "Заемщик вправе досрочно погасить кредит полностью или частично в любое время без каких-либо комиссий, штрафов или иных платежей. Банк производит перерасчет процентов только за фактический период пользования кредитом.",
+            "en": "The borrower may prepay in full or in part at any time without any fees, penalties or other charges. Interest is recalculated only for the actual borrowing period.",
+            "ky": "Заем алуучу ар дайым толук же бөлүп мөөнөтүнөн мурда акысыз (айыпсыз) төлөй алат. Пайыздар фактический колдонулган убакыт үчүн гана эсептелет.",
+        },
+    },
+    {
+        "code": "penalty_cap_10",
+        "law_ref": "П.21(8)",
+        "title": "Excessive penalties for late payment",
+        "title_ru": "Чрезмерные штрафы за просрочку",
+        "title_ky": "Кечиктирүү боюнча ашыкча айыптар",
+        "mandatory": True,
+        "hints_any": ["неустойк", "штраф", "пен", "%", "процент"],
+        "must_not": ["20 процент", "20%"],
+        "must_have": [],
+        "predicate": {"any": [{"ref": "must_not"}, {"regex": "20\\s*%|20\\s*процент"}]},
+        "severity": "high",
+        "confidence": 0.85,
+        "reasons": {
+            "en": "NBKR П.21(8) caps total penalties over the loan term at 10% of principal and the penalty rate must not exceed the loan interest rate.",
+            "ru": "НБКР П.21(8) ограничивает суммарную неустойку за весь срок кредита 10% от суммы кредита; ставка неустойки не должна превышать процентную ставку по кредиту.",
+        },
+        "fixes": {
+            "ru": "Размер неустойки за весь период действия кредита не превышает 10% от суммы кредита; ставка неустойки не выше процентной ставки по кредиту.",
+            "en": "Total penalties over the loan term do not exceed 10% of principal; the penalty rate does not exceed the loan interest rate.",
+            "ky": "Айыптардын жалпы суммасы кредит мөөнөтүндө негизги сумманын 10%ынан ашпайт; айып чени кредиттик пайыздык ченден жогору эмес.",
+        },
+    },
+    {
+        "code": "penalty_rate_le_credit_rate",
+        "law_ref": "П.21(8)",
+        "title": "Penalty rate must not exceed loan rate",
+        "title_ru": "Ставка неустойки не выше ставки по кредиту",
+        "title_ky": "Айып чени кредит ченинен жогору эмес",
+        "mandatory": True,
+        "hints_any": ["ставк", "неустойк", "штраф", "пен"],
+        "must_not": [],
+        "must_have": ["не более процентной ставки по кредиту"],
+        "predicate": {"all": [{"ref": "hints_any"}, {"not": {"ref": "must_have"}}]},
+        "severity": "medium",
+        "confidence": 0.75,
+        "reasons": {
+            "en": "NBKR П.21(8) requires the penalty rate not to exceed the loan rate. The contract should state this explicitly.",
+            "ru": "НБКР П.21(8) требует, чтобы ставка неустойки не превышала ставку по кредиту. Это должно быть прямо указано в договоре.",
+        },
+        "fixes": {
+            "ru": "Ставка неустойки за просрочку не превышает процентную ставку по кредиту.",
+            "en": "The penalty rate for late payment does not exceed the loan interest rate.",
+            "ky": "Кечиккен төлөм үчүн айып чени кредиттик пайыздык ченден жогору болбойт.",
+        },
+    },
+    {
+        "code": "fees_annex_only",
+        "law_ref": "П.42",
+        "title": "All fees must be listed in Annex 6",
+        "title_ru": "Все комиссии только по Перечню (Прил. 6)",
+        "title_ky": "Бардык комиссиялар тиркеме 6да гана",
+        "mandatory": True,
+        "hints_any": ["расход", "перечень", "комисс", "штраф", "Приложени", "Прил."],
+        "must_not": [],
+        "must_have": ["перечень расходов", "не допускается включение дополнительных сборов"],
+        "predicate": {"all": [{"ref": "hints_any"}, {"terms_any": ["дополнительные платежи", "тариф"]}]},
+        "severity": "medium",
+        "confidence": 0.75,
+        "reasons": {
+            "en": "NBKR П.42 requires all fees to be listed in Annex 6; adding extra charges or paid services outside the Annex is prohibited.",
+            "ru": "НБКР П.42 требует указывать все комиссии в Перечне (Приложение 6); дополнительные сборы и платные услуги вне Перечня запрещены.",
+        },
+        "fixes": {
+            "ru": "Все комиссии и расходы указываются в Перечне (Приложение 6). Включение дополнительных сборов и платных сопутствующих услуг вне Перечня запрещается.",
+            "en": "All fees must be listed in Annex 6. Adding extra charges or paid ancillary services outside the Annex is prohibited.",
+            "ky": "Бардык комиссиялар жана чыгымдар Тиркеме 6да көрсөтүлөт. Тизмеден тышкары кошумча жыйымдарды киргизүүгө тыюу салынат.",
+        },
+    },
+]
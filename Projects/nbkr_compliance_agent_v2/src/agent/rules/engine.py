@@ -0,0 +1,137 @@
+# src/agent/rules/engine.py
+from __future__ import annotations
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+def _build_trie(terms: Iterable[str]) -> Dict[str, Any]:
+    trie: Dict[str, Any] = {}
+    for t in terms:
+        node = trie
+        for ch in t:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    return trie
+
+def _trie_pattern(trie: Dict[str, Any]) -> str:
+    """
+    Regex for a set of literals shaped like a trie (`ком(?:исс(?:и)?)`), so the
+    work at each text position is bounded by term length, not term count.
+    Optional tails are greedy, so the longest term starting at a position wins.
+    """
+
+    def walk(node: Dict[str, Any]) -> str:
+        end = "" in node
+        alts = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if end:
+            return (f"(?:{body})?" if len(alts) == 1 else body + "?")
+        return body
+
+    return walk(trie)
+
+class ScanResult:
+    """First occurrence of every matched term / pattern in one contract text."""
+
+    __slots__ = ("text", "first", "patterns")
+
+    def __init__(self, text: str, first: Dict[str, int], patterns: Dict[str, Tuple[int, int]]) -> None:
+        self.text = text
+        self.first = first
+        self.patterns = patterns
+
+    def has(self, term: str) -> bool:
+        return term.lower() in self.first
+
+    def any(self, terms: Iterable[str]) -> bool:
+        return any(t.lower() in self.first for t in terms)
+
+    def all(self, terms: Iterable[str]) -> bool:
+        return all(t.lower() in self.first for t in terms)
+
+    def pattern(self, name: str) -> bool:
+        return name in self.patterns
+
+    def span(self, term: str) -> Optional[Tuple[int, int]]:
+        t = term.lower()
+        pos = self.first.get(t)
+        return None if pos is None else (pos, pos + len(t))
+
+class RuleEngine:
+    """
+    Compiled matcher over every `hints_any` / `must_not` / `must_have` term of
+    a rule set (plus `extra_terms` used by rule logic). scan() lowercases the
+    contract once and finds the first occurrence of every term in one pass of
+    a single trie regex wrapped in a lookahead; terms that are substrings of a
+    longer match are derived from a precomputed closure instead of rescanning.
+    `patterns` are named regexes (e.g. r"30\\s*дн") compiled once.
+    """
+
+    FIELDS = ("hints_any", "must_not", "must_have")
+
+    def __init__(self, atoms: List[Dict[str, Any]], extra_terms: Iterable[str] = (),
+                 patterns: Optional[Dict[str, str]] = None) -> None:
+        self.atoms = atoms
+        terms = {t.lower() for a in atoms for f in self.FIELDS for t in (a.get(f) or []) if t}
+        terms |= {t.lower() for t in extra_terms if t}
+        self.terms = sorted(terms, key=lambda t: (-len(t), t))
+        trie = _build_trie(self.terms)
+        self._rx = re.compile("(?=(" + _trie_pattern(trie) + "))") if self.terms else None
+        self._rx_i: Optional[re.Pattern] = None
+        # term -> [(other term, offset inside term)] for every other term it contains,
+        # found by walking the trie from each offset (cost ~ len(term)^2, not #terms)
+        self._closure: Dict[str, List[Tuple[str, int]]] = {}
+        for t in self.terms:
+            inner = []
+            for i in range(len(t)):
+                node = trie
+                for j in range(i, len(t)):
+                    node = node.get(t[j])
+                    if node is None:
+                        break
+                    if "" in node and (i, j + 1) != (0, len(t)):
+                        inner.append((t[i:j + 1], i))
+            if inner:
+                self._closure[t] = inner
+        self.patterns = {n: re.compile(p, re.I) for n, p in (patterns or {}).items()}
+
+    def scan(self, text: str) -> ScanResult:
+        text = text or ""
+        low = text.lower()
+        first: Dict[str, int] = {}
+        if self._rx is not None:
+            if len(low) == len(text):
+                rx, hay = self._rx, low
+            else:
+                # lower() changed the length (rare ligatures), so offsets would drift:
+                # match case-insensitively on the original text instead
+                if self._rx_i is None:
+                    self._rx_i = re.compile(self._rx.pattern, re.I)
+                rx, hay = self._rx_i, text
+            n_terms = len(self.terms)
+            for m in rx.finditer(hay):
+                t, pos = m.group(1).lower(), m.start()
+                if t not in first:
+                    first[t] = pos
+                for o, off in self._closure.get(t, ()):
+                    if o not in first or first[o] > pos + off:
+                        first[o] = pos + off
+                if len(first) == n_terms:
+                    break
+        pats = {}
+        for name, rx in self.patterns.items():
+            m = rx.search(text)
+            if m:
+                pats[name] = m.span()
+        return ScanResult(text, first, pats)
+
+    def excerpt(self, scan: ScanResult, rule: Dict[str, Any], before: int = 120, after: int = 220) -> Optional[str]:
+        """Context around the first candidate term (must_not, then hints_any) found in the text."""
+        for term in (rule.get("must_not") or []) + (rule.get("hints_any") or []):
+            sp = scan.span(term)
+            if sp:
+                s = max(0, sp[0] - before)
+                e = min(len(scan.text), sp[1] + after)
+                return re.sub(r"\s+", " ", scan.text[s:e]).strip()
+        return None
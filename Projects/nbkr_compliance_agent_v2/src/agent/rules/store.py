@@ -0,0 +1,100 @@
+# src/agent/rules/store.py
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from src.agent.storage import db
+from src.agent.rules.engine import RuleEngine, ScanResult
+
+log = logging.getLogger(__name__)
+
+Predicate = Callable[[ScanResult], bool]
+
+# hints_any AND (must_not present OR must_have missing)
+DEFAULT_PREDICATE = {"all": [{"ref": "hints_any"}, {"any": [{"ref": "must_not"}, {"not": {"ref": "must_have"}}]}]}
+
+def compile_predicate(node: Any, rule: Dict[str, Any], terms: Set[str], patterns: Dict[str, str]) -> Predicate:
+    """
+    Turn a predicate DSL node into a closure over a ScanResult, collecting the
+    literals and regexes it needs into `terms` / `patterns` for the engine.
+    """
+    if not isinstance(node, dict) or len(node) != 1:
+        raise ValueError(f"bad predicate node: {node!r}")
+    (op, arg), = node.items()
+    if op in ("all", "any"):
+        subs = [compile_predicate(n, rule, terms, patterns) for n in arg]
+        return (lambda s: all(p(s) for p in subs)) if op == "all" else (lambda s: any(p(s) for p in subs))
+    if op == "not":
+        sub = compile_predicate(arg, rule, terms, patterns)
+        return lambda s: not sub(s)
+    if op == "ref":
+        xs = list(rule.get(arg) or [])
+        if arg == "hints_any":
+            return lambda s: not xs or s.any(xs)
+        if arg == "must_have":
+            return lambda s: not xs or s.all(xs)
+        if arg == "must_not":
+            return lambda s: bool(xs) and s.any(xs)
+        raise ValueError(f"unknown ref: {arg!r}")
+    if op in ("terms_any", "terms_all"):
+        xs = [str(t) for t in arg]
+        terms.update(xs)
+        return (lambda s: s.any(xs)) if op == "terms_any" else (lambda s: s.all(xs))
+    if op == "regex":
+        patterns.setdefault(arg, arg)
+        return lambda s: s.pattern(arg)
+    raise ValueError(f"unknown predicate op: {op!r}")
+
+class RuleSet:
+    """Immutable snapshot: rules, their compiled predicates and one RuleEngine over all their terms."""
+
+    def __init__(self, version: int, atoms: List[Dict[str, Any]]) -> None:
+        self.version = version
+        terms: Set[str] = set()
+        patterns: Dict[str, str] = {}
+        self.predicates: Dict[str, Predicate] = {}
+        ok = []
+        for a in atoms:
+            try:
+                self.predicates[a["code"]] = compile_predicate(a.get("predicate") or DEFAULT_PREDICATE, a, terms, patterns)
+                ok.append(a)
+            except (ValueError, TypeError, KeyError) as e:
+                log.warning("[rules] skipping rule %s: %s", a.get("code"), e)
+        self.atoms = ok
+        self.engine = RuleEngine(ok, extra_terms=terms, patterns=patterns)
+
+    def evaluate(self, text: str):
+        """(scan, [rules whose predicate holds]) for one contract text."""
+        scan = self.engine.scan(text)
+        return scan, [a for a in self.atoms if self.predicates[a["code"]](scan)]
+
+_CURRENT: Optional[RuleSet] = None
+_CHECKED_AT = 0.0
+_LOCK = threading.Lock()
+
+def current_rules(force: bool = False) -> RuleSet:
+    """
+    The live RuleSet. rules_version is checked at most every RULES_REFRESH_SEC;
+    when triggers have bumped it, a new RuleSet is built off to the side and
+    swapped in with one assignment, so readers never see a half-built set.
+    """
+    global _CURRENT, _CHECKED_AT
+    cur = _CURRENT
+    now = time.monotonic()
+    if cur is not None and not force and now - _CHECKED_AT < float(os.getenv("RULES_REFRESH_SEC", "2")):
+        return cur
+    with _LOCK:
+        cur = _CURRENT
+        if cur is not None and not force and now - _CHECKED_AT < float(os.getenv("RULES_REFRESH_SEC", "2")):
+            return cur
+        db.init_schema()
+        if cur is None or force or db.rules_version() != cur.version:
+            version, atoms = db.load_policy_rules()
+            cur = RuleSet(version, atoms)
+            _CURRENT = cur
+            log.info("[rules] loaded %d policy rules (version %d)", len(cur.atoms), version)
+        _CHECKED_AT = time.monotonic()
+        return cur
@@ -0,0 +1,176 @@
+# src/agent/scan.py
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, Future, wait
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.agent.jobs import worker_orchestrator, worker_pool
+from src.agent.orchestrator import AnalyzeInput
+from src.agent.storage import db
+
+log = logging.getLogger(__name__)
+
+DEFAULT_GOAL = "Scheduled compliance scan"
+# the OCR plugin reads PDFs, images and plain text; Word files need converting first
+DEFAULT_EXTENSIONS = ".pdf,.png,.jpg,.jpeg,.tif,.tiff,.bmp,.txt"
+
+def _extensions() -> Tuple[str, ...]:
+    raw = os.getenv("SCAN_EXTENSIONS", DEFAULT_EXTENSIONS)
+    return tuple(e.strip().lower() for e in raw.split(",") if e.strip())
+
+def iter_files(root: str, exts: Tuple[str, ...]) -> Iterator[Tuple[str, os.stat_result]]:
+    """Files under `root` with a matching extension, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.startswith(("~$", ".")) or not name.lower().endswith(exts):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                yield path, os.stat(path)
+            except OSError:
+                continue
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def analyze_file(path: str, goal: str) -> Dict[str, Any]:
+    """Worker side: read one file and run the full pipeline on it."""
+    with open(path, "rb") as f:
+        data = f.read()
+    ct = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return asyncio.run(worker_orchestrator().analyze(
+        AnalyzeInput(goal=goal, file_bytes=data, filename=os.path.basename(path), content_type=ct)))
+
+def scan_folder(folder: Optional[str] = None, goal: Optional[str] = None, workers: Optional[int] = None,
+                resume: bool = True) -> Dict[str, Any]:
+    """
+    Analyse every new contract under `folder` (default SCHED_SCAN_DIR) and store
+    one report per file in `reports`.
+
+    Files whose content hash already has a finished report for `goal` are
+    skipped, so an interrupted sweep picks up where it stopped. Hashes of
+    unchanged files (same size + mtime) come from `scan_files` instead of being
+    re-read. OCR and policy run in SCAN_WORKERS processes (default CPU count)
+    at SCAN_NICE priority; progress is checkpointed in `scan_runs` every
+    SCAN_CHECKPOINT_EVERY files.
+    """
+    from src.settings import settings
+    folder = os.path.abspath(folder or settings.SCHED_SCAN_DIR)
+    goal = goal or os.getenv("SCAN_GOAL", DEFAULT_GOAL)
+    workers = max(1, workers or int(os.getenv("SCAN_WORKERS", str(os.cpu_count() or 1))))
+    every = max(1, int(os.getenv("SCAN_CHECKPOINT_EVERY", "50")))
+    nice = int(os.getenv("SCAN_NICE", "10"))
+
+    run_id, resumed = db.open_scan_run(folder, goal, resume=resume)
+    known = db.get_scan_files()
+    finished = db.report_hashes(goal)
+    counts = {"seen": 0, "done": 0, "skipped": 0, "failed": 0}
+    stage_ms: Dict[str, float] = {}
+    hashed = []
+    t0 = time.perf_counter()
+    log.info("[scan] run %d %s: %s (goal=%r, workers=%d)", run_id, "resumed" if resumed else "started", folder, goal, workers)
+
+    def candidates() -> Iterator[Tuple[str, str]]:
+        for path, st in iter_files(folder, _extensions()):
+            counts["seen"] += 1
+            k = known.get(path)
+            if k and k["size"] == st.st_size and k["mtime_ns"] == st.st_mtime_ns:
+                sha = k["sha256"]
+            else:
+                try:
+                    sha = _sha256_file(path)
+                except OSError as e:
+                    log.warning("[scan] cannot read %s: %s", path, e)
+                    counts["failed"] += 1
+                    continue
+                hashed.append((path, st.st_size, st.st_mtime_ns, sha))
+            if sha in finished:
+                counts["skipped"] += 1
+                continue
+            finished.add(sha)  # copies of the same file later in this run
+            yield path, sha
+
+    def checkpoint(status: str = "running") -> None:
+        if hashed:
+            db.upsert_scan_files(hashed)
+            hashed.clear()
+        db.checkpoint_scan_run(run_id, counts, {k: round(v, 1) for k, v in stage_ms.items()}, status=status)
+
+    def failed(path: str, sha: str, err: str) -> None:
+        counts["failed"] += 1
+        log.warning("[scan] %s failed: %s", path, err)
+        job_id, created = db.create_job(uuid.uuid4().hex, sha, goal, path)
+        if created:
+            db.fail_job(job_id, err)
+
+    pool = worker_pool(workers, nice)
+    inflight: Dict[Future, Tuple[str, str]] = {}
+    todo = candidates()
+    since = 0
+    status = "interrupted"
+    try:
+        while True:
+            while len(inflight) < workers * 2:
+                nxt = next(todo, None)
+                if nxt is None:
+                    break
+                inflight[pool.submit(analyze_file, nxt[0], goal)] = nxt
+            if not inflight:
+                break
+            ready, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            broken = False
+            for fut in ready:
+                path, sha = inflight.pop(fut)
+                since += 1
+                try:
+                    res = fut.result()
+                except BrokenExecutor as e:
+                    broken = True
+                    failed(path, sha, f"{type(e).__name__}: {e}")
+                    continue
+                except Exception as e:
+                    failed(path, sha, f"{type(e).__name__}: {e}")
+                    continue
+                timings = (res.get("run_summary") or {}).get("timings_ms") or {}
+                for stage, ms in timings.items():
+                    stage_ms[stage] = stage_ms.get(stage, 0.0) + float(ms or 0)
+                db.save_report(path, goal, sha, res, timings)
+                counts["done"] += 1
+            if broken:
+                # a worker died (e.g. OOM on a huge scan); everything it shared the pool with is lost too
+                for fut, (path, sha) in inflight.items():
+                    failed(path, sha, "worker pool restarted")
+                inflight.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = worker_pool(workers, nice)
+            if since >= every:
+                checkpoint()
+                since = 0
+        status = "done"
+    finally:
+        pool.shutdown(wait=status == "done", cancel_futures=True)
+        checkpoint(status)
+
+    elapsed = time.perf_counter() - t0
+    processed = counts["done"] + counts["failed"]
+    summary = {
+        "run_id": run_id, "resumed": resumed, "folder": folder, "goal": goal, "status": status, **counts,
+        "elapsed_sec": round(elapsed, 1), "files_per_sec": round(processed / elapsed, 3) if elapsed else 0.0,
+        "stage_ms": {k: round(v, 1) for k, v in stage_ms.items()},
+        "stage_ms_avg": {k: round(v / counts["done"], 1) for k, v in stage_ms.items()} if counts["done"] else {},
+    }
+    log.info("[scan] run %d %s: %d seen, %d analysed, %d skipped, %d failed in %.1fs (%.2f files/s); avg stage ms %s",
+             run_id, status, counts["seen"], counts["done"], counts["skipped"], counts["failed"],
+             elapsed, summary["files_per_sec"], summary["stage_ms_avg"])
+    return summary
@@ -0,0 +1,173 @@
+# src/agent/scheduler.py
+from __future__ import annotations
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from apscheduler.executors.pool import ThreadPoolExecutor as _APThreadPool
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+except Exception:  # optional dependency
+    BackgroundScheduler = None
+
+from src.agent.storage import db
+
+log = logging.getLogger(__name__)
+
+# legacy SCHED_FREQUENCY values; sweeps default to the small hours
+ALIASES = {
+    "hourly": "0 * * * *",
+    "daily": "0 2 * * *",
+    "nightly": "0 2 * * *",
+    "weekly": "0 2 * * sun",
+    "monthly": "0 2 1 * *",
+}
+_EVERY = re.compile(r"^(?:every\s+)?(\d+)\s*([smhd])$", re.I)
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_trigger(spec: str, jitter: Optional[int] = None, timezone: Optional[str] = None):
+    """
+    Trigger for a schedule's `cron` column:
+      "0 2 * * *"            5-field crontab (day-of-week by name or 0-6 = mon-sun, APScheduler style)
+      "daily", "@hourly", …  aliases above
+      "every 6h", "30m"      fixed interval (s/m/h/d)
+    Raises ValueError for anything else.
+    """
+    s = (spec or "daily").strip().lower().lstrip("@")
+    m = _EVERY.match(s)
+    if m:
+        return IntervalTrigger(seconds=int(m.group(1)) * _UNITS[m.group(2)], jitter=jitter, timezone=timezone)
+    fields = ALIASES.get(s, s).split()
+    if len(fields) != 5:
+        raise ValueError(f"unsupported schedule {spec!r}")
+    minute, hour, day, month, dow = fields
+    return CronTrigger(minute=minute, hour=hour, day=day, month=month, day_of_week=dow,
+                       jitter=jitter, timezone=timezone)
+
+class ScanScheduler:
+    """
+    Runs folder scans (src.agent.scan.scan_folder) for every enabled row of
+    `schedules`.
+
+    - Each schedule is one APScheduler job (max_instances=1, coalesced misfires).
+      A DB claim on the row also keeps two app processes from running it at once.
+    - At most SCHED_MAX_CONCURRENT sweeps run at a time.
+    - Each sweep gets at most `max_workers` (default SCHED_MAX_WORKERS, half the
+      cores) low-priority processes, leaving CPU for interactive /analyze.
+    - Start times are spread by `jitter_sec` (default SCHED_JITTER_SEC).
+    - Rows are re-read every SCHED_RELOAD_SEC, so edits apply without a restart.
+    """
+
+    def __init__(self) -> None:
+        self.max_concurrent = max(1, int(os.getenv("SCHED_MAX_CONCURRENT", "1")))
+        self.default_workers = max(1, int(os.getenv("SCHED_MAX_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))))
+        self.default_jitter = int(os.getenv("SCHED_JITTER_SEC", "300"))
+        self.lease_sec = float(os.getenv("SCHED_LEASE_SEC", str(12 * 3600)))
+        self.timezone = os.getenv("SCHED_TIMEZONE") or None
+        self._loaded: Dict[str, tuple] = {}
+        self._sched = BackgroundScheduler(
+            executors={"default": _APThreadPool(self.max_concurrent)},
+            job_defaults={"max_instances": 1, "coalesce": True,
+                          "misfire_grace_time": int(os.getenv("SCHED_MISFIRE_SEC", "3600"))},
+            timezone=self.timezone,
+        )
+
+    def _schedules(self) -> List[Dict[str, Any]]:
+        rows = db.list_schedules()
+        if rows:
+            return rows
+        # no rows yet: seed one from the folder/frequency in settings
+        from src.settings import settings
+        db.upsert_schedule("default", settings.SCHED_SCAN_DIR, settings.SCHED_FREQUENCY)
+        return db.list_schedules()
+
+    def reload(self) -> int:
+        """Sync APScheduler jobs with the table; returns the number of active schedules."""
+        wanted: Dict[str, tuple] = {}
+        rows = {}
+        for r in self._schedules():
+            if r["enabled"]:
+                rows[r["name"]] = r
+                wanted[r["name"]] = (r["folder"], r["cron"], r.get("max_workers"), r.get("jitter_sec"))
+        for name in list(self._loaded):
+            if wanted.get(name) != self._loaded[name]:
+                self._sched.remove_job(f"scan:{name}")
+                del self._loaded[name]
+        for name, sig in wanted.items():
+            if name in self._loaded:
+                continue
+            r = rows[name]
+            jitter = r.get("jitter_sec")
+            try:
+                trigger = parse_trigger(r["cron"], jitter if jitter is not None else self.default_jitter, self.timezone)
+            except ValueError as e:
+                log.warning("[Scheduler] skipping %s: %s", name, e)
+                continue
+            self._sched.add_job(self._run, trigger, args=[dict(r)], id=f"scan:{name}", name=name,
+                                replace_existing=True)
+            self._loaded[name] = sig
+            log.info("[Scheduler] %s: scan %s on %r", name, r["folder"], r["cron"])
+        return len(self._loaded)
+
+    def _run(self, sched: Dict[str, Any]) -> None:
+        from src.agent.scan import scan_folder
+        name = sched["name"]
+        if not db.claim_schedule(name, self.lease_sec):
+            log.info("[Scheduler] %s is still running elsewhere; skipping this run", name)
+            return
+        started, t0 = time.time(), time.perf_counter()
+        status, files, fps, error = "error", 0, 0.0, None
+        try:
+            summary = scan_folder(sched["folder"], workers=sched.get("max_workers") or self.default_workers)
+            status, files, fps = summary["status"], summary["done"] + summary["failed"], summary["files_per_sec"]
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            log.exception("[Scheduler] %s failed", name)
+        finally:
+            db.finish_schedule_run(name, status, started, time.perf_counter() - t0, files, fps, error)
+
+    def start(self) -> None:
+        self.reload()
+        reload_sec = int(os.getenv("SCHED_RELOAD_SEC", "60"))
+        if reload_sec > 0:
+            # own executor, so a reload never waits behind a running sweep
+            self._sched.add_executor(_APThreadPool(1), "reload")
+            self._sched.add_job(self.reload, "interval", seconds=reload_sec, id="reload", executor="reload")
+        self._sched.start()
+
+    def status(self) -> List[Dict[str, Any]]:
+        jobs = {j.name: j for j in self._sched.get_jobs() if j.id.startswith("scan:")}
+        out = []
+        for r in db.list_schedules():
+            j = jobs.get(r["name"])
+            nxt = getattr(j, "next_run_time", None) if j else None
+            out.append({**r, "scheduled": j is not None, "next_run": nxt.isoformat() if nxt else None})
+        return out
+
+    def shutdown(self) -> None:
+        self._sched.shutdown(wait=False)
+
+_SCHED: Optional[ScanScheduler] = None
+
+def start_scheduler() -> Optional[ScanScheduler]:
+    global _SCHED
+    if BackgroundScheduler is None:
+        log.warning("[Scheduler] APScheduler is not installed; scheduled scans are disabled.")
+        return None
+    if _SCHED is None:
+        _SCHED = ScanScheduler()
+        _SCHED.start()
+    return _SCHED
+
+def get_scheduler() -> Optional[ScanScheduler]:
+    return _SCHED
+
+def stop_scheduler() -> None:
+    global _SCHED
+    if _SCHED is not None:
+        _SCHED.shutdown()
+        _SCHED = None
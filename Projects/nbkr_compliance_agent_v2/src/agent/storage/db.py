@@ -2,18 +2,102 @@
 from __future__ import annotations
 import json
 import os
+import queue
 import sqlite3
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 DB_PATH = os.getenv("DB_PATH", os.path.join(os.getcwd(), "agent.db"))
 _LAWS_PATH = os.getenv("LAWS_PATH", "")
 
-def _conn(db_path: Optional[str] = None) -> sqlite3.Connection:
-    path = db_path or DB_PATH
-    os.makedirs(os.path.dirname(path) if os.path.dirname(path) else ".", exist_ok=True)
-    conn = sqlite3.connect(path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# ---- connection engine -------------------------------------------------------
+_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{int(os.getenv('DB_CACHE_KB', '16384'))}",
+    f"PRAGMA mmap_size={int(os.getenv('DB_MMAP_BYTES', str(256 * 1024 * 1024)))}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+class Engine:
+    """
+    Connection pool for one SQLite file.
+
+    Connections are opened once (WAL + tuned pragmas) and recycled through a
+    small idle pool, so sqlite3's per-connection statement cache is reused
+    across calls. A thread that re-enters `connection()` gets the connection
+    it already holds.
+    """
+
+    def __init__(self, path: str, pool_size: int = _POOL_SIZE) -> None:
+        self.path = path
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=max(1, pool_size))
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self.schema_ready = False
+
+    def _open(self) -> sqlite3.Connection:
+        d = os.path.dirname(self.path)
+        os.makedirs(d if d else ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for p in _PRAGMAS:
+            conn.execute(p)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        self._local.conn = conn
+        try:
+            with conn:  # commit on success, rollback on error
+                yield conn
+        finally:
+            self._local.conn = None
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_ENGINES: Dict[str, Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+def get_engine(db_path: Optional[str] = None) -> Engine:
+    path = os.path.abspath(db_path or DB_PATH)
+    eng = _ENGINES.get(path)
+    if eng is None:
+        with _ENGINES_LOCK:
+            eng = _ENGINES.setdefault(path, Engine(path))
+    return eng
+
+def close_engines() -> None:
+    with _ENGINES_LOCK:
+        for eng in _ENGINES.values():
+            eng.close()
+        _ENGINES.clear()
+
+def _conn(db_path: Optional[str] = None):
+    """Pooled connection context manager (commits on exit)."""
+    return get_engine(db_path).connection()
 
 def _table_exists(c: sqlite3.Connection, table: str) -> bool:
     r = c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=? LIMIT 1", (table,)).fetchone()
@@ -32,116 +116,324 @@ def _ensure_column(c: sqlite3.Connection, table: str, col: str, col_type: str, d
         if default_sql is not None:
             c.execute(f"UPDATE {table} SET {col} = {default_sql}")
 
-def init_schema(db_path: Optional[str] = None) -> None:
-    with _conn(db_path) as c:
-        if not _table_exists(c, "schedules"):
-            c.execute(
-                """
-                CREATE TABLE schedules (
-                    folder  TEXT NOT NULL,
-                    enabled INTEGER NOT NULL DEFAULT 1
-                )
-                """
-            )
-        _ensure_column(c, "schedules", "cron", "TEXT", default_sql="'daily'")
-        cols = _table_cols(c, "schedules")
-        if "freq" in cols:
-            c.execute("UPDATE schedules SET cron = COALESCE(NULLIF(cron, ''), freq)")
-        cols = _table_cols(c, "schedules")
-        if "name" not in cols:
-            try:
-                _ensure_column(c, "schedules", "name", "TEXT", default_sql="NULL")
-            except sqlite3.OperationalError:
-                pass
+def init_schema(db_path: Optional[str] = None, force: bool = False) -> None:
+    """Create/upgrade tables once per process and database file."""
+    eng = get_engine(db_path)
+    if eng.schema_ready and not force:
+        return
+    with eng._schema_lock:
+        if eng.schema_ready and not force:
+            return
+        with eng.connection() as c:
+            _create_schema(c)
+        eng.schema_ready = True
+
+def _migrate_schedules(c: sqlite3.Connection) -> None:
+    """
+    Bring `schedules` to its current shape: one row per unique `name`, plus
+    scheduler settings and last-run stats. Older layouts (no name, `freq` /
+    `frequency` instead of `cron`, the single-row id CHECK) are rebuilt in place.
+    """
+    cols = _table_cols(c, "schedules")
+    if "running_since" in cols:
+        return
+    c.execute(
+        """
+        CREATE TABLE schedules_new (
+            name               TEXT NOT NULL UNIQUE,
+            folder             TEXT NOT NULL,
+            cron               TEXT NOT NULL DEFAULT 'daily',
+            enabled            INTEGER NOT NULL DEFAULT 1,
+            max_workers        INTEGER,
+            jitter_sec         INTEGER,
+            running_since      REAL,
+            last_run_at        REAL,
+            last_status        TEXT,
+            last_duration_sec  REAL,
+            last_files         INTEGER,
+            last_files_per_sec REAL,
+            last_error         TEXT
+        )
+        """
+    )
+    if cols:
+        name = "COALESCE(NULLIF(name, ''), 'schedule-' || rowid)" if "name" in cols else "'schedule-' || rowid"
+        srcs = [f"NULLIF({x}, '')" for x in ("cron", "freq", "frequency") if x in cols]
+        cron = f"COALESCE({', '.join(srcs)}, 'daily')" if srcs else "'daily'"
+        enabled = "COALESCE(enabled, 1)" if "enabled" in cols else "1"
+        # later rows win for duplicate names, as the old upsert intended
+        c.execute(f"INSERT OR REPLACE INTO schedules_new (name, folder, cron, enabled) "
+                  f"SELECT {name}, folder, {cron}, {enabled} FROM schedules ORDER BY rowid")
+        c.execute("DROP TABLE schedules")
+    c.execute("ALTER TABLE schedules_new RENAME TO schedules")
 
+def _create_schema(c: sqlite3.Connection) -> None:
+    _migrate_schedules(c)
+
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS kb_docs (
+            doc_id    TEXT PRIMARY KEY,
+            title     TEXT,
+            text      TEXT,
+            meta_json TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    _ensure_column(c, "kb_docs", "law_id", "TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_kb_docs_law_id ON kb_docs(law_id)")
+    # change log consumed by in-memory indexes (RAG) to refresh incrementally
+    c.execute("CREATE TABLE IF NOT EXISTS kb_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT NOT NULL)")
+    for ev, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
         c.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_kb_docs_{ev.lower()} AFTER {ev} ON kb_docs
+            BEGIN INSERT INTO kb_changes (doc_id) VALUES ({ref}.doc_id); END
             """
-            CREATE TABLE IF NOT EXISTS kb_docs (
-                doc_id    TEXT PRIMARY KEY,
-                title     TEXT,
-                text      TEXT,
-                meta_json TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
+        )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rule_atoms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            law_id TEXT,
+            ref TEXT,
+            title TEXT,
+            summary TEXT,
+            trigger_regex TEXT,
+            trigger_keywords TEXT,
+            severity TEXT,
+            lang TEXT,
+            citation_text TEXT
+        )
+        """
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS ix_rule_atoms_law_id ON rule_atoms(law_id)")
+    # policy rules are rule_atoms rows with a non-null `code`; list columns and predicate hold JSON
+    for col, typ in (("code", "TEXT"), ("law_ref", "TEXT"), ("title_ru", "TEXT"), ("title_ky", "TEXT"),
+                     ("mandatory", "INTEGER"), ("hints_any", "TEXT"), ("must_not", "TEXT"), ("must_have", "TEXT"),
+                     ("predicate", "TEXT"), ("confidence", "REAL"), ("enabled", "INTEGER"), ("updated_at", "INTEGER")):
+        _ensure_column(c, "rule_atoms", col, typ)
+    c.execute("CREATE INDEX IF NOT EXISTS ix_rule_atoms_code ON rule_atoms(code)")
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rule_support (
+            id      INTEGER PRIMARY KEY,
+            rule_id INTEGER NOT NULL,
+            doc_id  INTEGER,
+            section TEXT,
+            url     TEXT,
+            snippet TEXT,
+            FOREIGN KEY(rule_id) REFERENCES rule_atoms(id)
+        )
+        """
+    )
+    # kind = 'reason' | 'fix' | 'citation', lang = ru/en/ky; text lives in `snippet`
+    _ensure_column(c, "rule_support", "kind", "TEXT")
+    _ensure_column(c, "rule_support", "lang", "TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_rule_support_rule ON rule_support(rule_id)")
+    # rules_version is bumped by triggers so the in-memory rule set can reload cheaply
+    c.execute("CREATE TABLE IF NOT EXISTS rules_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    c.execute("INSERT OR IGNORE INTO rules_meta (key, value) VALUES ('rules_version', 0)")
+    bump = "BEGIN UPDATE rules_meta SET value = value + 1 WHERE key = 'rules_version'; END"
+    for ev, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rule_atoms_{ev.lower()} AFTER {ev} ON rule_atoms "
+                  f"WHEN {ref}.code IS NOT NULL {bump}")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rule_support_{ev.lower()} AFTER {ev} ON rule_support {bump}")
+    if not c.execute("SELECT 1 FROM rule_atoms WHERE code IS NOT NULL LIMIT 1").fetchone():
+        from src.agent.rules.defaults import DEFAULT_RULES
+        for r in DEFAULT_RULES:
+            _upsert_policy_rule(c, r)
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS vec_stores (
+            store    TEXT PRIMARY KEY,
+            dim      INTEGER NOT NULL,
+            version  INTEGER NOT NULL DEFAULT 0,
+            kb_seq   INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS vec_rows (
+            store   TEXT NOT NULL,
+            row     INTEGER NOT NULL,
+            doc_id  TEXT NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (store, row)
+        )
+        """
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS ix_vec_rows_doc ON vec_rows(store, doc_id)")
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS law_manifest (
+            path           TEXT PRIMARY KEY,
+            law_id         TEXT,
+            size           INTEGER NOT NULL,
+            mtime_ns       INTEGER NOT NULL,
+            sha256         TEXT NOT NULL,
+            parser_version TEXT NOT NULL,
+            ingested_at    DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    # near-duplicate detection for law blocks: one row per parsed block; rows with a
+    # canonical_id were not stored in kb_docs (aliases of that doc)
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS law_doc_sigs (
+            doc_id       TEXT PRIMARY KEY,
+            law_id       TEXT NOT NULL,
+            content_hash TEXT,
+            simhash      INTEGER,
+            canonical_id TEXT,
+            kind         TEXT,
+            distance     INTEGER,
+            ref          TEXT,
+            source       TEXT
+        )
+        """
+    )
+    # canonical_id: the kb_docs row an exact duplicate was collapsed into; near_id: the block a stored
+    # near duplicate resembles
+    _ensure_column(c, "law_doc_sigs", "near_id", "TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_law_doc_sigs_law ON law_doc_sigs(law_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_law_doc_sigs_canonical ON law_doc_sigs(canonical_id)")
+    # a canonical row gaining or losing aliases changes what indexes report for it
+    for ev, ref in (("INSERT", "NEW"), ("DELETE", "OLD")):
+        c.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_law_doc_sigs_{ev.lower()} AFTER {ev} ON law_doc_sigs
+            WHEN {ref}.canonical_id IS NOT NULL
+            BEGIN INSERT INTO kb_changes (doc_id) VALUES ({ref}.canonical_id); END
             """
         )
-        c.commit()
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS translation_memory (
+            key        TEXT PRIMARY KEY,
+            src_lang   TEXT NOT NULL,
+            tgt_lang   TEXT NOT NULL,
+            model      TEXT NOT NULL,
+            version    TEXT NOT NULL,
+            source     TEXT NOT NULL,
+            target     TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL
+        )
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            findings TEXT
+        )
+        """
+    )
+    # analysis jobs and persisted reports share the table; timings/result hold JSON
+    for col, typ in (("job_id", "TEXT"), ("file_hash", "TEXT"), ("goal", "TEXT"), ("status", "TEXT"),
+                     ("timings_json", "TEXT"), ("result_json", "TEXT"), ("error", "TEXT"),
+                     ("started_at", "REAL"), ("finished_at", "REAL"), ("owner", "TEXT"), ("heartbeat_at", "REAL")):
+        _ensure_column(c, "reports", col, typ)
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_reports_job ON reports(job_id)")
+    # at most one live or finished job per (file, goal); failed jobs may be resubmitted
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_reports_dedup ON reports(file_hash, goal) "
+              "WHERE file_hash IS NOT NULL AND status IN ('queued', 'running', 'done')")
+    # batch folder scans: file hash cache (skip re-hashing unchanged files) and per-run checkpoints
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scan_files (
+            path     TEXT PRIMARY KEY,
+            size     INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256   TEXT NOT NULL,
+            seen_at  REAL
+        )
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scan_runs (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            folder        TEXT NOT NULL,
+            goal          TEXT NOT NULL,
+            status        TEXT NOT NULL,
+            started_at    REAL NOT NULL,
+            finished_at   REAL,
+            files_seen    INTEGER NOT NULL DEFAULT 0,
+            files_done    INTEGER NOT NULL DEFAULT 0,
+            files_skipped INTEGER NOT NULL DEFAULT 0,
+            files_failed  INTEGER NOT NULL DEFAULT 0,
+            stage_ms      TEXT
+        )
+        """
+    )
 
-def _schedule_cols(c: sqlite3.Connection) -> Tuple[bool, bool, bool]:
-    cols = _table_cols(c, "schedules")
-    return ("name" in cols, "cron" in cols, "freq" in cols)
 
-def upsert_schedule(name: str, folder: str, cron: str, enabled: bool = True, db_path: Optional[str] = None) -> None:
+_SCHEDULE_COLS = ("name, folder, cron, enabled, max_workers, jitter_sec, running_since, last_run_at, last_status, "
+                  "last_duration_sec, last_files, last_files_per_sec, last_error")
+
+def upsert_schedule(name: str, folder: str, cron: str, enabled: bool = True, max_workers: Optional[int] = None,
+                    jitter_sec: Optional[int] = None, db_path: Optional[str] = None) -> None:
     init_schema(db_path)
     with _conn(db_path) as c:
-        has_name, has_cron, _ = _schedule_cols(c)
-        if has_name:
-            c.execute(
-                f"""
-                INSERT INTO schedules ({'name, ' if has_name else ''}folder, {'cron, ' if has_cron else ''}enabled)
-                VALUES ({'?,' if has_name else ''} ?, {'?,' if has_cron else ''} ?)
-                ON CONFLICT(name) DO UPDATE SET
-                  folder=excluded.folder
-                  {', cron=excluded.cron' if has_cron else ''}
-                  , enabled=excluded.enabled
-                """,
-                ((name,) if has_name else ())
-                + (folder,)
-                + ((cron,) if has_cron else ())
-                + (1 if enabled else 0,),
-            )
-        else:
-            c.execute(
-                f"""
-                INSERT INTO schedules (folder, {'cron, ' if has_cron else ''}enabled)
-                VALUES (?, {'?,' if has_cron else ''} ?)
-                """,
-                (folder,) + ((cron,) if has_cron else ()) + (1 if enabled else 0,),
-            )
-        c.commit()
+        c.execute(
+            """
+            INSERT INTO schedules (name, folder, cron, enabled, max_workers, jitter_sec) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+              folder=excluded.folder, cron=excluded.cron, enabled=excluded.enabled,
+              max_workers=excluded.max_workers, jitter_sec=excluded.jitter_sec
+            """,
+            (name, folder, cron or "daily", 1 if enabled else 0, max_workers, jitter_sec),
+        )
 
 def get_schedule(db_path: Optional[str] = None) -> Optional[tuple[str, str, bool]]:
+    """(folder, cron, enabled) of the first schedule by name; see list_schedules() for all of them."""
     init_schema(db_path)
     with _conn(db_path) as c:
-        has_name, has_cron, has_freq = _schedule_cols(c)
-        order_by = "name" if has_name else "rowid"
-        if has_cron and has_freq:
-            sql = f"SELECT folder, COALESCE(NULLIF(cron, ''), freq) AS _cron, enabled FROM schedules ORDER BY {order_by} LIMIT 1"
-        elif has_cron:
-            sql = f"SELECT folder, cron AS _cron, enabled FROM schedules ORDER BY {order_by} LIMIT 1"
-        elif has_freq:
-            sql = f"SELECT folder, freq AS _cron, enabled FROM schedules ORDER BY {order_by} LIMIT 1"
-        else:
-            row = c.execute(f"SELECT folder, enabled FROM schedules ORDER BY {order_by} LIMIT 1").fetchone()
-            if not row:
-                return None
-            return (row["folder"], "daily", bool(row["enabled"]))
-
-        row = c.execute(sql).fetchone()
-        if not row:
-            return None
-        return (row["folder"], row["_cron"], bool(row["enabled"]))
+        row = c.execute("SELECT folder, cron, enabled FROM schedules ORDER BY name LIMIT 1").fetchone()
+    if not row:
+        return None
+    return (row["folder"], row["cron"], bool(row["enabled"]))
 
 def list_schedules(db_path: Optional[str] = None) -> List[Dict[str, Any]]:
     init_schema(db_path)
     with _conn(db_path) as c:
-        has_name, has_cron, has_freq = _schedule_cols(c)
-        select_name = "name" if has_name else "rowid AS name"
-        if has_cron and has_freq:
-            sql = f"SELECT {select_name}, folder, COALESCE(NULLIF(cron, ''), freq) AS _cron, enabled FROM schedules"
-        elif has_cron:
-            sql = f"SELECT {select_name}, folder, cron AS _cron, enabled FROM schedules"
-        elif has_freq:
-            sql = f"SELECT {select_name}, folder, freq AS _cron, enabled FROM schedules"
-        else:
-            sql = f"SELECT {select_name}, folder, enabled FROM schedules"
-        rows = c.execute(sql).fetchall()
-        out: List[Dict[str, Any]] = []
-        for r in rows:
-            item = {"name": r["name"], "folder": r["folder"], "enabled": bool(r["enabled"])}
-            item["cron"] = r["_cron"] if "_cron" in r.keys() else "daily"
-            out.append(item)
-        return out
+        rows = c.execute(f"SELECT {_SCHEDULE_COLS} FROM schedules ORDER BY name").fetchall()
+    out: List[Dict[str, Any]] = []
+    for r in rows:
+        item = dict(r)
+        item["enabled"] = bool(item["enabled"])
+        out.append(item)
+    return out
+
+def claim_schedule(name: str, lease_sec: float, db_path: Optional[str] = None) -> bool:
+    """
+    Mark `name` as running unless another run holds it (across processes).
+    A holder older than `lease_sec` is treated as dead and taken over.
+    """
+    now = time.time()
+    with _conn(db_path) as c:
+        cur = c.execute(
+            "UPDATE schedules SET running_since = ? WHERE name = ? AND (running_since IS NULL OR running_since < ?)",
+            (now, name, now - lease_sec),
+        )
+        return cur.rowcount == 1
+
+def finish_schedule_run(name: str, status: str, started_at: float, duration_sec: float, files: int,
+                        files_per_sec: float, error: Optional[str] = None, db_path: Optional[str] = None) -> None:
+    """Release the claim and record the run's duration and throughput."""
+    with _conn(db_path) as c:
+        c.execute(
+            "UPDATE schedules SET running_since = NULL, last_run_at = ?, last_status = ?, last_duration_sec = ?, "
+            "last_files = ?, last_files_per_sec = ?, last_error = ? WHERE name = ?",
+            (started_at, status, round(duration_sec, 1), files, round(files_per_sec, 3), error, name),
+        )
 
 def add_kb_doc(doc_id: str, title: str, text: str, meta: Optional[Dict[str, Any]] = None, db_path: Optional[str] = None) -> None:
     init_schema(db_path)
@@ -200,12 +492,196 @@ def delete_kb_doc(doc_id: str, db_path: Optional[str] = None) -> None:
         c.execute("DELETE FROM kb_docs WHERE doc_id = ?", (doc_id,))
         c.commit()
 
+def get_law_manifest(db_path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Return the ingestion manifest keyed by absolute file path."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        rows = c.execute(
+            "SELECT path, law_id, size, mtime_ns, sha256, parser_version, ingested_at FROM law_manifest"
+        ).fetchall()
+        return {r["path"]: dict(r) for r in rows}
+
+def upsert_law_manifest(path: str, law_id: str, size: int, mtime_ns: int, sha256: str,
+                        parser_version: str, db_path: Optional[str] = None) -> None:
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        c.execute(
+            """
+            INSERT INTO law_manifest (path, law_id, size, mtime_ns, sha256, parser_version, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(path) DO UPDATE SET
+              law_id=excluded.law_id,
+              size=excluded.size,
+              mtime_ns=excluded.mtime_ns,
+              sha256=excluded.sha256,
+              parser_version=excluded.parser_version,
+              ingested_at=excluded.ingested_at
+            """,
+            (path, law_id, int(size), int(mtime_ns), sha256, parser_version),
+        )
+        c.commit()
+
+def touch_law_manifest(path: str, size: int, mtime_ns: int, db_path: Optional[str] = None) -> None:
+    """Refresh stat fields for a file whose content hash did not change."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        c.execute("UPDATE law_manifest SET size = ?, mtime_ns = ? WHERE path = ?", (int(size), int(mtime_ns), path))
+        c.commit()
+
+def delete_law_manifest(paths: List[str], db_path: Optional[str] = None) -> int:
+    """
+    Forget removed law files: drop their manifest rows and, for laws no other
+    file still provides, their kb_docs / rule_atoms / law_doc_sigs rows (through
+    _replace_law, so kb_changes sees the deletions). Returns the laws dropped.
+    """
+    if not paths:
+        return 0
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        laws = {r["law_id"] for p in paths for r in c.execute("SELECT law_id FROM law_manifest WHERE path = ?", (p,))}
+        c.executemany("DELETE FROM law_manifest WHERE path = ?", [(p,) for p in paths])
+        dropped = [law_id for law_id in sorted(laws)
+                   if not c.execute("SELECT 1 FROM law_manifest WHERE law_id = ?", (law_id,)).fetchone()]
+        for law_id in dropped:
+            _replace_law(c, law_id, (), ())
+    if dropped:
+        prune_kb_changes(db_path=db_path)
+    return len(dropped)
+
+# ---- change tracking -------------------------------------------------------------
+_KB_CHANGES_KEEP = int(os.getenv("KB_CHANGES_KEEP", "200000"))
+
+def kb_change_seq(db_path: Optional[str] = None) -> int:
+    """Latest kb_docs change sequence number (0 if nothing was ever written)."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        r = c.execute("SELECT COALESCE(MAX(seq), 0) FROM kb_changes").fetchone()
+        return int(r[0])
+
+def kb_doc_count(db_path: Optional[str] = None) -> int:
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        return int(c.execute("SELECT COUNT(*) FROM kb_docs").fetchone()[0])
+
+def kb_changes_since(seq: int, db_path: Optional[str] = None) -> Tuple[int, Optional[List[str]]]:
+    """
+    Return (latest_seq, changed doc_ids) for changes after `seq`. The id list is
+    None when the log has been pruned past `seq` and callers must reload fully.
+    """
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        lo, hi = c.execute("SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM kb_changes").fetchone()
+        if hi <= seq:
+            return int(hi), []
+        if seq and lo > seq + 1:
+            return int(hi), None
+        rows = c.execute("SELECT DISTINCT doc_id FROM kb_changes WHERE seq > ? AND seq <= ?", (seq, hi)).fetchall()
+        return int(hi), [r[0] for r in rows]
+
+def prune_kb_changes(keep: int = _KB_CHANGES_KEEP, db_path: Optional[str] = None) -> None:
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        c.execute("DELETE FROM kb_changes WHERE seq <= (SELECT COALESCE(MAX(seq), 0) FROM kb_changes) - ?", (int(keep),))
+
+def _kb_full_row(r: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "doc_id": r["doc_id"],
+        "title": r["title"],
+        "text": r["text"] or "",
+        "law_id": r["law_id"],
+        "meta": json.loads(r["meta_json"] or "{}"),
+    }
+
+def get_kb_docs(doc_ids: List[str], db_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fetch full rows for many doc_ids (missing ids are simply absent)."""
+    init_schema(db_path)
+    out: List[Dict[str, Any]] = []
+    with _conn(db_path) as c:
+        for i in range(0, len(doc_ids), 500):
+            chunk = doc_ids[i:i + 500]
+            rows = c.execute(
+                f"SELECT doc_id, title, text, meta_json, law_id FROM kb_docs WHERE doc_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            out.extend(_kb_full_row(r) for r in rows)
+    return out
+
+def iter_kb_docs(batch: int = 1000, db_path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Stream every kb_docs row (full text) in doc_id order, `batch` rows per query."""
+    init_schema(db_path)
+    last = ""
+    while True:
+        with _conn(db_path) as c:
+            rows = c.execute(
+                "SELECT doc_id, title, text, meta_json, law_id FROM kb_docs WHERE doc_id > ? ORDER BY doc_id LIMIT ?",
+                (last, int(batch)),
+            ).fetchall()
+        if not rows:
+            return
+        for r in rows:
+            yield _kb_full_row(r)
+        last = rows[-1]["doc_id"]
+
+# ---- vector store row maps ------------------------------------------------------
+def vec_store_state(store: str, dim: int, db_path: Optional[str] = None) -> Dict[str, int]:
+    """Register `store` if needed and return {dim, version, kb_seq, rows}."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        c.execute("INSERT OR IGNORE INTO vec_stores (store, dim) VALUES (?, ?)", (store, int(dim)))
+        r = c.execute("SELECT dim, version, kb_seq FROM vec_stores WHERE store = ?", (store,)).fetchone()
+        n = c.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vec_rows WHERE store = ?", (store,)).fetchone()[0]
+        return {"dim": r["dim"], "version": r["version"], "kb_seq": r["kb_seq"], "rows": int(n)}
+
+def vec_store_version(store: str, db_path: Optional[str] = None) -> int:
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        r = c.execute("SELECT version FROM vec_stores WHERE store = ?", (store,)).fetchone()
+        return int(r[0]) if r else 0
+
+def vec_rows_load(store: str, db_path: Optional[str] = None) -> List[Tuple[int, str, bool]]:
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        rows = c.execute("SELECT row, doc_id, deleted FROM vec_rows WHERE store = ? ORDER BY row", (store,)).fetchall()
+        return [(r[0], r[1], bool(r[2])) for r in rows]
+
+def vec_rows_commit(store: str, appended: List[Tuple[int, str]], tombstoned: List[str],
+                    kb_seq: Optional[int] = None, reset: bool = False, db_path: Optional[str] = None) -> None:
+    """
+    Apply one batch of row-map changes and bump the store version, in one
+    transaction: tombstone every live row of `tombstoned` doc ids, then record
+    `appended` (row, doc_id) pairs. `reset` drops all rows first (full rebuild).
+    """
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        if reset:
+            c.execute("DELETE FROM vec_rows WHERE store = ?", (store,))
+        c.executemany(
+            "UPDATE vec_rows SET deleted = 1 WHERE store = ? AND doc_id = ? AND deleted = 0",
+            [(store, d) for d in tombstoned],
+        )
+        c.executemany("INSERT INTO vec_rows (store, row, doc_id) VALUES (?, ?, ?)", [(store, r, d) for r, d in appended])
+        if kb_seq is None:
+            c.execute("UPDATE vec_stores SET version = version + 1 WHERE store = ?", (store,))
+        else:
+            c.execute("UPDATE vec_stores SET version = version + 1, kb_seq = ? WHERE store = ?", (int(kb_seq), store))
+
 __LAWS_CACHE: List[Dict[str, Any]] | None = None
-__ATOMS_CACHE: List[Dict[str, Any]] | None = None
+__LAWS_SIG: Optional[Tuple[int, int]] = None
+
+def laws_signature() -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of LAWS_PATH, or None when it is unset/missing."""
+    if not _LAWS_PATH:
+        return None
+    try:
+        st = os.stat(_LAWS_PATH)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 def fetch_laws() -> List[Dict[str, Any]]:
-    global __LAWS_CACHE
-    if __LAWS_CACHE is not None:
+    global __LAWS_CACHE, __LAWS_SIG
+    sig = laws_signature()
+    if __LAWS_CACHE is not None and sig == __LAWS_SIG:
         return __LAWS_CACHE
 
     laws: List[Dict[str, Any]] = []
@@ -250,7 +726,7 @@ def fetch_laws() -> List[Dict[str, Any]]:
             },
         ]
 
-    __LAWS_CACHE = laws
+    __LAWS_CACHE, __LAWS_SIG = laws, sig
     return laws
 
 def list_laws() -> List[Dict[str, Any]]:
@@ -266,64 +742,493 @@ def list_laws() -> List[Dict[str, Any]]:
     return out
 
 def fetch_rule_atoms() -> List[Dict[str, Any]]:
-    global __ATOMS_CACHE
-    if __ATOMS_CACHE is not None:
-        return __ATOMS_CACHE
-
-    atoms = [
-        {
-            "code": "prepayment_no_fees",
-            "law_ref": "П.21(7)",
-            "title": "Right to early repayment without fees",
-            "title_ru": "Право на досрочное погашение без комиссий",
-            "title_ky": "Комиссиясыз мөөнөтүнөн мурда төлөө укугу",
-            "mandatory": True,
-            "hints_any": ["досроч", "предварительного уведомления", "погасить", "погашение"],
-            "must_not": ["комисс", "штраф", "иной платеж"],
-        },
-        {
-            "code": "penalty_cap_10",
-            "law_ref": "П.21(8)",
-            "title": "Excessive penalties for late payment",
-            "title_ru": "Чрезмерные штрафы за просрочку",
-            "title_ky": "Кечиктирүү боюнча ашыкча айыптар",
-            "mandatory": True,
-            "hints_any": ["неустойк", "штраф", "пен", "%", "процент"],
-            "must_not": ["20 процент", "20%"],
-        },
-        {
-            "code": "penalty_rate_le_credit_rate",
-            "law_ref": "П.21(8)",
-            "title": "Penalty rate must not exceed loan rate",
-            "title_ru": "Ставка неустойки не выше ставки по кредиту",
-            "title_ky": "Айып чени кредит ченинен жогору эмес",
-            "mandatory": True,
-            "hints_any": ["ставк", "неустойк", "штраф", "пен"],
-            "must_have": ["не более процентной ставки по кредиту"],
-        },
-        {
-            "code": "fees_annex_only",
-            "law_ref": "П.42",
-            "title": "All fees must be listed in Annex 6",
-            "title_ru": "Все комиссии только по Перечню (Прил. 6)",
-            "title_ky": "Бардык комиссиялар тиркеме 6да гана",
-            "mandatory": True,
-            "hints_any": ["расход", "перечень", "комисс", "штраф", "Приложени", "Прил."],
-            "must_have": ["перечень расходов", "не допускается включение дополнительных сборов"],
-        },
-    ]
-    __ATOMS_CACHE = atoms
-    return atoms
-
-def insert_kb_docs(docs: List[Dict[str, Any]]):
+    """Current policy rules from the versioned in-memory rule set (no DB read per call)."""
+    from src.agent.rules.store import current_rules
+    return current_rules().atoms
+
+# ---- policy rules ----------------------------------------------------------------
+def _json_list(v: Any) -> List[str]:
+    try:
+        out = json.loads(v) if isinstance(v, str) and v else (v or [])
+    except ValueError:
+        return []
+    return [str(x) for x in out] if isinstance(out, list) else []
+
+def rules_version(db_path: Optional[str] = None) -> int:
+    with _conn(db_path) as c:
+        r = c.execute("SELECT value FROM rules_meta WHERE key = 'rules_version'").fetchone()
+        return int(r["value"]) if r else 0
+
+def load_policy_rules(db_path: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+    """(rules_version, enabled policy rules with reasons/fixes) read in one transaction."""
+    with _conn(db_path) as c:
+        r = c.execute("SELECT value FROM rules_meta WHERE key = 'rules_version'").fetchone()
+        version = int(r["value"]) if r else 0
+        rows = c.execute(
+            "SELECT * FROM rule_atoms WHERE code IS NOT NULL AND COALESCE(enabled, 1) = 1 ORDER BY id"
+        ).fetchall()
+        support: Dict[int, List[sqlite3.Row]] = {}
+        for s in c.execute("SELECT rule_id, kind, lang, snippet, section, url FROM rule_support ORDER BY id"):
+            support.setdefault(s["rule_id"], []).append(s)
+    rules = []
+    for r in rows:
+        pred = r["predicate"]
+        try:
+            pred = json.loads(pred) if pred else None
+        except ValueError:
+            pred = None  # legacy free-text predicate (migrate_add_predicate backfill)
+        rule = {
+            "id": r["id"], "code": r["code"], "law_ref": r["law_ref"] or r["ref"] or "",
+            "title": r["title"] or r["code"], "title_ru": r["title_ru"] or r["title"] or r["code"],
+            "title_ky": r["title_ky"] or r["title"] or r["code"], "mandatory": bool(r["mandatory"]),
+            "hints_any": _json_list(r["hints_any"]), "must_not": _json_list(r["must_not"]),
+            "must_have": _json_list(r["must_have"]), "predicate": pred if isinstance(pred, dict) else None,
+            "severity": r["severity"] or "medium",
+            "confidence": r["confidence"] if r["confidence"] is not None else 0.75,
+            "reasons": {}, "fixes": {}, "support": [],
+        }
+        for s in support.get(r["id"], ()):
+            if s["kind"] == "reason":
+                rule["reasons"][s["lang"] or "ru"] = s["snippet"] or ""
+            elif s["kind"] == "fix":
+                rule["fixes"][s["lang"] or "ru"] = s["snippet"] or ""
+            else:
+                rule["support"].append({"section": s["section"], "url": s["url"], "snippet": s["snippet"]})
+        rules.append(rule)
+    return version, rules
+
+def _upsert_policy_rule(c: sqlite3.Connection, rule: Dict[str, Any]) -> int:
+    code = rule["code"]
+    dumps = lambda v: json.dumps(v or [], ensure_ascii=False)
+    vals = (
+        rule.get("law_ref", ""), rule.get("law_ref", ""), rule.get("title", code), rule.get("title_ru"),
+        rule.get("title_ky"), int(bool(rule.get("mandatory", True))), dumps(rule.get("hints_any")),
+        dumps(rule.get("must_not")), dumps(rule.get("must_have")),
+        json.dumps(rule["predicate"], ensure_ascii=False) if rule.get("predicate") else None,
+        rule.get("severity", "medium"), rule.get("confidence", 0.75), int(bool(rule.get("enabled", True))),
+        int(time.time()),
+    )
+    row = c.execute("SELECT id FROM rule_atoms WHERE code = ?", (code,)).fetchone()
+    if row:
+        rule_id = row["id"]
+        c.execute(
+            "UPDATE rule_atoms SET law_ref=?, ref=?, title=?, title_ru=?, title_ky=?, mandatory=?, hints_any=?, "
+            "must_not=?, must_have=?, predicate=?, severity=?, confidence=?, enabled=?, updated_at=? WHERE id=?",
+            vals + (rule_id,),
+        )
+        c.execute("DELETE FROM rule_support WHERE rule_id = ? AND kind IN ('reason', 'fix')", (rule_id,))
+    else:
+        rule_id = c.execute(
+            "INSERT INTO rule_atoms (law_ref, ref, title, title_ru, title_ky, mandatory, hints_any, must_not, "
+            "must_have, predicate, severity, confidence, enabled, updated_at, code) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            vals + (code,),
+        ).lastrowid
+    texts = [("reason", lang, t) for lang, t in (rule.get("reasons") or {}).items()]
+    texts += [("fix", lang, t) for lang, t in (rule.get("fixes") or {}).items()]
+    c.executemany(
+        "INSERT INTO rule_support (rule_id, kind, lang, snippet) VALUES (?, ?, ?, ?)",
+        [(rule_id, k, lang, t) for k, lang, t in texts if t],
+    )
+    return rule_id
+
+def upsert_policy_rule(rule: Dict[str, Any], db_path: Optional[str] = None) -> int:
+    """Insert or update a policy rule (by code) with its reasons/fixes; the live rule set reloads on its own."""
+    with _conn(db_path) as c:
+        return _upsert_policy_rule(c, rule)
+
+def set_policy_rule_enabled(code: str, enabled: bool, db_path: Optional[str] = None) -> None:
+    with _conn(db_path) as c:
+        c.execute("UPDATE rule_atoms SET enabled = ?, updated_at = ? WHERE code = ?", (int(enabled), int(time.time()), code))
+
+# ---- translation memory --------------------------------------------------------
+def tm_get_many(keys: List[str], db_path: Optional[str] = None) -> Dict[str, str]:
+    """Unexpired targets for the given keys."""
+    out: Dict[str, str] = {}
+    now = time.time()
+    with _conn(db_path) as c:
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = c.execute(
+                f"SELECT key, target FROM translation_memory WHERE key IN ({','.join('?' * len(chunk))}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (*chunk, now),
+            ).fetchall()
+            out.update({r["key"]: r["target"] for r in rows})
+    return out
+
+def tm_put_many(rows: Iterable[Tuple[str, str, str, str, str, str, str, Optional[float]]],
+                db_path: Optional[str] = None) -> None:
+    """rows: (key, src_lang, tgt_lang, model, version, source, target, expires_at)."""
+    now = time.time()
+    with _conn(db_path) as c:
+        c.executemany(
+            "INSERT OR REPLACE INTO translation_memory "
+            "(key, src_lang, tgt_lang, model, version, source, target, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((k, sl, tl, m, v, src, tgt, now, exp) for k, sl, tl, m, v, src, tgt, exp in rows),
+        )
+
+def tm_purge(keep_version: Optional[str] = None, db_path: Optional[str] = None) -> int:
+    """Drop expired rows and, if given, rows written under any other version."""
+    with _conn(db_path) as c:
+        cur = c.execute(
+            "DELETE FROM translation_memory WHERE (expires_at IS NOT NULL AND expires_at <= ?)"
+            + (" OR version <> ?" if keep_version is not None else ""),
+            (time.time(),) + ((keep_version,) if keep_version is not None else ()),
+        )
+        return cur.rowcount
+
+# ---- reports / jobs ------------------------------------------------------------
+_LIVE_JOB = "status IN ('queued', 'running', 'done')"
+# queued/running rows whose owner stopped heartbeating (process killed, restarted); rows from before
+# heartbeats fall back to their start/creation time
+_STALE_JOB = ("status IN ('queued', 'running') "
+              "AND COALESCE(heartbeat_at, started_at, CAST(strftime('%s', created_at) AS REAL)) < ?")
+_JOB_LEASE_SEC = float(os.getenv("JOBS_LEASE_SEC", "120"))
+
+def _lease_cutoff(lease_sec: Optional[float]) -> float:
+    return time.time() - (_JOB_LEASE_SEC if lease_sec is None else float(lease_sec))
+
+def find_job(file_hash: str, goal: str, lease_sec: Optional[float] = None,
+             db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """The queued, running or finished job for (file_hash, goal), if any; abandoned jobs do not count."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        r = c.execute(f"SELECT job_id, status FROM reports WHERE file_hash = ? AND goal = ? AND {_LIVE_JOB} "
+                      f"AND NOT ({_STALE_JOB})", (file_hash, goal, _lease_cutoff(lease_sec))).fetchone()
+    return dict(r) if r else None
+
+def create_job(job_id: str, file_hash: str, goal: str, source: Optional[str] = None, owner: Optional[str] = None,
+               lease_sec: Optional[float] = None, db_path: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    Insert a queued job unless one already exists for (file_hash, goal).
+    Returns (job_id, created); on a duplicate the existing job's id is returned.
+    An abandoned duplicate (see fail_stale_jobs) is marked interrupted and replaced.
+    """
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        for _ in range(3):
+            now = time.time()
+            cur = c.execute(
+                "INSERT OR IGNORE INTO reports (job_id, source, file_hash, goal, status, owner, heartbeat_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, source or "", file_hash, goal, owner, now),
+            )
+            if cur.rowcount:
+                return job_id, True
+            r = c.execute(f"SELECT job_id FROM reports WHERE file_hash = ? AND goal = ? AND {_LIVE_JOB}",
+                          (file_hash, goal)).fetchone()
+            if r and not c.execute(
+                "UPDATE reports SET status = 'error', finished_at = ?, error = 'interrupted' "
+                f"WHERE job_id = ? AND {_STALE_JOB}", (now, r["job_id"], _lease_cutoff(lease_sec)),
+            ).rowcount:
+                return r["job_id"], False
+    raise sqlite3.IntegrityError(f"could not create job for {file_hash[:12]}/{goal!r}")
+
+def start_job(job_id: str, db_path: Optional[str] = None) -> None:
+    with _conn(db_path) as c:
+        now = time.time()
+        c.execute("UPDATE reports SET status = 'running', started_at = ?, heartbeat_at = ? WHERE job_id = ?",
+                  (now, now, job_id))
+
+def finish_job(job_id: str, result: Dict[str, Any], timings: Dict[str, Any], db_path: Optional[str] = None) -> None:
+    items = ((result or {}).get("flags") or {}).get("items") or []
+    with _conn(db_path) as c:
+        c.execute(
+            "UPDATE reports SET status = 'done', finished_at = ?, findings = ?, result_json = ?, timings_json = ?, "
+            "error = NULL WHERE job_id = ?",
+            (time.time(), json.dumps(items, ensure_ascii=False), json.dumps(result, ensure_ascii=False),
+             json.dumps(timings or {}), job_id),
+        )
+
+def fail_job(job_id: str, error: str, db_path: Optional[str] = None) -> None:
+    with _conn(db_path) as c:
+        c.execute("UPDATE reports SET status = 'error', finished_at = ?, error = ? WHERE job_id = ?",
+                  (time.time(), error, job_id))
+
+def heartbeat_jobs(owner: str, db_path: Optional[str] = None) -> int:
+    """Renew the lease on `owner`'s queued/running jobs."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        return c.execute("UPDATE reports SET heartbeat_at = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                         (time.time(), owner)).rowcount
+
+def fail_stale_jobs(lease_sec: Optional[float] = None, db_path: Optional[str] = None) -> int:
     """
-    Convenience used by laws_ingest: bulk upsert kb_docs.
-    Each item: {"doc_id": str, "title": str, "text": str, "meta": dict}
+    Mark queued/running jobs whose owner has not heartbeated for `lease_sec`
+    (default JOBS_LEASE_SEC) as interrupted: their process is gone, and the
+    rows would otherwise block resubmission through ux_reports_dedup.
     """
-    for d in docs or []:
-        add_kb_doc(
-            doc_id=d.get("doc_id") or d.get("id") or d.get("title"),
-            title=d.get("title") or "",
-            text=d.get("text") or "",
-            meta=d.get("meta") or {},
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        cur = c.execute(
+            f"UPDATE reports SET status = 'error', finished_at = ?, error = 'interrupted' WHERE {_STALE_JOB}",
+            (time.time(), _lease_cutoff(lease_sec)),
         )
+        return cur.rowcount
+
+def save_report(source: str, goal: str, file_hash: str, result: Dict[str, Any], timings: Dict[str, Any],
+                db_path: Optional[str] = None) -> str:
+    """
+    Persist a finished synchronous analysis; returns its job id. A queued or
+    running job for the same input is completed with this result; a finished
+    one is kept.
+    """
+    job_id, created = create_job(uuid.uuid4().hex, file_hash, goal, source, db_path=db_path)
+    if created or (get_job(job_id, db_path=db_path) or {}).get("status") != "done":
+        finish_job(job_id, result, timings, db_path=db_path)
+    return job_id
+
+def get_job(job_id: str, db_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        r = c.execute(
+            "SELECT job_id, status, goal, source, file_hash, created_at, started_at, finished_at, "
+            "timings_json, result_json, error FROM reports WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+    if not r:
+        return None
+    d = dict(r)
+    d["timings"] = json.loads(d.pop("timings_json") or "{}")
+    d["result"] = json.loads(d.pop("result_json") or "null")
+    return d
+
+# ---- batch scans -----------------------------------------------------------------
+def report_hashes(goal: str, db_path: Optional[str] = None) -> Set[str]:
+    """File hashes with a finished report for `goal`."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        rows = c.execute("SELECT file_hash FROM reports WHERE goal = ? AND status = 'done' AND file_hash IS NOT NULL",
+                         (goal,)).fetchall()
+    return {r["file_hash"] for r in rows}
+
+def get_scan_files(db_path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        rows = c.execute("SELECT path, size, mtime_ns, sha256 FROM scan_files").fetchall()
+    return {r["path"]: dict(r) for r in rows}
+
+def upsert_scan_files(rows: Iterable[Tuple[str, int, int, str]], db_path: Optional[str] = None) -> None:
+    """rows: (path, size, mtime_ns, sha256)."""
+    now = time.time()
+    with _conn(db_path) as c:
+        c.executemany(
+            "INSERT OR REPLACE INTO scan_files (path, size, mtime_ns, sha256, seen_at) VALUES (?, ?, ?, ?, ?)",
+            ((p, sz, m, h, now) for p, sz, m, h in rows),
+        )
+
+def open_scan_run(folder: str, goal: str, resume: bool = True, db_path: Optional[str] = None) -> Tuple[int, bool]:
+    """Reuse the unfinished run for (folder, goal) when resuming, else start one. Returns (run_id, resumed)."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        if resume:
+            r = c.execute("SELECT id FROM scan_runs WHERE folder = ? AND goal = ? AND status IN ('running', 'interrupted') "
+                          "ORDER BY id DESC LIMIT 1", (folder, goal)).fetchone()
+            if r:
+                c.execute("UPDATE scan_runs SET status = 'running' WHERE id = ?", (r["id"],))
+                return r["id"], True
+        cur = c.execute("INSERT INTO scan_runs (folder, goal, status, started_at) VALUES (?, ?, 'running', ?)",
+                        (folder, goal, time.time()))
+        return cur.lastrowid, False
+
+def checkpoint_scan_run(run_id: int, counts: Dict[str, int], stage_ms: Dict[str, float], status: str = "running",
+                        db_path: Optional[str] = None) -> None:
+    with _conn(db_path) as c:
+        c.execute(
+            "UPDATE scan_runs SET status = ?, files_seen = ?, files_done = ?, files_skipped = ?, files_failed = ?, "
+            "stage_ms = ?, finished_at = ? WHERE id = ?",
+            (status, counts.get("seen", 0), counts.get("done", 0), counts.get("skipped", 0), counts.get("failed", 0),
+             json.dumps(stage_ms), None if status == "running" else time.time(), run_id),
+        )
+
+# ---- bulk writes ---------------------------------------------------------------
+_KB_UPSERT_SQL = """
+    INSERT INTO kb_docs (doc_id, title, text, meta_json, law_id)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(doc_id) DO UPDATE SET
+      title=excluded.title,
+      text=excluded.text,
+      meta_json=excluded.meta_json,
+      law_id=excluded.law_id
+"""
+
+_ATOM_INSERT_SQL = """
+    INSERT INTO rule_atoms (law_id, ref, title, summary, trigger_regex, trigger_keywords, severity, lang, citation_text)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+class _Counter:
+    """Wraps an iterable of rows so executemany() can stream it and we still get a count."""
+
+    def __init__(self, rows: Iterable[Tuple]) -> None:
+        self._rows = rows
+        self.n = 0
+
+    def __iter__(self) -> Iterator[Tuple]:
+        for r in self._rows:
+            self.n += 1
+            yield r
+
+def _kb_row(d: Dict[str, Any]) -> Tuple:
+    meta = d.get("meta") or {}
+    law_id = d.get("law_id") or meta.get("law_id")
+    return (
+        d.get("doc_id") or d.get("id") or d.get("title"),
+        d.get("title") or "",
+        d.get("text") or d.get("body") or "",
+        json.dumps(meta, ensure_ascii=False),
+        law_id,
+    )
+
+def _atom_row(a: Dict[str, Any]) -> Tuple:
+    kws = a.get("trigger_keywords")
+    if not isinstance(kws, str):
+        kws = json.dumps(kws or [], ensure_ascii=False)
+    return (
+        a.get("law_id"), a.get("ref", ""), a.get("title", ""), a.get("summary", ""),
+        a.get("trigger_regex", ""), kws, a.get("severity", "medium"), a.get("lang", "ru"),
+        a.get("citation_text", ""),
+    )
+
+def upsert_kb_docs(docs: Iterable[Dict[str, Any]], db_path: Optional[str] = None) -> int:
+    """
+    Bulk upsert kb_docs in one transaction. `docs` may be a generator; it is
+    consumed lazily by executemany(). Returns the number of rows written.
+    Each item: {"doc_id": str, "title": str, "text": str, "meta": dict, "law_id": str?}
+    """
+    init_schema(db_path)
+    rows = _Counter(_kb_row(d) for d in docs or ())
+    with _conn(db_path) as c:
+        c.executemany(_KB_UPSERT_SQL, rows)
+    return rows.n
+
+def insert_kb_docs(docs: Iterable[Dict[str, Any]]) -> int:
+    """Convenience alias kept for older callers; see upsert_kb_docs()."""
+    return upsert_kb_docs(docs)
+
+def insert_rule_atoms(atoms: Iterable[Dict[str, Any]], db_path: Optional[str] = None) -> int:
+    """Bulk insert law-derived rule atoms in one transaction. Returns the row count."""
+    init_schema(db_path)
+    rows = _Counter(_atom_row(a) for a in atoms or ())
+    with _conn(db_path) as c:
+        c.executemany(_ATOM_INSERT_SQL, rows)
+    return rows.n
+
+def replace_law_docs(law_id: str, docs: Iterable[Dict[str, Any]], atoms: Iterable[Dict[str, Any]] = (),
+                     db_path: Optional[str] = None, sigs: Iterable[Tuple] = ()) -> Dict[str, int]:
+    """
+    Atomically replace everything previously ingested for `law_id`: drop its
+    kb_docs, rule_atoms and law_doc_sigs rows, then bulk-insert the new ones,
+    all in a single transaction (one fsync). `docs` is consumed before `atoms`,
+    so `atoms` may be a list filled as a side effect of iterating `docs`.
+    `sigs` are law_doc_sigs rows (see _SIG_INSERT_SQL).
+    """
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        counts = _replace_law(c, law_id, docs, atoms, sigs)
+    prune_kb_changes(db_path=db_path)
+    return counts
+
+_SIG_INSERT_SQL = """
+    INSERT OR REPLACE INTO law_doc_sigs (doc_id, law_id, content_hash, simhash, canonical_id, kind, distance, ref, source,
+                                         near_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _replace_law(c: sqlite3.Connection, law_id: str, docs: Iterable[Dict[str, Any]],
+                 atoms: Iterable[Dict[str, Any]], sigs: Iterable[Tuple] = ()) -> Dict[str, int]:
+    old_sigs = dict(c.execute(
+        "SELECT doc_id, content_hash FROM law_doc_sigs WHERE law_id = ? AND canonical_id IS NULL", (law_id,)
+    ).fetchall())
+    doc_rows = _Counter(_kb_row({**d, "law_id": d.get("law_id") or law_id}) for d in docs or ())
+    c.execute("DELETE FROM kb_docs WHERE law_id = ?", (law_id,))
+    c.executemany(_KB_UPSERT_SQL, doc_rows)
+    c.execute("DELETE FROM rule_atoms WHERE law_id = ?", (law_id,))
+    atom_rows = _Counter(_atom_row({**a, "law_id": a.get("law_id") or law_id}) for a in atoms or ())
+    c.executemany(_ATOM_INSERT_SQL, atom_rows)
+    c.execute("DELETE FROM law_doc_sigs WHERE law_id = ?", (law_id,))
+    sig_rows = list(sigs or ())
+    c.executemany(_SIG_INSERT_SQL, sig_rows)
+    new_sigs = {r[0]: r[2] for r in sig_rows if not r[4]}
+    changed = [d for d, h in old_sigs.items() if new_sigs.get(d) != h]
+    return {"docs": doc_rows.n, "atoms": atom_rows.n, "aliases": len(sig_rows) - len(new_sigs),
+            "requeued": _requeue_aliases_of(c, law_id, changed)}
+
+def _requeue_aliases_of(c: sqlite3.Connection, law_id: str, doc_ids: List[str]) -> int:
+    """
+    Other laws with blocks collapsed into `doc_ids` (whose text just changed or
+    went away) lose their manifest rows, so the next refresh re-ingests them.
+    """
+    laws: Set[str] = set()
+    for i in range(0, len(doc_ids), 500):
+        chunk = doc_ids[i:i + 500]
+        laws.update(r[0] for r in c.execute(
+            f"SELECT DISTINCT law_id FROM law_doc_sigs WHERE canonical_id IN ({','.join('?' * len(chunk))}) AND law_id != ?",
+            (*chunk, law_id),
+        ).fetchall())
+    if laws:
+        c.executemany("DELETE FROM law_manifest WHERE law_id = ?", [(x,) for x in laws])
+    return len(laws)
+
+def replace_law_docs_batch(laws: Iterable[Tuple[str, Iterable[Dict[str, Any]], Iterable[Dict[str, Any]], Iterable[Tuple]]],
+                           manifest: Iterable[Tuple[str, str, int, int, str, str]] = (),
+                           db_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    replace_law_docs() for several (law_id, docs, atoms, sigs) at once plus
+    their law_manifest rows (path, law_id, size, mtime_ns, sha256,
+    parser_version), in a single transaction.
+    """
+    init_schema(db_path)
+    total = {"laws": 0, "docs": 0, "atoms": 0, "aliases": 0, "requeued": 0}
+    with _conn(db_path) as c:
+        for law_id, docs, atoms, sigs in laws:
+            n = _replace_law(c, law_id, docs, atoms, sigs)
+            total["laws"] += 1
+            for k in ("docs", "atoms", "aliases", "requeued"):
+                total[k] += n[k]
+        c.executemany(
+            """
+            INSERT INTO law_manifest (path, law_id, size, mtime_ns, sha256, parser_version, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(path) DO UPDATE SET
+              law_id=excluded.law_id,
+              size=excluded.size,
+              mtime_ns=excluded.mtime_ns,
+              sha256=excluded.sha256,
+              parser_version=excluded.parser_version,
+              ingested_at=excluded.ingested_at
+            """,
+            list(manifest),
+        )
+    prune_kb_changes(db_path=db_path)
+    return total
+
+def law_doc_signatures(db_path: Optional[str] = None) -> List[Tuple[str, str, Optional[str], Optional[int]]]:
+    """(doc_id, law_id, content_hash, simhash) of every law block stored in kb_docs."""
+    init_schema(db_path)
+    with _conn(db_path) as c:
+        rows = c.execute(
+            "SELECT doc_id, law_id, content_hash, simhash FROM law_doc_sigs WHERE canonical_id IS NULL ORDER BY rowid"
+        ).fetchall()
+    return [tuple(r) for r in rows]
+
+def doc_aliases(doc_ids: List[str], db_path: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Blocks collapsed into each of `doc_ids`: {canonical doc_id: [{doc_id, law_id, ref, source, kind, distance}]}."""
+    init_schema(db_path)
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    with _conn(db_path) as c:
+        for i in range(0, len(doc_ids), 500):
+            chunk = doc_ids[i:i + 500]
+            rows = c.execute(
+                f"""
+                SELECT canonical_id, doc_id, law_id, ref, source, kind, distance FROM law_doc_sigs
+                WHERE canonical_id IN ({','.join('?' * len(chunk))}) ORDER BY rowid
+                """,
+                chunk,
+            ).fetchall()
+            for r in rows:
+                d = dict(r)
+                out.setdefault(d.pop("canonical_id"), []).append(d)
+    return out
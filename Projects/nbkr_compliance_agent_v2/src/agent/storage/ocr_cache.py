@@ -0,0 +1,115 @@
+# src/agent/storage/ocr_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+class OCRCache:
+    """
+    Disk-backed, content-addressed cache of extraction results.
+
+    Key = SHA-256 of the file bytes + SHA-256 of the extraction settings, so a
+    re-upload of the same contract (another `goal`, a scheduler rescan) skips
+    OCR entirely, while changing OCR_LANGS / dpi / engine version misses.
+    Entries are JSON files under <root>/<kk>/<key>.json; file mtime is bumped
+    on every hit and the least recently used files are evicted once the cache
+    exceeds `max_bytes`.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        if root is None:
+            from src.settings import DATA_DIR
+            root = os.getenv("OCR_CACHE_DIR", str(DATA_DIR / "ocr_cache"))
+        self.root = Path(root)
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv("OCR_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.hits = self.misses = self.evictions = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_bytes: bytes, settings: Dict[str, Any]) -> str:
+        h = hashlib.sha256(file_bytes or b"").hexdigest()
+        s = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{h}:{s}".encode("ascii")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _scan_size(self) -> int:
+        if self._size is None:
+            self._size = sum(p.stat().st_size for p in self.root.glob("*/*.json")) if self.root.exists() else 0
+        return self._size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        p = self._path(key)
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(p)  # LRU: recency lives in mtime
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        p = self._path(key)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            old = p.stat().st_size if p.exists() else 0
+            os.replace(tmp, p)
+        except OSError:
+            return
+        with self._lock:
+            self._size = self._scan_size() + len(data) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is at 90% of its budget."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+                entries.append((st.st_mtime_ns, st.st_size, p))
+            except OSError:
+                continue
+        entries.sort()
+        size = sum(e[1] for e in entries)
+        for _, n, p in entries:
+            if size <= target:
+                break
+            try:
+                p.unlink()
+                size -= n
+                self.evictions += 1
+            except OSError:
+                continue
+        self._size = size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "bytes": self._scan_size(), "max_bytes": self.max_bytes,
+            }
+
+_CACHE: Optional[OCRCache] = None
+
+def get_ocr_cache() -> OCRCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = OCRCache()
+    return _CACHE
@@ -1,21 +1,24 @@
 # src/app.py
 from __future__ import annotations
-import asyncio, logging, os, shutil, uuid
+import asyncio, json, logging, os, shutil, uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from src.settings import settings
 from src.agent.kernel import build_kernel
 from src.agent.orchestrator import Orchestrator, AnalyzeInput
-from src.agent.storage.db import init_schema, upsert_schedule, get_schedule
+from src.agent.storage.db import init_schema, upsert_schedule, list_schedules, get_job
 from src.agent.ingest.laws_ingest import ingest_law_file
-from src.agent.ingest.guard import ensure_laws_up_to_date
+from src.agent.ingest.guard import ensure_laws_up_to_date, start_laws_refresher, stop_laws_refresher
+from src.agent.execution import Overloaded, get_execution, shutdown_execution
+from src.agent.jobs import get_jobs, shutdown_jobs
+from src.agent.scheduler import get_scheduler, start_scheduler, stop_scheduler
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
@@ -34,6 +37,11 @@ app.add_middleware(
 from src.auth import router as auth_router   # noqa
 app.include_router(auth_router)
 
+@app.exception_handler(Overloaded)
+async def _overloaded(_request, exc: Overloaded):
+    return JSONResponse({"error": "overloaded", "detail": str(exc)}, status_code=429,
+                        headers={"Retry-After": str(exc.retry_after)})
+
 kernel: Optional[object] = None
 orch: Optional[Orchestrator] = None
 
@@ -60,32 +68,42 @@ async def debug_rag():
     except Exception as e:
         return {"error": str(e)}
 
-def _apply_schedule() -> None:
-    result = get_schedule()
-    if not result:
-        logging.getLogger(__name__).info("[Scheduler] No schedule found. Skipping.")
-        return
-    folder, freq, enabled = result
-    if not enabled:
-        logging.getLogger(__name__).info(f"[Scheduler] Schedule disabled (folder={folder}, freq={freq}).")
-        return
-    logging.getLogger(__name__).info(f"[Scheduler] Applied. folder={folder}, freq={freq}, enabled={enabled}")
-
 @app.on_event("startup")
 async def _startup():
     global kernel, orch
     init_schema()
     kernel = await build_kernel()
     orch = Orchestrator(kernel)
+    get_jobs(orch)
     try:
         from src.agent.rag import backend as be
         be.warmup()
     except Exception as e:
         log.warning("RAG warmup skipped: %s", e)
+    if settings.LAWS_REFRESH_SEC > 0:
+        start_laws_refresher(LAWS_DIR, settings.LAWS_REFRESH_SEC)
+    else:
+        # no background refresher: ingest new/changed laws once before serving
+        try:
+            log.info("[App] laws: %s", await asyncio.to_thread(ensure_laws_up_to_date, LAWS_DIR))
+        except Exception as e:
+            log.warning("Initial laws refresh failed: %s", e)
     if settings.SCHED_ENABLED:
-        _apply_schedule()
+        start_scheduler()
     log.info("[App] Startup complete.")
 
+@app.on_event("shutdown")
+async def _shutdown():
+    stop_laws_refresher()
+    stop_scheduler()
+    shutdown_jobs()
+    shutdown_execution()
+    try:
+        from src.plugins.ocr_plugin import shutdown_ocr_pool
+        shutdown_ocr_pool()
+    except Exception:
+        pass
+
 @app.get("/health")
 async def health():
     return {"status": "ok", "time": datetime.utcnow().isoformat()}
@@ -101,21 +119,104 @@ async def search(q: str):
     except Exception as e:
         raise HTTPException(500, f"RAG search failed: {e}")
 
+@app.get("/debug/exec")
+async def debug_exec():
+    return get_execution().stats()
+
+@app.get("/debug/jobs")
+async def debug_jobs():
+    return get_jobs(orch).stats()
+
+@app.get("/debug/scheduler")
+async def debug_scheduler():
+    """Schedules with next run time and last-run duration/throughput."""
+    sch = get_scheduler()
+    if sch is None:
+        return {"running": False, "schedules": await asyncio.to_thread(list_schedules)}
+    return {"running": True, "schedules": await asyncio.to_thread(sch.status)}
+
+@app.get("/debug/ocr_cache")
+async def debug_ocr_cache():
+    from src.agent.storage.ocr_cache import get_ocr_cache
+    return get_ocr_cache().stats()
+
 # -------- Analyze (FORM) --------
 import traceback
 @app.post("/analyze")
 async def analyze(goal: str = Form(...), file: UploadFile = File(...)):
     try:
-        ensure_laws_up_to_date(LAWS_DIR)
-        file_bytes = await file.read()
-        content_type = file.content_type or "application/pdf"
-        res = await orch.analyze(AnalyzeInput(goal=goal, file_bytes=file_bytes, filename=file.filename, content_type=content_type))
+        async with get_execution().admit():
+            file_bytes = await file.read()
+            content_type = file.content_type or "application/pdf"
+            res = await orch.analyze(AnalyzeInput(goal=goal, file_bytes=file_bytes, filename=file.filename, content_type=content_type))
         return JSONResponse(res, status_code=200)
+    except Overloaded:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         log.error("Analyze failed: %s\n%s", e, tb)
         return JSONResponse({"error": "analyze_failed", "detail": str(e), "traceback": tb}, status_code=500)
 
+# -------- Analyze (streaming NDJSON) --------
+class _SlotStreamingResponse(StreamingResponse):
+    """
+    Frees the request slot when the response is over. The generator's own
+    finally never runs if the client disconnects before the body is iterated,
+    so this wrapper always releases too (the release is idempotent).
+    """
+
+    def __init__(self, content, release, **kwargs) -> None:
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+@app.post("/analyze/stream")
+async def analyze_stream(goal: str = Form(...), file: UploadFile = File(...)):
+    """
+    Same pipeline as /analyze, one JSON object per line as stages complete:
+    ocr, flag (per rule hit), citations, i18n, done (full result) or error.
+    """
+    file_bytes = await file.read()
+    data = AnalyzeInput(goal=goal, file_bytes=file_bytes, filename=file.filename,
+                        content_type=file.content_type or "application/pdf")
+    release = get_execution().acquire_slot()  # 429 before the stream starts
+
+    async def events():
+        try:
+            async for ev in orch.analyze_stream(data):
+                yield json.dumps(ev, ensure_ascii=False) + "\n"
+        except Exception as e:
+            log.error("Analyze stream failed: %s\n%s", e, traceback.format_exc())
+            yield json.dumps({"event": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+        finally:
+            release()
+
+    return _SlotStreamingResponse(events(), release, media_type="application/x-ndjson")
+
+# -------- Jobs (queued analyze) --------
+@app.post("/jobs")
+async def submit_job(goal: str = Form(...), file: UploadFile = File(...)):
+    """
+    Queue an analysis and return its id at once; poll GET /jobs/{id}.
+    Resubmitting the same file with the same goal returns the existing job.
+    """
+    file_bytes = await file.read()
+    res = await asyncio.to_thread(get_jobs(orch).submit, goal, file_bytes, file.filename,
+                                  file.content_type or "application/pdf")
+    return JSONResponse(res, status_code=200 if res["deduplicated"] else 202)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found.")
+    return JSONResponse(job)
+
 # -------- Analyze (JSON) --------
 class AnalyzeJSON(BaseModel):
     goal: str
@@ -126,7 +227,6 @@ class AnalyzeJSON(BaseModel):
 
 @app.post("/analyze_json")
 async def analyze_json(body: AnalyzeJSON = Body(...)):
-    ensure_laws_up_to_date(LAWS_DIR)
     if not body.file_b64 and not (body.text and body.text.strip()):
         raise HTTPException(400, "Provide 'file_b64' (base64) or 'text'.")
 
@@ -149,5 +249,6 @@ async def analyze_json(body: AnalyzeJSON = Body(...)):
         filename=body.filename,
         content_type=body.content_type,
     )
-    res = await orch.analyze(data)
+    async with get_execution().admit():
+        res = await orch.analyze(data)
     return JSONResponse(res)
@@ -2,7 +2,10 @@ from __future__ import annotations
 import io
 import os
 import re
-from typing import Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import BrokenExecutor, CancelledError, Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Any, List, Optional, Tuple
 
 try:
     import fitz  # PyMuPDF
@@ -48,22 +51,115 @@ def _clean_text(t: str) -> str:
     return t.strip()
 
 
+# Bump when extraction logic changes so cached results are not reused.
+OCR_ENGINE_VERSION = "3"
+_TESS_VERSION: Optional[str] = None
+
+def _tesseract_version() -> str:
+    global _TESS_VERSION
+    if _TESS_VERSION is None:
+        try:
+            _TESS_VERSION = str(pytesseract.get_tesseract_version()) if pytesseract is not None else ""
+        except Exception:
+            _TESS_VERSION = ""
+    return _TESS_VERSION
+
+# ---- page-parallel OCR --------------------------------------------------------
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _ocr_workers() -> int:
+    return max(1, int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1)))))
+
+def _ocr_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared, bounded process pool for Tesseract (None when OCR_WORKERS=1)."""
+    global _POOL
+    if _ocr_workers() <= 1:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=_ocr_workers())
+        return _POOL
+
+def shutdown_ocr_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Drop the shared pool (only if it is still `pool`, when given); the next page gets a fresh one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None and (pool is None or _POOL is pool):
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+def _ocr_png(png: bytes, lang: str, timeout: float) -> Tuple[str, float, str]:
+    """
+    Worker: OCR one rasterized page. Returns (clean text, elapsed ms, status);
+    errors are reported in `status` rather than raised, so nothing unpicklable
+    crosses the process boundary.
+    """
+    t0 = time.perf_counter()
+    try:
+        img = Image.open(io.BytesIO(png)).convert("L")
+        text = pytesseract.image_to_string(img, lang=lang, timeout=timeout) or ""
+        status = "ocr"
+    except RuntimeError:  # pytesseract kills tesseract after `timeout` seconds
+        text, status = "", "ocr_timeout"
+    except Exception:
+        text, status = "", "ocr_error"
+    return _clean_text(text), (time.perf_counter() - t0) * 1000, status
+
+
 class OCRPlugin:
     """
-    PDF -> (1) text layer via PyMuPDF; (2) if weak, rasterize & run Tesseract (rus+eng).
+    PDF -> (1) text layer via PyMuPDF; (2) each page is classified (text
+    density, image coverage) and only pages that need it are rasterized & run
+    through Tesseract (rus+eng) in a process pool, merged back per page.
     Images -> Tesseract.
     Always returns per-page texts for downstream locating.
     """
 
-    def __init__(self, prefer_lang: Optional[str] = None):
+    def __init__(self, kernel=None, prefer_lang: Optional[str] = None):
+        # the kernel constructs plugins as cls(kernel); keep it out of prefer_lang
+        self.kernel = kernel
         self.prefer_lang = prefer_lang or os.getenv("OCR_LANGS", "rus+eng")
+        self.dpi = int(os.getenv("OCR_DPI", "200"))
+        self.page_timeout = float(os.getenv("OCR_PAGE_TIMEOUT", "60"))
+        # per-page OCR decision, see _classify_page()
+        self.min_page_chars = int(os.getenv("OCR_MIN_PAGE_CHARS", "100"))
+        self.min_text_density = float(os.getenv("OCR_MIN_TEXT_DENSITY", "8"))
+        self.min_image_coverage = float(os.getenv("OCR_MIN_IMAGE_COVERAGE", "0.3"))
+
+    def _cache_settings(self) -> Dict[str, Any]:
+        return {
+            "engine": OCR_ENGINE_VERSION, "tesseract": _tesseract_version(), "langs": self.prefer_lang,
+            "dpi": self.dpi, "min_page_chars": self.min_page_chars,
+            "min_text_density": self.min_text_density, "min_image_coverage": self.min_image_coverage,
+        }
+
+    def _cached(self, file_bytes: bytes, fn) -> Dict[str, Any]:
+        """
+        Serve text/pages_text/lang from the content-addressed cache, or run `fn`
+        and store it unless a page hit an OCR timeout or error.
+        """
+        if os.getenv("OCR_CACHE", "1") != "1":
+            return fn(file_bytes)
+        from src.agent.storage.ocr_cache import get_ocr_cache, OCRCache
+        cache = get_ocr_cache()
+        key = OCRCache.key(file_bytes, self._cache_settings())
+        hit = cache.get(key)
+        if hit is not None:
+            return {**hit, "cache": "hit"}
+        res = fn(file_bytes)
+        # a page that timed out or failed may OCR fine next time: don't pin the gap
+        failed = any(t.get("source") in ("ocr_timeout", "ocr_error") for t in res.get("page_timings") or ())
+        if res.get("ok") and not failed:
+            cache.put(key, {k: res[k] for k in ("ok", "text", "lang", "pages", "pages_text") if k in res})
+        return {**res, "cache": "miss"}
 
     def extract(self, file_bytes: bytes, content_type: Optional[str]) -> Dict[str, Any]:
         ct = (content_type or "").lower()
         if ct.startswith("application/pdf") or self._looks_like_pdf(file_bytes):
-            return self._extract_pdf(file_bytes)
+            return self._cached(file_bytes, self._extract_pdf)
         if ct.startswith("image/") or self._looks_like_image(file_bytes):
-            return self._extract_image(file_bytes)
+            return self._cached(file_bytes, self._extract_image)
         # Treat “unknown” as plain text bytes
         try:
             text = file_bytes.decode("utf-8", errors="ignore")
@@ -84,38 +180,136 @@ class OCRPlugin:
 
         pages = max(len(doc), 1)
         # Pass 1: text layer
-        page_texts = []
-        for page in doc:
+        page_texts: List[str] = []
+        timings: List[Dict[str, Any]] = []
+        for i, page in enumerate(doc):
+            t0 = time.perf_counter()
             try:
                 t = page.get_text("text")
             except Exception:
                 t = ""
             page_texts.append(_clean_text(t or ""))
+            timings.append({"page": i + 1, "source": "text", "text_ms": round((time.perf_counter() - t0) * 1000, 2)})
 
-        text1 = _clean_text("\n".join(page_texts))
-        if len(text1) >= 400:
-            return {"ok": True, "text": text1, "lang": _guess_lang(text1), "pages": pages, "pages_text": page_texts}
+        # Pass 2: OCR only the pages classified as needing it
+        weak = []
+        for i, page in enumerate(doc):
+            info = self._classify_page(page, page_texts[i])
+            timings[i].update(info)
+            if info["needs_ocr"]:
+                weak.append(i)
+        if weak and Image is not None and pytesseract is not None:
+            self._ocr_pages(doc, weak, page_texts, timings)
 
-        # Pass 2: OCR if needed
-        if Image is None or pytesseract is None:
-            return {"ok": bool(text1), "text": text1, "lang": _guess_lang(text1), "pages": pages, "pages_text": page_texts}
+        final_text = _clean_text("\n".join(page_texts))
+        return {
+            "ok": bool(final_text), "text": final_text, "lang": _guess_lang(final_text), "pages": pages,
+            "pages_text": page_texts, "page_timings": timings,
+        }
+
+    def _classify_page(self, page, text: str) -> Dict[str, Any]:
+        """
+        Decide per page whether OCR can add text, from
+          - text-layer density: chars per 100x100pt of page area, and
+          - image coverage: share of the page covered by raster images.
+        A page is OCR'd when a large image sits over a sparse text layer (scanned
+        page, possibly with a typed header/stamp), or when the text layer is
+        nearly empty and there is any image at all. Text-less, image-less pages
+        (blank separators) are skipped.
+        """
+        chars = len(text)
+        try:
+            rect = page.rect
+            area = max(1.0, float(rect.width * rect.height))
+        except Exception:
+            rect, area = None, 595.0 * 842.0
+        covered = 0.0
+        try:
+            for info in page.get_image_info():
+                x0, y0, x1, y1 = info.get("bbox", (0, 0, 0, 0))
+                if rect is not None:
+                    x0, y0 = max(x0, rect.x0), max(y0, rect.y0)
+                    x1, y1 = min(x1, rect.x1), min(y1, rect.y1)
+                covered += max(0.0, x1 - x0) * max(0.0, y1 - y0)
+        except Exception:
+            covered = area if chars < self.min_page_chars else 0.0  # unknown: fall back to the char test
+        coverage = min(1.0, covered / area)
+        density = chars / (area / 10000.0)
+
+        if coverage >= self.min_image_coverage and density < self.min_text_density:
+            reason = "scanned"
+        elif chars < self.min_page_chars and coverage > 0:
+            reason = "weak_text"
+        elif chars < self.min_page_chars:
+            reason = "blank"
+        else:
+            reason = "text_layer"
+        return {
+            "needs_ocr": reason in ("scanned", "weak_text"), "reason": reason,
+            "chars": chars, "text_density": round(density, 2), "image_coverage": round(coverage, 3),
+        }
 
-        ocr_pages = []
-        for page in doc:
+    def _ocr_pages(self, doc, idxs: List[int], page_texts: List[str], timings: List[Dict[str, Any]]) -> None:
+        """
+        Rasterize `idxs` here and fan the Tesseract calls out to the process pool
+        (bounded by OCR_WORKERS, each page capped at OCR_PAGE_TIMEOUT seconds).
+        Results are written back by page index, so page order is preserved; an
+        OCR result only replaces the text layer when it is longer.
+        """
+        jobs = []
+        for i in idxs:
+            t0 = time.perf_counter()
             try:
-                pix = page.get_pixmap(dpi=200, alpha=False)
-                img = Image.open(io.BytesIO(pix.tobytes())).convert("L")
-                ocr = pytesseract.image_to_string(img, lang=self.prefer_lang) or ""
-                ocr_pages.append(_clean_text(ocr))
+                pix = doc[i].get_pixmap(dpi=self.dpi, alpha=False)
+                png = pix.tobytes()
             except Exception:
-                ocr_pages.append("")
+                timings[i]["source"] = "ocr_error"
+                continue
+            timings[i]["raster_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            jobs.append((i, png, self._submit(png)))
 
-        text2 = _clean_text("\n".join(ocr_pages))
-        use_ocr = len(text2) > len(text1)
-        final_text = text2 if use_ocr else text1
-        final_pages = ocr_pages if use_ocr else page_texts
+        for i, png, job in jobs:
+            text, ms, status = self._collect(png, job)
+            timings[i]["ocr_ms"] = round(ms, 2)
+            if status != "ocr":
+                timings[i]["source"] = status
+            elif len(text) > len(page_texts[i]):
+                page_texts[i] = text
+                timings[i]["source"] = "ocr"
 
-        return {"ok": bool(final_text), "text": final_text, "lang": _guess_lang(final_text), "pages": pages, "pages_text": final_pages}
+    def _submit(self, png: bytes) -> Optional[Tuple[ProcessPoolExecutor, Future]]:
+        """(pool, future) for one page, or None to OCR it inline (OCR_WORKERS=1 or no usable pool)."""
+        for _ in range(2):
+            pool = _ocr_pool()
+            if pool is None:
+                return None
+            try:
+                return pool, pool.submit(_ocr_png, png, self.prefer_lang, self.page_timeout)
+            except (BrokenExecutor, RuntimeError):
+                # broken, or shut down by another request since _ocr_pool() handed it out
+                shutdown_ocr_pool(pool)
+        return None
+
+    def _collect(self, png: bytes, job: Optional[Tuple[ProcessPoolExecutor, Future]],
+                 retry: bool = True) -> Tuple[str, float, str]:
+        if job is None:
+            return _ocr_png(png, self.prefer_lang, self.page_timeout)
+        pool, fut = job
+        try:
+            return fut.result(timeout=self.page_timeout + 5)
+        except FutureTimeout:
+            fut.cancel()
+            return "", self.page_timeout * 1000, "ocr_timeout"
+        except BrokenExecutor:
+            # a worker died; drop the pool so the next document gets a fresh one
+            shutdown_ocr_pool(pool)
+            return "", 0.0, "ocr_error"
+        except CancelledError:
+            # another request dropped the shared pool (cancel_futures=True) before this page
+            # started: resubmit it once to the fresh pool
+            if retry:
+                return self._collect(png, self._submit(png), retry=False)
+            return "", 0.0, "ocr_error"
 
     def _extract_image(self, file_bytes: bytes) -> Dict[str, Any]:
         if Image is None or pytesseract is None:
@@ -4,10 +4,12 @@ from typing import Any, Dict, List, Optional, Tuple
 import os
 import re
 
-from src.agent.storage.db import fetch_rule_atoms
+from src.agent.rules.store import current_rules
+
+_PAGE_MARK = re.compile(r"стр\.\s*\d+\s*из\s*\d+", re.I)
 
 def _split_pages(text: str) -> List[Tuple[int, int, int]]:
-    markers = [(m.start(), m.group()) for m in re.finditer(r"стр\.\s*\d+\s*из\s*\d+", text, flags=re.I)]
+    markers = [(m.start(), m.group()) for m in _PAGE_MARK.finditer(text)]
     if not markers:
         pages = max(1, min(10, len(text) // 3000))
         out = []
@@ -72,84 +74,57 @@ class PolicyPlugin:
 
         return []
 
-    def _match_any(self, text: str, terms: List[str]) -> bool:
-        t = text.lower()
-        return any(term.lower() in t for term in terms)
-
-    def _must_all(self, text: str, terms: List[str]) -> bool:
-        t = text.lower()
-        return all(term.lower() in t for term in terms)
-
-    def _find_offending_excerpt(self, text: str, rule: Dict[str, Any]) -> Optional[str]:
-        candidates = (rule.get("must_not") or []) + (rule.get("hints_any") or [])
-        for term in candidates:
-            m = re.search(re.escape(term), text, flags=re.I)
-            if m:
-                s = max(0, m.start() - 120)
-                e = min(len(text), m.end() + 220)
-                snippet = text[s:e]
-                snippet = re.sub(r"\s+", " ", snippet).strip()
-                return snippet
-        return None
+    async def _rag_search_many(self, queries: List[str], law_hints: List[Optional[str]], top_k: int) -> List[List[Dict[str, Any]]]:
+        """
+        One batched lookup for all flagged rules: plugin.search_many, else
+        kernel.invoke_function('rag', 'search_many', ...), else per-query _rag_search.
+        """
+        if not queries:
+            return []
+        many = getattr(self.rag, "search_many", None) if self.rag else None
+        if callable(many):
+            try:
+                res = many(queries=queries, law_hints=law_hints, top_k=top_k)
+                if hasattr(res, "__await__"):
+                    res = await res
+                if res and len(res) == len(queries):
+                    return [r or [] for r in res]
+            except Exception:
+                pass
 
-    async def flag(self, full_text: str, ocr_meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        inv = getattr(self.rag, "invoke_function", None)
+        if callable(inv):
+            try:
+                res = inv("rag", "search_many", {"queries": queries, "law_hints": law_hints, "top_k": int(top_k)})
+                if hasattr(res, "__await__"):
+                    res = await res
+                if res and len(res) == len(queries):
+                    return [r or [] for r in res]
+            except Exception:
+                pass
+
+        return [await self._rag_search(query=q, top_k=top_k, law_hint=h) for q, h in zip(queries, law_hints)]
+
+    def evaluate(self, full_text: str, ocr_meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Flag items for every matching rule, without citations (pure CPU, no RAG)."""
         text = full_text or ""
         items: List[Dict[str, Any]] = []
         pages = _split_pages(text)
 
-        atoms = fetch_rule_atoms()
-        for rule in atoms:
+        rules = current_rules()
+        scan, matched = rules.evaluate(text)
+        for rule in matched:
             code = rule["code"]
             law_ref = rule["law_ref"]
             title_en = rule.get("title", code)
             title_ru = rule.get("title_ru", title_en)
             title_ky = rule.get("title_ky", title_en)
 
-            ok_hints = (not rule.get("hints_any")) or self._match_any(text, rule["hints_any"])
-            ok_must_have = (not rule.get("must_have")) or self._must_all(text, rule["must_have"])
-            violates_by_must_not = bool(rule.get("must_not")) and self._match_any(text, rule["must_not"])
-
-            should_flag = False
-            if code == "prepayment_no_fees":
-                needs_notice = re.search(r"30\s*дн", text, flags=re.I) or "предварительного уведомления" in text.lower()
-                mentions_commission = self._match_any(text, ["комисси", "штраф", "иной платеж"])
-                if ok_hints and (needs_notice or mentions_commission):
-                    should_flag = True
-            elif code == "penalty_cap_10":
-                if violates_by_must_not or re.search(r"20\s*%|20\s*процент", text, flags=re.I):
-                    should_flag = True
-            elif code == "penalty_rate_le_credit_rate":
-                if ok_hints and not ok_must_have:
-                    should_flag = True
-            elif code == "fees_annex_only":
-                if ok_hints and ("дополнительные платежи" in text.lower() or "тариф" in text.lower()):
-                    should_flag = True
-
-            if not should_flag:
-                continue
-
-            offending = self._find_offending_excerpt(text, rule) or text[:400]
-            citations = await self._rag_search(query=title_en, top_k=int(os.getenv("RAG_TOP_K", "3")), law_hint=law_ref)
-
-            law = {
-                "ref": citations[0]["ref"] if citations else law_ref,
-                "title": citations[0]["title"] if citations else "",
-                "full_texts": [c["full_text"] for c in citations if c.get("full_text")],
-            }
-
-            reason_en = {
-                "prepayment_no_fees": "Borrower must be able to prepay at any time without any commissions or penalties; a 30-day notice requirement is not compliant with NBKR П.21(7).",
-                "penalty_cap_10": "NBKR П.21(8) caps total penalties over the loan term at 10% of principal and the penalty rate must not exceed the loan interest rate.",
-                "penalty_rate_le_credit_rate": "NBKR П.21(8) requires the penalty rate not to exceed the loan rate. The contract should state this explicitly.",
-                "fees_annex_only": "NBKR П.42 requires all fees to be listed in Annex 6; adding extra charges or paid services outside the Annex is prohibited.",
-            }.get(code, title_en)
+            offending = rules.engine.excerpt(scan, rule) or text[:400]
 
-            reason_ru = {
-                "prepayment_no_fees": "Заемщик должен иметь право досрочно погашать кредит в любое время без комиссий и штрафов; требование 30-дневного уведомления не соответствует НБКР П.21(7).",
-                "penalty_cap_10": "НБКР П.21(8) ограничивает суммарную неустойку за весь срок кредита 10% от суммы кредита; ставка неустойки не должна превышать процентную ставку по кредиту.",
-                "penalty_rate_le_credit_rate": "НБКР П.21(8) требует, чтобы ставка неустойки не превышала ставку по кредиту. Это должно быть прямо указано в договоре.",
-                "fees_annex_only": "НБКР П.42 требует указывать все комиссии в Перечне (Приложение 6); дополнительные сборы и платные услуги вне Перечня запрещены.",
-            }.get(code, title_ru)
+            reasons, fixes = rule.get("reasons") or {}, rule.get("fixes") or {}
+            reason_en = reasons.get("en") or title_en
+            reason_ru = reasons.get("ru") or title_ru
 
             item = {
                 "title": title_en,
@@ -157,36 +132,37 @@ class PolicyPlugin:
                 "title_ky": title_ky,
                 "summary": title_en,
                 "offending_text": offending,
-                "severity": "high" if code in ("prepayment_no_fees", "penalty_cap_10") else "medium",
+                "severity": rule.get("severity") or "medium",
                 "law_ref": law_ref,
                 "violation_code": code,
-                "citations": citations,
+                "citations": [],
                 "reason_long": reason_en,
                 "reason_long_ru": reason_ru,
-                "suggested_fix": {
-                    "ru": {
-                        "prepayment_no_fees": "Заемщик вправе досрочно погасить кредит полностью или частично в любое время без каких-либо комиссий, штрафов или иных платежей. Банк производит перерасчет процентов только за фактический период пользования кредитом.",
-                        "penalty_cap_10": "Размер неустойки за весь период действия кредита не превышает 10% от суммы кредита; ставка неустойки не выше процентной ставки по кредиту.",
-                        "penalty_rate_le_credit_rate": "Ставка неустойки за просрочку не превышает процентную ставку по кредиту.",
-                        "fees_annex_only": "Все комиссии и расходы указываются в Перечне (Приложение 6). Включение дополнительных сборов и платных сопутствующих услуг вне Перечня запрещается.",
-                    }.get(code, ""),
-                    "en": {
-                        "prepayment_no_fees": "The borrower may prepay in full or in part at any time without any fees, penalties or other charges. Interest is recalculated only for the actual borrowing period.",
-                        "penalty_cap_10": "Total penalties over the loan term do not exceed 10% of principal; the penalty rate does not exceed the loan interest rate.",
-                        "penalty_rate_le_credit_rate": "The penalty rate for late payment does not exceed the loan interest rate.",
-                        "fees_annex_only": "All fees must be listed in Annex 6. Adding extra charges or paid ancillary services outside the Annex is prohibited.",
-                    }.get(code, ""),
-                    "ky": {
-                        "prepayment_no_fees": "Заем алуучу ар дайым толук же бөлүп мөөнөтүнөн мурда акысыз (айыпсыз) төлөй алат. Пайыздар фактический колдонулган убакыт үчүн гана эсептелет.",
-                        "penalty_cap_10": "Айыптардын жалпы суммасы кредит мөөнөтүндө негизги сумманын 10%ынан ашпайт; айып чени кредиттик пайыздык ченден жогору эмес.",
-                        "penalty_rate_le_credit_rate": "Кечиккен төлөм үчүн айып чени кредиттик пайыздык ченден жогору болбойт.",
-                        "fees_annex_only": "Бардык комиссиялар жана чыгымдар Тиркеме 6да көрсөтүлөт. Тизмеден тышкары кошумча жыйымдарды киргизүүгө тыюу салынат.",
-                    }.get(code, ""),
-                },
-                "law": law,
+                "suggested_fix": {lang: fixes.get(lang, "") for lang in ("ru", "en", "ky")},
+                "law": {"ref": law_ref, "title": "", "full_texts": [], "aliases": []},
                 "contract_locator": _locate(text, offending, pages),
-                "confidence": 0.85 if code in ("prepayment_no_fees", "penalty_cap_10") else 0.75,
+                "confidence": rule.get("confidence", 0.75),
             }
             items.append(item)
 
         return items
+
+    async def attach_citations(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Resolve citations for all items with one batched RAG lookup; fills `citations` and `law` in place."""
+        all_citations = await self._rag_search_many(
+            [it["title"] for it in items], [it["law_ref"] for it in items],
+            top_k=int(os.getenv("RAG_TOP_K", "3")),
+        )
+        for it, citations in zip(items, all_citations):
+            it["citations"] = citations
+            it["law"] = {
+                "ref": citations[0]["ref"] if citations else it["law_ref"],
+                "title": citations[0]["title"] if citations else "",
+                "full_texts": [c["full_text"] for c in citations if c.get("full_text")],
+                # other laws carrying the top citation's text verbatim (deduplicated at ingestion)
+                "aliases": citations[0].get("aliases", []) if citations else [],
+            }
+        return items
+
+    async def flag(self, full_text: str, ocr_meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self.attach_citations(self.evaluate(full_text, ocr_meta))
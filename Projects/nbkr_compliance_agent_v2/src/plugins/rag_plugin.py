@@ -1,9 +1,8 @@
 # src/plugins/rag_plugin.py
 from __future__ import annotations
 from typing import Any, Dict, List, Optional
-import re
 
-from src.agent.storage import db
+from src.agent.rag.bm25 import shared_index
 
 class RAGPlugin:
     name = "rag"
@@ -11,26 +10,14 @@ class RAGPlugin:
     def __init__(self, *args, **kwargs):
         pass
 
-    def _score(self, text: str, query: str, law_hint: Optional[str], ref: str) -> float:
-        score = 0.0
-        if law_hint and ref == law_hint:
-            score += 1.0
-        q_tokens = [t for t in re.findall(r"\w+", (query or "").lower()) if len(t) > 2]
-        hits = sum(text.lower().count(t) for t in q_tokens)
-        return score + min(0.5, hits * 0.05)
-
     def search(self, query: str, top_k: int = 3, law_hint: Optional[str] = None) -> List[Dict[str, Any]]:
-        rows = db.list_laws()
-        scored: List[Dict[str, Any]] = []
-        for r in rows:
-            s = self._score(r["text"], query or r["title"], law_hint, r["ref"])
-            scored.append({
-                "law_id": r["law_id"],
-                "ref": r["ref"],
-                "title": r["title"],
-                "snippet": r["text"][:400],
-                "full_text": r["text"],
-                "score": round(s, 4),
-            })
-        scored.sort(key=lambda x: (-x["score"], x["ref"]))
-        return scored[: max(1, int(top_k))]
+        """
+        BM25 over the laws file + kb_docs (prebuilt inverted index, refreshed
+        incrementally). Rows whose ref equals `law_hint` get a +1.0 boost.
+        """
+        return shared_index().search(query or "", top_k=top_k, law_hint=law_hint)
+
+    def search_many(self, queries: List[str], law_hints: Optional[List[Optional[str]]] = None,
+                    top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """Batched search(): one result list per query, in order; memoized per index version."""
+        return shared_index().search_many(list(queries), law_hints, top_k=top_k)
@@ -1,11 +1,84 @@
 # src/plugins/translate_plugin.py
 from __future__ import annotations
+import asyncio
+import json
+import logging
+from typing import List, Optional
+
+from src.settings import settings
+from src.agent.i18n import translation_memory
+
+log = logging.getLogger(__name__)
+
+_LANGS = {"en": "English", "ru": "Russian", "ky": "Kyrgyz"}
 
 class TranslatePlugin:
     def __init__(self, kernel) -> None:
         self.kernel = kernel
 
+    def _configured(self) -> bool:
+        return bool(settings.AZURE_OPENAI_ENDPOINT and settings.AZURE_OPENAI_API_KEY and settings.AZURE_OPENAI_DEPLOYMENT)
+
+    async def _chat(self, prompt: str) -> str:
+        import httpx
+        url = f"{settings.AZURE_OPENAI_ENDPOINT}/openai/deployments/{settings.AZURE_OPENAI_DEPLOYMENT}/chat/completions"
+        headers = {"api-key": settings.AZURE_OPENAI_API_KEY, "Content-Type": "application/json"}
+        body = {"messages": [{"role": "user", "content": prompt}], "temperature": 0}
+        verify = settings.REQUESTS_CA_BUNDLE or True
+        async with httpx.AsyncClient(verify=verify, timeout=60.0) as h:
+            r = await h.post(url, params={"api-version": settings.AZURE_OPENAI_API_VERSION}, json=body, headers=headers)
+            r.raise_for_status()
+            return r.json()["choices"][0]["message"]["content"] or ""
+
+    async def _translate_batch(self, texts: List[str], target_lang: str) -> Optional[List[str]]:
+        """One LLM round trip for a batch; None when the response does not line up."""
+        lang = _LANGS.get(target_lang.lower(), target_lang)
+        prompt = (
+            f"Translate each string of the JSON array below to {lang}, preserving legal meaning. "
+            "Answer with a JSON array of the same length and order, nothing else.\n"
+            + json.dumps(texts, ensure_ascii=False)
+        )
+        try:
+            raw = (await self._chat(prompt)).strip()
+            if raw.startswith("```"):
+                raw = raw.strip("`").split("\n", 1)[-1]
+            out = json.loads(raw)
+        except Exception as e:
+            log.warning("[translate] batch of %d to %s failed: %s", len(texts), target_lang, e)
+            return None
+        if not isinstance(out, list) or len(out) != len(texts):
+            log.warning("[translate] batch to %s returned %s items for %d", target_lang,
+                        len(out) if isinstance(out, list) else "no", len(texts))
+            return None
+        return [str(t) if t else s for t, s in zip(out, texts)]
+
+    async def translate_many(self, texts: List[str], target_lang: str, source_lang: Optional[str] = None) -> List[str]:
+        """
+        Translate a batch; strings already in the translation memory never reach
+        the model, and only real model answers are written back. On error or
+        when unconfigured the source strings are returned unchanged.
+        """
+        texts = list(texts)
+        if not texts:
+            return texts
+        tm = translation_memory()
+        model = settings.AZURE_OPENAI_DEPLOYMENT
+        # SQLite lookups: keep them off the event loop
+        known = await asyncio.to_thread(tm.get_many, texts, target_lang, model, src=source_lang)
+        misses = list(dict.fromkeys(t for t in texts if t and t not in known))
+        if misses and self._configured():
+            out = await self._translate_batch(misses, target_lang)
+            if out is not None:
+                fresh = dict(zip(misses, out))
+                await asyncio.to_thread(tm.put_many, fresh, target_lang, model, src=source_lang)
+                known.update(fresh)
+        return [known.get(t, t) for t in texts]
+
+    async def translate(self, text: str, target_lang: str) -> str:
+        if not text:
+            return text
+        return (await self.translate_many([text], target_lang))[0]
+
     async def to_en(self, text: str) -> str:
         if not text: return ""
-        msg = await self.kernel.invoke_prompt(f"Translate to EN (preserve legal meaning). Plain text:\n{text}")
-        return msg or text
+        return await self.translate(text, "en")
@@ -44,6 +44,9 @@ class Settings:
     CRAWL_ALLOWLIST: str = env("CRAWL_ALLOWLIST", "nbkr.kg,dpa.gov.kg")
     REQUESTS_CA_BUNDLE: str = env("REQUESTS_CA_BUNDLE", env("CA_BUNDLE", env("SSL_CERT_FILE", "")))
 
+    # ---- Law corpus refresh (background; 0 disables)
+    LAWS_REFRESH_SEC: int = int(env("LAWS_REFRESH_SEC", "60"))
+
     SCHED_ENABLED: bool = env("SCHED_ENABLED", "1") == "1"
     SCHED_SCAN_DIR: str = env("SCHED_SCAN_DIR", str(ROOT / "contracts"))
     SCHED_FREQUENCY: str = env("SCHED_FREQUENCY", "daily")
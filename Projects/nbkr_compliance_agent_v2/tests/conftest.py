@@ -0,0 +1,35 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """Fresh SQLite file for one test; spawned workers see it through DB_PATH."""
+    from src.agent.storage import db
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setenv("DB_PATH", path)
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.close_engines()
+    db.init_schema()
+    yield path
+    db.close_engines()
+
+@pytest.fixture
+def rag(tmp_db, tmp_path, monkeypatch):
+    """TF-IDF RAG backend with its vectorizer and vector files under tmp_path."""
+    from src.agent.rag import backend, bm25
+    monkeypatch.setenv("RAG_TFIDF_PATH", str(tmp_path / "tfidf.joblib"))
+    monkeypatch.setenv("RAG_VECTORS_DIR", str(tmp_path / "vectors"))
+    monkeypatch.setattr(backend, "_FORCE_TFIDF", True)
+    monkeypatch.setattr(backend, "_vectorizer", None)
+    monkeypatch.setattr(backend, "_vectorizer_corpus", None)
+    monkeypatch.setattr(backend, "_tfidf_sig", None)
+    monkeypatch.setattr(backend, "_tfidf_ready", False)
+    monkeypatch.setattr(backend, "_store", None)
+    monkeypatch.setattr(bm25, "_SHARED", None)
+    return backend
@@ -0,0 +1,73 @@
+# tests/test_batch_ingest.py
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.agent.ingest.batch import ingest_laws, resolve_law_files
+from src.agent.storage import db
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+def _law(n, articles=3):
+    return "".join(f"Статья {a}.\nЗакон {n}, статья {a}: заемщик вправе досрочно погасить кредит без комиссий.\n"
+                   for a in range(1, articles + 1))
+
+@pytest.fixture
+def laws(tmp_path):
+    root = tmp_path / "laws"
+    (root / "inbox").mkdir(parents=True)
+    for n in range(4):
+        (root / f"law{n}.txt").write_text(_law(n), encoding="utf-8")
+    (root / "inbox" / "extra.txt").write_text(_law(9, articles=2), encoding="utf-8")
+    (root / "inbox" / "~$lock.txt").write_text("lock", encoding="utf-8")
+    (root / "notes.md").write_text("not a law", encoding="utf-8")
+    return root
+
+def test_resolve_dirs_and_globs(laws):
+    names = lambda paths: sorted(os.path.basename(p) for p in paths)
+    assert names(resolve_law_files([str(laws)])) == ["extra.txt", "law0.txt", "law1.txt", "law2.txt", "law3.txt"]
+    both = resolve_law_files([str(laws / "law*.txt"), str(laws / "law1.txt"), str(laws / "**" / "*.txt")])
+    assert names(both) == ["extra.txt", "law0.txt", "law1.txt", "law2.txt", "law3.txt"]
+    assert resolve_law_files([str(laws)], match=lambda p: "inbox" in p) == [str(laws / "inbox" / "extra.txt")]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_ingest_and_changed_only(rag, laws, monkeypatch, workers):
+    monkeypatch.setenv("INGEST_BATCH_DOCS", "4")  # several write transactions per run
+    seen = []
+    stats = ingest_laws([str(laws)], workers=workers, progress=seen.append)
+    assert (stats["files"], stats["ingested"], stats["blocks"], stats["failed"]) == (5, 5, 14, 0)
+    assert stats["workers"] == workers and stats["blocks_per_sec"] > 0
+    assert sorted(f["law_id"] for f in seen) == ["extra", "law0", "law1", "law2", "law3"]
+    assert all(f["status"] == "ingested" and f["parse_ms"] >= 0 for f in stats["per_file"])
+    assert len(db.list_kb_docs()) == 14 and len(db.get_law_manifest()) == 5
+
+    assert ingest_laws([str(laws)], changed_only=True, workers=workers)["unchanged"] == 5
+    (laws / "law2.txt").write_text(_law(2, articles=1), encoding="utf-8")
+    again = ingest_laws([str(laws)], changed_only=True, workers=workers)
+    assert (again["ingested"], again["unchanged"], again["blocks"]) == (1, 4, 1)
+    assert sorted(d["doc_id"] for d in db.list_kb_docs() if d["doc_id"].startswith("law2#")) == ["law2#00000"]
+
+def test_unreadable_file_fails_alone(rag, laws):
+    (laws / "broken.pdf").write_bytes(b"%PDF-1.4 truncated")
+    stats = ingest_laws([str(laws)], workers=1)
+    assert (stats["ingested"], stats["failed"]) == (5, 1)
+    (bad,) = [f for f in stats["per_file"] if f["status"] == "failed"]
+    assert bad["law_id"] == "broken" and bad["error"]
+    assert "broken" not in {m["law_id"] for m in db.get_law_manifest().values()}
+
+def test_cli_prints_stats(tmp_db, laws, tmp_path):
+    env = {**os.environ, "DB_PATH": tmp_db, "RAG_TFIDF_PATH": str(tmp_path / "tfidf.joblib"),
+           "RAG_VECTORS_DIR": str(tmp_path / "vectors")}
+    run = lambda *args: subprocess.run([sys.executable, "-m", "scripts.ingest", str(laws), *args], cwd=PROJECT_ROOT,
+                                       env=env, capture_output=True, text=True, timeout=120)
+    out = run("--workers", "1")
+    assert out.returncode == 0, out.stderr
+    stats = json.loads(out.stdout[out.stdout.index("{"):])
+    assert stats["ingested"] == 5 and "per_file" not in stats
+    assert "law0: 3 blocks" in out.stdout
+    stats = json.loads((out := run("--changed-only", "--per-file")).stdout[out.stdout.index("{"):])
+    assert stats["unchanged"] == 5 and len(stats["per_file"]) == 0
@@ -0,0 +1,74 @@
+# tests/test_db.py
+import threading
+
+import pytest
+
+from src.agent.storage import db
+
+def test_connections_are_wal_and_reentrant(tmp_db):
+    eng = db.get_engine()
+    with eng.connection() as c:
+        assert c.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        with eng.connection() as inner:
+            assert inner is c
+    with eng.connection() as again:
+        assert again is c  # recycled from the idle pool
+
+def test_rollback_on_error(tmp_db):
+    with pytest.raises(RuntimeError):
+        with db._conn() as c:
+            c.execute("INSERT INTO kb_docs (doc_id, title, text) VALUES ('x', 't', 'body')")
+            raise RuntimeError
+    assert db.get_kb_doc("x") is None
+
+def test_concurrent_writers_share_a_bounded_pool(tmp_db, monkeypatch):
+    eng = db.get_engine()
+    opened = []
+    real_open = eng._open
+    monkeypatch.setattr(eng, "_open", lambda: opened.append(1) or real_open())
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(20):
+                db.add_kb_doc(f"t{n}-{i}", "t", f"text {n} {i}")
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(db.list_kb_docs(limit=1000)) == 160
+    assert len(opened) <= 8
+    assert eng._idle.qsize() <= db._POOL_SIZE
+
+def _docs(n, text="v1", law_id="law"):
+    for i in range(n):
+        yield {"doc_id": f"{law_id}#{i}", "title": f"t{i}", "text": f"{text} {i}", "law_id": law_id, "meta": {"ref": str(i)}}
+
+def test_bulk_upsert_consumes_generators_and_updates(tmp_db):
+    assert db.upsert_kb_docs(_docs(500)) == 500
+    assert db.upsert_kb_docs(_docs(10, text="v2")) == 10
+    assert db.get_kb_doc("law#3")["text"] == "v2 3"
+    assert db.get_kb_doc("law#300")["text"] == "v1 300"
+    assert db.insert_rule_atoms({"law_id": "law", "ref": str(i), "trigger_keywords": ["a"]} for i in range(7)) == 7
+
+def test_replace_law_is_all_or_nothing(tmp_db):
+    db.replace_law_docs("law", list(_docs(3)), [{"ref": "0", "title": "atom"}])
+
+    def broken():
+        yield from _docs(2, text="new")
+        raise ValueError("parse error halfway")
+
+    with pytest.raises(ValueError):
+        db.replace_law_docs("law", broken(), [])
+    assert sorted(d["doc_id"] for d in db.list_kb_docs()) == ["law#0", "law#1", "law#2"]
+    assert db.get_kb_doc("law#0")["text"] == "v1 0"
+    with db._conn() as c:
+        assert c.execute("SELECT COUNT(*) FROM rule_atoms WHERE law_id = 'law'").fetchone()[0] == 1
+
+    assert db.replace_law_docs("law", _docs(1, text="new"), [])["docs"] == 1
+    assert [d["doc_id"] for d in db.list_kb_docs()] == ["law#0"]
@@ -0,0 +1,90 @@
+# tests/test_dedup.py
+from src.agent.ingest import dedup
+from src.agent.ingest.batch import ingest_laws
+from src.agent.rag.bm25 import LawIndex
+from src.agent.storage import db
+
+BODY = ("Заемщик вправе досрочно погасить кредит полностью или частично, уведомив кредитора не позднее чем "
+        "за тридцать календарных дней до дня возврата, при этом кредитор не вправе взимать комиссию, "
+        "неустойку или иные платежи за досрочное погашение, если договор заключен на срок не менее шести месяцев.")
+
+def _bits(a, b):
+    return bin((dedup.simhash(a) ^ dedup.simhash(b)) & ((1 << 64) - 1)).count("1")
+
+def test_simhash_distance_tracks_edits():
+    assert dedup.simhash("слишком короткий блок") is None
+    assert _bits(BODY, BODY.upper().replace(" ", "  ")) == 0
+    edited = BODY.replace("шести", "двенадцати")
+    assert 0 < _bits(BODY, edited) <= 12
+    other = "Банк обязан раскрыть эффективную процентную ставку " * 6
+    assert _bits(BODY, other) > 16
+
+def test_changed_terms_are_not_collapsed():
+    idx = dedup.DedupIndex(max_bits=16)
+    kept, _ = idx.collapse("a", [{"doc_id": "a#0", "text": BODY, "meta": {"ref": "Статья 5"}}])
+    assert [d["doc_id"] for d in kept] == ["a#0"]
+    docs = [
+        {"doc_id": "b#0", "text": BODY.lower(), "meta": {"ref": "Статья 12"}},
+        {"doc_id": "b#1", "text": BODY.replace("шести", "двенадцати"), "meta": {"ref": "Статья 13"}},
+    ]
+    kept, sigs = idx.collapse("b", docs)
+    assert [d["doc_id"] for d in kept] == ["b#1"]  # a legally different term keeps its own row
+    by_id = {s[0]: s for s in sigs}
+    assert by_id["b#0"][4:7] == ("a#0", "exact", 0) and by_id["b#0"][9] is None
+    assert by_id["b#1"][4] is None and by_id["b#1"][5] == "near" and by_id["b#1"][9] == "a#0"
+
+def test_strict_near_duplicates_are_collapsed():
+    variant = BODY.replace(",", "").replace(" не ", "  НЕ ")  # same words, other punctuation
+    assert dedup.content_hash(variant) != dedup.content_hash(BODY) and _bits(BODY, variant) == 0
+    idx = dedup.DedupIndex(max_bits=16)
+    idx.collapse("a", [{"doc_id": "a#0", "text": BODY, "meta": {}}])
+    kept, sigs = idx.collapse("b", [{"doc_id": "b#0", "text": variant, "meta": {"ref": "Статья 12"}}])
+    assert kept == [] and sigs[0][4:7] == ("a#0", "near", 0) and sigs[0][9] is None
+
+    exact_only = dedup.DedupIndex(max_bits=16, collapse_bits=-1)
+    exact_only.collapse("a", [{"doc_id": "a#0", "text": BODY, "meta": {}}])
+    kept, sigs = exact_only.collapse("b", [{"doc_id": "b#0", "text": variant, "meta": {}}])
+    assert [d["doc_id"] for d in kept] == ["b#0"] and sigs[0][9] == "a#0"
+
+def test_a_law_never_collapses_its_own_blocks():
+    idx = dedup.DedupIndex()
+    kept, _ = idx.collapse("a", [{"doc_id": f"a#{i}", "text": BODY, "meta": {}} for i in range(2)])
+    assert len(kept) == 2
+
+def _write(path, articles):
+    path.write_text("".join(f"Статья {n}.\n{body}\n" for n, body in articles), encoding="utf-8")
+
+def test_citations_list_collapsed_laws(rag, tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_SEMANTIC_WEIGHT", "0")
+    other = "Кредитор обязан предоставить заемщику график платежей до подписания договора."
+    _write(tmp_path / "law_a.txt", [("5", BODY), ("6", other)])
+    _write(tmp_path / "law_b.txt", [("12", BODY)])
+    stats = ingest_laws([str(tmp_path / "law_a.txt"), str(tmp_path / "law_b.txt")], workers=1)
+    assert stats["aliased"] == 1 and stats["blocks"] == 2
+
+    index = LawIndex(refresh_sec=0)
+    (hit,) = index.search("досрочно погасить кредит комиссию", top_k=1)
+    assert (hit["law_id"], hit["ref"]) == ("law_a", "Статья 5.")
+    assert hit["aliases"] == [{"law_id": "law_b", "ref": "Статья 12.", "doc_id": "law_b#00000"}]
+    # the alias's ref is boosted like the canonical row's own
+    (hinted,) = index.search("график платежей", top_k=1, law_hint="Статья 12.")
+    assert hinted["ref"] == "Статья 5."
+
+    # law B re-ingested without the duplicate: the canonical row drops the alias
+    _write(tmp_path / "law_b.txt", [("12", other + " Дополнено.")])
+    ingest_laws([str(tmp_path / "law_b.txt")], workers=1)
+    index.refresh(force=True)
+    (hit,) = index.search("досрочно погасить кредит комиссию", top_k=1)
+    assert "aliases" not in hit
+
+def test_changed_canonical_requeues_its_aliases(rag, tmp_path):
+    _write(tmp_path / "law_a.txt", [("5", BODY)])
+    _write(tmp_path / "law_b.txt", [("12", BODY)])
+    ingest_laws([str(tmp_path)], workers=1)
+    assert len(db.get_law_manifest()) == 2
+    _write(tmp_path / "law_a.txt", [("5", BODY.replace("тридцать", "десять"))])
+    stats = ingest_laws([str(tmp_path / "law_a.txt")], changed_only=True, workers=1)
+    assert stats["requeued"] == 1
+    assert [m["law_id"] for m in db.get_law_manifest().values()] == ["law_a"]
+    stats = ingest_laws([str(tmp_path)], changed_only=True, workers=1)
+    assert stats["ingested"] == 1 and stats["near"] == 1 and stats["aliased"] == 0
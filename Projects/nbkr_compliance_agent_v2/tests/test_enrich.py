@@ -0,0 +1,54 @@
+# tests/test_enrich.py
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from src.agent.report.enrich import SentenceIndex, _choose_excerpt, _split_sentences, enrich_findings_ai
+
+CONTRACT = """Договор потребительского кредита.
+Банк предоставляет заемщику кредит в сумме 100 000 сом. Процентная ставка составляет 24% годовых!
+Заемщик вправе досрочно погасить кредит при условии уведомления за 30 дней. За досрочное погашение взимается комиссия 2%.
+Неустойка за просрочку составляет 1% в день. Суммарная неустойка не ограничена.
+Банк вправе уступить требование третьему лицу без согласия заемщика? Споры рассматриваются в суде…
+"""
+
+SUMMARIES = ["досрочное погашение комиссия", "неустойка за просрочку", "уступка требования без согласия",
+             "процентная ставка годовых", "ничего общего", ""]
+
+def _baseline(summary, window=220):
+    # the original _choose_excerpt: one TF-IDF fit per finding
+    sents = _split_sentences(CONTRACT)
+    vec = TfidfVectorizer(ngram_range=(1, 2), min_df=1, max_features=20000)
+    X = vec.fit_transform(sents)
+    i = int(cosine_similarity(vec.transform([summary]), X).ravel().argmax())
+    ex = ((sents[i - 1] + ". ") if i else "") + sents[i] + ((". " + sents[i + 1]) if i + 1 < len(sents) else "")
+    return ex[:window * 2]
+
+def test_index_picks_the_same_excerpts_as_per_finding_fits():
+    index = SentenceIndex(CONTRACT)
+    for summary, i in zip(SUMMARIES, index.best(SUMMARIES)):
+        assert index.excerpt(i) == _baseline(summary) == _choose_excerpt(CONTRACT, summary, "")
+    assert "комиссия 2%" in _choose_excerpt(CONTRACT, SUMMARIES[0], "")
+    assert _choose_excerpt(CONTRACT, SUMMARIES[0], "  готовый фрагмент от модели длиннее 20  ") == "готовый фрагмент от модели длиннее 20"
+
+def test_report_is_vectorized_once(monkeypatch):
+    fits = []
+    real = TfidfVectorizer.fit_transform
+    monkeypatch.setattr(TfidfVectorizer, "fit_transform", lambda self, X, y=None: fits.append(len(X)) or real(self, X, y))
+    findings = [{"title": s, "offending_text": ""} for s in SUMMARIES * 4]
+    findings.append({"title": "x", "offending_text": "фрагмент, найденный правилом, длиной больше двадцати"})
+    out = enrich_findings_ai(findings, CONTRACT)
+    assert fits == [len(_split_sentences(CONTRACT))]
+    assert out[0]["clause_excerpt"] == out[6]["clause_excerpt"] == _baseline(SUMMARIES[0])
+    assert out[-1]["clause_excerpt"].startswith("фрагмент")
+
+def test_token_overlap_fallback(monkeypatch):
+    def broken(self, X, y=None):
+        raise ValueError("empty vocabulary")
+
+    monkeypatch.setattr(TfidfVectorizer, "fit_transform", broken)
+    index = SentenceIndex(CONTRACT)
+    assert index._vec is None and index._tokens
+    picks = index.best(["неустойка за просрочку составляет", "нет совпадений"])
+    assert index.sents[picks[0]].startswith("Неустойка за просрочку")
+    assert picks[1] == 0
+    assert SentenceIndex("").best(["a"]) == [-1] and SentenceIndex("").excerpt(-1) == ""
@@ -0,0 +1,86 @@
+# tests/test_execution.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.agent.execution import ExecutionLayer, Overloaded, Stage
+
+def test_stage_keeps_the_event_loop_free():
+    st = Stage("ocr", workers=1, queue=0)
+
+    def blocking():
+        time.sleep(0.2)
+        return threading.current_thread().name
+
+    async def async_body():
+        time.sleep(0.01)  # blocking body inside an async plugin method
+        return "async done"
+
+    async def main():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        hb = asyncio.create_task(heartbeat())
+        name = await st.run(blocking)
+        hb.cancel()
+        return name, ticks, await Stage("policy", 1, 0).run(async_body)
+
+    name, ticks, res = asyncio.run(main())
+    st.shutdown()
+    assert name.startswith("stage-ocr")
+    assert ticks >= 5
+    assert res == "async done"
+
+def test_full_stage_rejects_instead_of_queueing():
+    st = Stage("policy", workers=1, queue=1)
+    gate = threading.Event()
+
+    async def main():
+        running = [asyncio.create_task(st.run(gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded):
+            await st.run(gate.wait)
+        gate.set()
+        await asyncio.gather(*running)
+        return await st.run(lambda: "ok")
+
+    assert asyncio.run(main()) == "ok"
+    assert st.stats()["rejected"] == 1 and st.stats()["pending"] == 0
+    st.shutdown()
+
+def test_admission_is_bounded_and_released():
+    ex = ExecutionLayer(max_inflight=1)
+
+    async def main():
+        async with ex.admit():
+            with pytest.raises(Overloaded) as e:
+                async with ex.admit():
+                    pass
+            assert e.value.what == "analyze"
+        async with ex.admit():
+            return ex.stats()
+
+    stats = asyncio.run(main())
+    assert stats["inflight"] == 1 and stats["rejected"] == 1
+    assert ex.stats()["inflight"] == 0
+    ex.shutdown()
+
+def test_slot_release_is_idempotent():
+    ex = ExecutionLayer(max_inflight=2)
+    release = ex.acquire_slot()
+    other = ex.acquire_slot()
+    with pytest.raises(Overloaded):
+        ex.acquire_slot()
+    release()
+    release()  # the stream body and the response wrapper both release
+    assert ex.stats()["inflight"] == 1
+    other()
+    assert ex.stats()["inflight"] == 0
+    ex.shutdown()
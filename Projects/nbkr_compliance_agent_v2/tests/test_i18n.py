@@ -0,0 +1,138 @@
+# tests/test_i18n.py
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from src.agent import i18n
+from src.agent.i18n import TranslationBatcher, TranslationMemory, TranslationScheduler
+from src.agent.orchestrator import Orchestrator
+from src.agent.storage import db
+from src.plugins import translate_plugin
+from src.plugins.translate_plugin import TranslatePlugin
+
+def test_duplicates_coalesce_into_one_call():
+    calls = []
+
+    async def tr(text, target):
+        calls.append((text, target))
+        await asyncio.sleep(0.01)
+        return text.upper()
+
+    async def main():
+        sch = TranslationScheduler(tr, concurrency=2)
+        return await asyncio.gather(*(sch.translate("привет", "en") for _ in range(5)))
+
+    assert asyncio.run(main()) == ["ПРИВЕТ"] * 5
+    assert calls == [("привет", "en")]
+
+def test_failed_call_resolves_to_source_text():
+    async def tr(text, target):
+        raise RuntimeError("quota")
+
+    async def main():
+        sch = TranslationScheduler(tr)
+        return await asyncio.gather(sch.translate("a", "en"), sch.translate("a", "en"))
+
+    assert asyncio.run(main()) == ["a", "a"]
+
+def test_cancelled_leader_hands_the_call_to_a_follower():
+    calls = []
+
+    async def tr(text, target):
+        calls.append(text)
+        await asyncio.sleep(10 if len(calls) == 1 else 0.01)
+        return text.upper()
+
+    async def main():
+        sch = TranslationScheduler(tr)
+        leader = asyncio.create_task(sch.translate("a", "en"))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(sch.translate("a", "en")) for _ in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        res = await asyncio.wait_for(asyncio.gather(*followers), timeout=1)
+        assert leader.cancelled() and sch._inflight == {}
+        return res
+
+    assert asyncio.run(main()) == ["A", "A"]
+    assert calls == ["a", "a"]  # one retry, shared by both followers
+
+def test_batcher_dedups_and_splits_per_target():
+    calls = []
+
+    async def many(texts, target):
+        calls.append((target, list(texts)))
+        if target == "ky":
+            raise RuntimeError("down")
+        return [f"{target}:{t}" for t in texts]
+
+    async def main():
+        b = TranslationBatcher(many, batch_size=2, concurrency=2)
+        for t in ["a", "b", "a", "c", ""]:
+            b.add(t, "en")
+        b.add("a", "ky")
+        return b, await b.run()
+
+    b, batches = asyncio.run(main())
+    assert batches == 3
+    assert sorted(calls) == [("en", ["a", "b"]), ("en", ["c"]), ("ky", ["a"])]
+    assert (b.get("c", "en"), b.get("a", "ky"), b.get("", "en")) == ("en:c", "a", "")
+
+def test_report_i18n_latency_follows_batches_not_flags():
+    calls = []
+
+    class Translate:
+        async def translate_many(self, texts, target_lang):
+            calls.append((target_lang, len(texts)))
+            return [f"{target_lang}:{t}" for t in texts]
+
+    kernel = SimpleNamespace(ocr=None, policy=None, rag=None, translate=Translate())
+    orch = Orchestrator(kernel)
+    flags = [{"title": f"rule {i % 3}", "reason_long": f"why {i % 3}", "offending_text": f"пункт {i}",
+              "suggested_fix": {"ru": "исправить"}} for i in range(10)]
+    batches = asyncio.run(orch._build_i18n_all(flags))
+    assert batches == len(calls) <= 4
+    assert sum(n for _, n in calls) == 3 * 2 + 10 * 2 + 1 * 2  # why ru/ky, offending en/ky, fix en/ky
+    assert flags[7]["i18n"]["en"]["offending_text"] == "en:пункт 7"
+    assert flags[7]["i18n"]["ky"]["why"] == "ky:why 1"
+    assert flags[7]["i18n"]["en"]["suggested_fix"] == "en:исправить"
+
+def test_translation_memory_layers_and_invalidation(tmp_db):
+    tm = TranslationMemory(version="1", ttl_days=30)
+    tm.put_many({"Досрочное  погашение": "Early repayment", "": "x"}, "en", "gpt")
+    assert tm.get_many(["Досрочное погашение"], "en", "gpt") == {"Досрочное погашение": "Early repayment"}
+    assert tm.stats()["lru_hits"] == 1
+
+    fresh = TranslationMemory(version="1")  # another process: served from SQLite
+    assert fresh.get_many(["Досрочное погашение", "другое"], "en", "gpt") == {"Досрочное погашение": "Early repayment"}
+    assert (fresh.db_hits, fresh.misses) == (1, 1)
+    assert fresh.get_many(["Досрочное погашение"], "en", "other-model") == {}
+    assert TranslationMemory(version="2").get_many(["Досрочное погашение"], "en", "gpt") == {}
+    assert db.tm_purge(keep_version="2") == 1
+
+    short = TranslationMemory(version="1", ttl_days=0.05 / 86400)
+    short.put_many({"ставка": "rate"}, "en", "gpt")
+    time.sleep(0.1)
+    assert TranslationMemory(version="1").get_many(["ставка"], "en", "gpt") == {}
+
+def test_known_strings_never_reach_the_model(tmp_db, monkeypatch):
+    tm = TranslationMemory(version="t")
+    monkeypatch.setattr(i18n, "_TM", tm)
+    sent, tm_threads = [], set()
+    for name in ("get_many", "put_many"):
+        real = getattr(tm, name)
+        monkeypatch.setattr(tm, name, lambda *a, _real=real, **kw: tm_threads.add(threading.get_ident()) or _real(*a, **kw))
+
+    async def batch(self, texts, target_lang):
+        sent.append(list(texts))
+        return [t.upper() for t in texts]
+
+    monkeypatch.setattr(TranslatePlugin, "_configured", lambda self: True)
+    monkeypatch.setattr(TranslatePlugin, "_translate_batch", batch)
+    monkeypatch.setattr(translate_plugin.settings, "AZURE_OPENAI_DEPLOYMENT", "gpt", raising=False)
+    plugin = TranslatePlugin(None)
+    assert asyncio.run(plugin.translate_many(["abc", "def", "abc"], "en")) == ["ABC", "DEF", "ABC"]
+    assert asyncio.run(plugin.translate_many(["def", "ghi"], "en")) == ["DEF", "GHI"]
+    assert sent == [["abc", "def"], ["ghi"]]
+    assert tm_threads and threading.get_ident() not in tm_threads  # SQLite I/O ran off the event loop
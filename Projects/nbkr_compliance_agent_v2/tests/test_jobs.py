@@ -0,0 +1,132 @@
+# tests/test_jobs.py
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from src.agent import jobs
+from src.agent.execution import Overloaded
+from src.agent.storage import db
+
+class FakeOrchestrator:
+    def __init__(self, gate=None, fail=False):
+        self.gate, self.fail, self.calls = gate, fail, 0
+
+    async def analyze(self, data):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise ValueError("bad file")
+        return {"goal": data.goal, "flags": {"items": [{"title": "x"}]}, "run_summary": {"timings_ms": {"ocr": 1.0}}}
+
+def _wait(job_id, *statuses, timeout=10.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        job = db.get_job(job_id)
+        if job and job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"{job_id} never reached {statuses}: {db.get_job(job_id)}")
+
+@pytest.fixture
+def queue(tmp_db, monkeypatch):
+    made = []
+
+    def make(orch, mode="thread", **kw):
+        monkeypatch.setattr(jobs, "_ORCH", None)
+        q = jobs.JobQueue(mode=mode, orchestrator=orch, **kw)
+        made.append(q)
+        return q
+
+    yield make
+    for q in made:
+        q.shutdown()
+
+def test_status_transitions_and_dedup(queue):
+    gate = threading.Event()
+    q = queue(FakeOrchestrator(gate), workers=1)
+    first = q.submit("goal", b"contract")
+    assert first["status"] == "queued" and not first["deduplicated"]
+    _wait(first["job_id"], "running")
+    again = q.submit("goal", b"contract")
+    assert again == {"job_id": first["job_id"], "status": "running", "deduplicated": True}
+    assert q.submit("other goal", b"contract")["job_id"] != first["job_id"]
+    gate.set()
+    job = _wait(first["job_id"], "done")
+    assert job["result"]["flags"]["items"] == [{"title": "x"}]
+    assert job["timings"] == {"ocr": 1.0} and job["started_at"] <= job["finished_at"]
+    assert q.submit("goal", b"contract")["deduplicated"]
+    assert q.stats()["deduplicated"] == 2
+
+def test_failed_job_can_be_resubmitted(queue):
+    q = queue(FakeOrchestrator(fail=True), workers=1)
+    first = q.submit("goal", b"broken")["job_id"]
+    assert "ValueError: bad file" in _wait(first, "error")["error"]
+    second = q.submit("goal", b"broken")
+    assert second["job_id"] != first and not second["deduplicated"]
+
+def test_full_queue_rejects(queue):
+    gate = threading.Event()
+    q = queue(FakeOrchestrator(gate), workers=1, queue=1)
+    q.submit("g", b"1"), q.submit("g", b"2")
+    with pytest.raises(Overloaded):
+        q.submit("g", b"3")
+    gate.set()
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork to share the fake")
+def test_process_mode_runs_jobs_in_worker_processes(queue, monkeypatch):
+    monkeypatch.setenv("JOBS_START_METHOD", "fork")
+    q = queue(None, mode="process", workers=1)
+    monkeypatch.setattr(jobs, "_ORCH", FakeOrchestrator())  # inherited by the forked worker
+    db.close_engines()  # no pooled SQLite handles across the fork
+    assert q._pool.submit(int).result() == 0  # fork the worker now
+    ids = [q.submit("goal", f"doc {i}".encode())["job_id"] for i in range(3)]
+    assert all(_wait(j, "done")["status"] == "done" for j in ids)
+    assert jobs._ORCH.calls == 0  # nothing ran in this process
+
+def test_abandoned_jobs_do_not_block_resubmission(tmp_db):
+    job_id, _ = db.create_job("dead", "h", "g", owner="gone:1")
+    with db._conn() as c:
+        c.execute("UPDATE reports SET heartbeat_at = ? WHERE job_id = 'dead'", (time.time() - 600,))
+    assert db.find_job("h", "g") is None
+    new_id, created = db.create_job("new", "h", "g", owner="me")
+    assert (new_id, created) == ("new", True)
+    assert db.get_job("dead")["error"] == "interrupted"
+
+def test_live_owner_keeps_its_jobs(tmp_db):
+    db.create_job("a", "h1", "g", owner="me")
+    db.create_job("b", "h2", "g", owner="gone")
+    with db._conn() as c:
+        c.execute("UPDATE reports SET heartbeat_at = ?", (time.time() - 600,))
+    assert db.heartbeat_jobs("me") == 1
+    assert db.fail_stale_jobs() == 1
+    assert db.get_job("a")["status"] == "queued" and db.get_job("b")["status"] == "error"
+
+def test_new_queue_reclaims_and_heartbeats(queue, monkeypatch):
+    monkeypatch.setenv("JOBS_HEARTBEAT_SEC", "0.05")
+    db.create_job("orphan", "h", "goal", owner="old-process")
+    with db._conn() as c:
+        c.execute("UPDATE reports SET heartbeat_at = 0")
+    gate = threading.Event()
+    q = queue(FakeOrchestrator(gate), workers=1)
+    assert db.get_job("orphan")["status"] == "error"
+    job = q.submit("goal", b"x")["job_id"]
+
+    def beat():
+        with db._conn() as c:
+            return c.execute("SELECT heartbeat_at FROM reports WHERE job_id = ?", (job,)).fetchone()[0]
+
+    first = beat()
+    time.sleep(0.3)
+    assert beat() > first
+    gate.set()
+    _wait(job, "done")
+
+def test_sync_report_completes_a_pending_job(tmp_db):
+    job_id, _ = db.create_job("queued", "h", "g", owner="me")
+    assert db.save_report("file.pdf", "g", "h", {"flags": {"items": []}}, {}) == job_id
+    assert db.get_job(job_id)["status"] == "done"
+    assert db.save_report("file.pdf", "g", "h", {"flags": {"items": [1]}}, {}) == job_id
+    assert db.get_job(job_id)["result"] == {"flags": {"items": []}}  # finished reports are kept
@@ -0,0 +1,154 @@
+# tests/test_laws_ingest.py
+import itertools
+import os
+import re
+import time
+import zipfile
+
+from src.agent.ingest.batch import resolve_law_files
+from src.agent.ingest.laws_ingest import _RULES, _atoms_from_blocks, _lines, iter_blocks, iter_law_lines, law_docs
+from src.agent.storage import db
+
+def _baseline(blocks):
+    # the original _atoms_from_blocks: every ".*" pattern, IGNORECASE, on every block
+    return sorted((b["ref"], rx) for b in blocks for rx, _, _, _ in _RULES if re.search(rx, b["body"], flags=re.IGNORECASE))
+
+def _compiled(blocks):
+    return sorted((a["ref"], a["trigger_regex"]) for a in _atoms_from_blocks(blocks, "t"))
+
+FRAGMENTS = [
+    "Заемщик вправе ДОСРОЧНО погасить кредит", "без комиссий", "без уплаты штрафа", "и иных платежей",
+    "Неустойка", "не может быть не более", "не выше", "процентной ставки", "10 %", "10%",
+    "уступка требования", "уступки требований", "допускается только", "исключительно", "с согласия заемщика",
+]
+
+def test_atoms_match_the_baseline_rules():
+    blocks = [{"ref": f"b{i}", "body": " ".join(combo)}
+              for i, combo in enumerate(itertools.permutations(FRAGMENTS, 3))]
+    blocks += [b for f in resolve_law_files(["laws", "laws_inbox"]) for b in iter_blocks(iter_law_lines(f))]
+    expected = _baseline(blocks)
+    assert expected  # the fixture set exercises every rule
+    assert {rx for _, rx in expected} == {rx for rx, _, _, _ in _RULES}
+    assert _compiled(blocks) == expected
+
+def test_atoms_store_the_rule_as_written():
+    (atom,) = _atoms_from_blocks([{"ref": "п.1", "body": "Досрочное погашение без комиссий."}], "law")
+    assert atom["trigger_regex"] == _RULES[0][0]
+    assert atom["trigger_keywords"] == ["досрочное", "без комиссий"]
+
+def test_long_line_without_a_match_is_linear():
+    body = "досрочное " + "без условий " * 5000
+    t0 = time.perf_counter()
+    assert _atoms_from_blocks([{"ref": "long", "body": body}], "law") == []
+    assert time.perf_counter() - t0 < 1.0
+
+def test_refresh_skips_unchanged_files_and_reingests_edits(rag, tmp_path):
+    from src.agent.ingest.guard import ensure_laws_up_to_date
+    laws = tmp_path / "laws"
+    laws.mkdir()
+    law = laws / "law_credit.txt"
+    law.write_text("Статья 1.\nЗаемщик вправе досрочно погасить кредит без комиссий.\n", encoding="utf-8")
+    (laws / "notes.txt").write_text("Статья 1.\nне закон\n", encoding="utf-8")
+
+    assert ensure_laws_up_to_date(str(laws)) == {"checked": 1, "ingested": 1, "unchanged": 0, "failed": 0, "removed": 0}
+    assert ensure_laws_up_to_date(str(laws))["unchanged"] == 1
+    seq = db.kb_change_seq()
+
+    st = law.stat()
+    os.utime(law, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # touched, same bytes
+    assert ensure_laws_up_to_date(str(laws))["unchanged"] == 1
+    assert db.kb_change_seq() == seq
+    assert db.get_law_manifest()[str(law)]["mtime_ns"] == st.st_mtime_ns + 10**9
+
+    law.write_text("Статья 1.\nНеустойка не более 10 % от суммы кредита.\n", encoding="utf-8")
+    assert ensure_laws_up_to_date(str(laws))["ingested"] == 1
+    (doc,) = db.get_kb_docs(["law_credit#00000"])
+    assert "Неустойка" in doc["text"]
+
+    with db._conn() as c:  # rows written by an older parser are re-ingested
+        c.execute("UPDATE law_manifest SET parser_version = '0'")
+    assert ensure_laws_up_to_date(str(laws))["ingested"] == 1
+
+    law.unlink()
+    seq = db.kb_change_seq()
+    assert ensure_laws_up_to_date(str(laws))["removed"] == 1
+    assert db.get_law_manifest() == {}
+    assert db.get_kb_docs(["law_credit#00000"]) == []  # no longer cited
+    assert db.kb_change_seq() > seq
+
+def test_refresh_through_a_symlinked_dir_detects_removals(rag, tmp_path):
+    from src.agent.ingest.guard import ensure_laws_up_to_date
+    real = tmp_path / "real"
+    real.mkdir()
+    (real / "law_a.txt").write_text("Статья 1.\nТекст закона.\n", encoding="utf-8")
+    link = tmp_path / "laws"
+    link.symlink_to(real, target_is_directory=True)
+    assert ensure_laws_up_to_date(str(link))["ingested"] == 1
+    (real / "law_a.txt").unlink()
+    assert ensure_laws_up_to_date(str(link))["removed"] == 1
+    assert db.list_kb_docs() == []
+
+LAW = """Закон о банках
+Статья 5. Кредитование
+Общие положения статьи.
+Пункт 21 (7)
+Заемщик вправе досрочно погасить кредит.
+
+21.8.
+Неустойка не более 10 %.
+Статья 6
+  3. Первый пункт новой статьи
+Уступка требования.
+Пункт 4
+   \t
+"""
+
+def _baseline_blocks(text):
+    # the original _extract_blocks: body grown with +=
+    blocks, cur = [], {"ref": "", "title": "", "body": ""}
+    for line in text.splitlines():
+        if re.match(r"^(Пункт|Статья|\d+\.)", line.strip(), flags=re.IGNORECASE):
+            if cur["body"].strip():
+                blocks.append(cur)
+            cur = {"ref": line.strip()[:180], "title": line.strip()[:180], "body": ""}
+        else:
+            cur["body"] += line + "\n"
+    if cur["body"].strip():
+        blocks.append(cur)
+    return blocks
+
+def test_blocks_carry_the_article_hierarchy():
+    blocks = list(iter_blocks(LAW.splitlines()))
+    assert [{k: b[k] for k in ("ref", "title", "body")} for b in blocks] == _baseline_blocks(LAW)
+    assert [b["ref_path"] for b in blocks] == ["", "ст. 5", "ст. 5 п. 21.7", "ст. 5 п. 21.8", "ст. 6 п. 3"]
+    assert blocks[2]["hier"] == {"article": "5", "point": "21", "subpoint": "7"}
+    assert blocks[4]["hier"] == {"article": "6", "point": "3", "subpoint": None}
+
+def test_blocks_stream_from_an_unbounded_source():
+    def endless():
+        for n in itertools.count(1):
+            yield f"Статья {n}"
+            yield "текст " * 50
+
+    first = list(itertools.islice(iter_blocks(endless()), 3))
+    assert [b["ref_path"] for b in first] == ["ст. 1", "ст. 2", "ст. 3"]
+    pieces = ["a\nb", "", "c\r\nd\n", "e"]
+    assert list(_lines(iter(pieces))) == "\n".join(pieces).splitlines()
+
+def _docx(path, body):
+    w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("word/document.xml", f'<w:document {w}><w:body>{body}</w:body></w:document>')
+
+def test_docx_paragraphs_are_streamed_like_python_docx(tmp_path):
+    path = tmp_path / "law.docx"
+    _docx(path, "<w:p><w:r><w:t>Статья 1</w:t></w:r></w:p>"
+                "<w:p><w:r><w:t>Заемщик</w:t><w:tab/><w:t>вправе</w:t></w:r>"
+                "<w:hyperlink><w:r><w:t> досрочно</w:t></w:r></w:hyperlink><w:r><w:br/><w:t>погасить</w:t></w:r></w:p>"
+                "<w:tbl><w:tr><w:tc><w:p><w:r><w:t>ячейка таблицы</w:t></w:r></w:p></w:tc></w:tr></w:tbl>"
+                "<w:p/><w:p><w:r><w:t>Пункт 2</w:t></w:r></w:p><w:sectPr/>")
+    assert list(iter_law_lines(str(path))) == ["Статья 1", "Заемщик\tвправе досрочно", "погасить", "", "Пункт 2"]
+    atoms = []
+    (doc,) = law_docs(str(path), "law", atoms)
+    assert doc["meta"]["ref_path"] == "ст. 1" and doc["meta"]["hier"]["article"] == "1"
+    assert doc["text"] == "Заемщик\tвправе досрочно\nпогасить\n\n"
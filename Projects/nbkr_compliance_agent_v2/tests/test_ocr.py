@@ -0,0 +1,163 @@
+# tests/test_ocr.py
+import os
+from concurrent.futures import Future
+
+import fitz
+import pytest
+
+from src.agent.storage import ocr_cache
+from src.agent.storage.ocr_cache import OCRCache
+from src.plugins import ocr_plugin
+from src.plugins.ocr_plugin import OCRPlugin
+
+class _Page:
+    def __init__(self, n):
+        self.n = n
+
+    def get_pixmap(self, dpi, alpha):
+        return self
+
+    def tobytes(self):
+        return f"page{self.n}".encode()
+
+class _Pool:
+    """Executor stand-in: OCRs inline, or hands back cancelled futures like a pool shut down with cancel_futures."""
+
+    def __init__(self, cancelled=False):
+        self.cancelled, self.submitted = cancelled, 0
+
+    def submit(self, fn, png, lang, timeout):
+        self.submitted += 1
+        f = Future()
+        if self.cancelled:
+            f.cancel()
+        else:
+            f.set_result((f"text of {png.decode()}", 1.0, "ocr"))
+        return f
+
+def _run(idxs, n_pages=3):
+    plugin = OCRPlugin()
+    texts = [""] * n_pages
+    timings = [{"page": i + 1, "source": "text"} for i in range(n_pages)]
+    plugin._ocr_pages([_Page(i) for i in range(n_pages)], idxs, texts, timings)
+    return texts, timings
+
+def test_pages_merge_back_in_order(monkeypatch):
+    pool = _Pool()
+    monkeypatch.setattr(ocr_plugin, "_ocr_pool", lambda: pool)
+    texts, timings = _run([2, 0])
+    assert texts == ["text of page0", "", "text of page2"]
+    assert [t["source"] for t in timings] == ["ocr", "text", "ocr"]
+    assert pool.submitted == 2
+
+def test_cancelled_pages_are_resubmitted_to_a_fresh_pool(monkeypatch):
+    dead, fresh = _Pool(cancelled=True), _Pool()
+    pools = iter([dead, dead, fresh, fresh])
+    monkeypatch.setattr(ocr_plugin, "_ocr_pool", lambda: next(pools))
+    texts, timings = _run([0, 1], n_pages=2)
+    assert texts == ["text of page0", "text of page1"]
+    assert fresh.submitted == 2
+
+def test_page_cancelled_twice_is_an_ocr_error(monkeypatch):
+    dead = _Pool(cancelled=True)
+    monkeypatch.setattr(ocr_plugin, "_ocr_pool", lambda: dead)
+    texts, timings = _run([0], n_pages=1)
+    assert texts == [""] and timings[0]["source"] == "ocr_error"
+
+def test_shutdown_only_drops_the_pool_it_was_given(monkeypatch):
+    class P:
+        down = False
+
+        def shutdown(self, wait, cancel_futures):
+            self.down = True
+
+    current = P()
+    monkeypatch.setattr(ocr_plugin, "_POOL", current)
+    ocr_plugin.shutdown_ocr_pool(P())  # stale pool from an earlier request
+    assert ocr_plugin._POOL is current and not current.down
+    ocr_plugin.shutdown_ocr_pool(current)
+    assert ocr_plugin._POOL is None and current.down
+
+def _mixed_pdf():
+    doc = fitz.open()
+    typed = doc.new_page()
+    typed.insert_textbox(fitz.Rect(50, 50, 545, 800), "Loan agreement. The borrower may repay the loan early. " * 40)
+    doc.new_page()  # blank separator
+    scan = doc.new_page()
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 80), False)
+    pix.clear_with(200)
+    scan.insert_image(scan.rect, pixmap=pix)
+    scan.insert_text((40, 40), "Signature")  # typed stamp over the scan
+    return doc.tobytes()
+
+def test_only_scanned_pages_are_ocred(monkeypatch):
+    monkeypatch.setenv("OCR_CACHE", "0")
+    sent = []
+
+    def fake_ocr(self, doc, idxs, texts, timings):
+        sent.extend(idxs)
+        for i in idxs:
+            texts[i] = f"ocr {i}"
+            timings[i]["source"] = "ocr"
+
+    monkeypatch.setattr(OCRPlugin, "_ocr_pages", fake_ocr)
+    res = OCRPlugin().extract(_mixed_pdf(), "application/pdf")
+    assert sent == [2]
+    assert [t["reason"] for t in res["page_timings"]] == ["text_layer", "blank", "scanned"]
+    assert res["pages_text"][0].startswith("Loan agreement") and res["pages_text"][2] == "ocr 2"
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = OCRCache(root=str(tmp_path), max_bytes=300)
+    k = [OCRCache.key(f"file{i}".encode(), {"langs": "rus+eng"}) for i in range(3)]
+    assert k[0] != OCRCache.key(b"file0", {"langs": "eng"})
+    assert cache.get(k[0]) is None
+    cache.put(k[0], {"text": "a" * 100})
+    cache.put(k[1], {"text": "b" * 100})
+    cache._path(k[0]).touch()
+    os.utime(cache._path(k[1]), (1, 1))  # k[1] is the oldest now
+    cache.put(k[2], {"text": "c" * 100})
+    assert cache.get(k[1]) is None
+    assert cache.get(k[0]) == {"text": "a" * 100}
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] <= 300
+
+def test_repeat_extract_is_served_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_CACHE", "1")
+    monkeypatch.setattr(ocr_cache, "_CACHE", OCRCache(root=str(tmp_path)))
+    calls = []
+
+    def fake_ocr(self, doc, idxs, texts, timings):
+        calls.append(idxs)
+        texts[idxs[0]] = "scanned text"
+
+    monkeypatch.setattr(OCRPlugin, "_ocr_pages", fake_ocr)
+    pdf = _mixed_pdf()
+    first = OCRPlugin().extract(pdf, "application/pdf")
+    again = OCRPlugin().extract(pdf, "application/pdf")
+    assert (first["cache"], again["cache"]) == ("miss", "hit")
+    assert len(calls) == 1
+    assert again["pages_text"] == first["pages_text"] and again["lang"] == first["lang"]
+    monkeypatch.setenv("OCR_LANGS", "eng")
+    assert OCRPlugin().extract(pdf, "application/pdf")["cache"] == "miss"
+    assert ocr_cache.get_ocr_cache().stats()["hits"] == 1
+
+@pytest.mark.parametrize("status", ["ocr_timeout", "ocr_error"])
+def test_failed_ocr_page_is_not_cached(tmp_path, monkeypatch, status):
+    monkeypatch.setenv("OCR_CACHE", "1")
+    monkeypatch.setattr(ocr_cache, "_CACHE", OCRCache(root=str(tmp_path)))
+    calls = []
+
+    def flaky_ocr(self, doc, idxs, texts, timings):
+        calls.append(idxs)
+        if len(calls) == 1:
+            timings[idxs[0]]["source"] = status
+        else:
+            texts[idxs[0]] = "scanned text"
+
+    monkeypatch.setattr(OCRPlugin, "_ocr_pages", flaky_ocr)
+    pdf = _mixed_pdf()
+    first = OCRPlugin().extract(pdf, "application/pdf")
+    assert first["ok"] and first["cache"] == "miss"
+    retry = OCRPlugin().extract(pdf, "application/pdf")
+    assert retry["cache"] == "miss" and len(calls) == 2
+    assert "scanned text" in retry["text"]
+    assert OCRPlugin().extract(pdf, "application/pdf")["cache"] == "hit"
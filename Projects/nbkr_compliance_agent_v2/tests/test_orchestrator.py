@@ -0,0 +1,59 @@
+# tests/test_orchestrator.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.agent.execution import ExecutionLayer
+from src.agent.orchestrator import AnalyzeInput, Orchestrator
+from src.agent.rules import store
+from src.agent.storage import db
+from src.plugins.policy_plugin import PolicyPlugin
+
+CONTRACT = "Заемщик вправе досрочно погасить кредит с уплатой комиссии. Неустойка 20% годовых."
+
+@pytest.fixture
+def orch(tmp_db, monkeypatch):
+    monkeypatch.setattr(store, "_CURRENT", None)
+    log = []
+
+    class Rag:
+        def search_many(self, queries, law_hints, top_k):
+            log.append("citations")
+            return [[{"ref": h, "title": q, "full_text": q}] for q, h in zip(queries, law_hints)]
+
+    class Translate:
+        async def translate_many(self, texts, target_lang):
+            log.append("translate")
+            return [f"{target_lang}:{t}" for t in texts]
+
+    kernel = SimpleNamespace(ocr=None, policy=PolicyPlugin(), rag=Rag(), translate=Translate())
+    o = Orchestrator(kernel, execution=ExecutionLayer())
+    o.log = log
+    yield o
+    o.execution.shutdown()
+
+def test_flags_stream_before_citations_and_translations(orch):
+    async def main():
+        events = []
+        async for ev in orch.analyze_stream(AnalyzeInput(goal="g", text=CONTRACT)):
+            events.append(ev["event"])
+            if ev["event"] == "flag":
+                assert {"citations", "translate"}.isdisjoint(orch.log)  # no RAG or LLM call yet
+            orch.log.append(ev["event"])
+        return events, ev["result"]
+
+    events, result = asyncio.run(main())
+    n = len(result["flags"]["items"])
+    assert n >= 2
+    assert events == ["ocr"] + ["flag"] * n + ["citations"] * n + ["i18n"] * n + ["done"]
+    assert orch.log.index("translate") > orch.log.index("citations") > orch.log.index("flag")
+    item = result["flags"]["items"][0]
+    assert item["citations"] and item["i18n"]["en"]["offending_text"].startswith("en:")
+    assert set(result["run_summary"]["timings_ms"]) == {"ocr", "policy", "i18n", "total"}
+
+def test_analyze_is_the_stream_result_and_persists(orch):
+    res = asyncio.run(orch.analyze(AnalyzeInput(goal="g", text=CONTRACT, filename="c.txt"), persist_report=True))
+    assert [f["violation_code"] for f in res["flags"]["items"]]
+    job = db.get_job(res["report_id"])
+    assert job["status"] == "done" and job["result"]["flags"] == res["flags"]
@@ -0,0 +1,139 @@
+# tests/test_policy.py
+import asyncio
+import itertools
+import random
+import re
+
+import pytest
+
+from src.agent.rag import bm25
+from src.agent.rules import store
+from src.agent.rules.defaults import DEFAULT_RULES
+from src.agent.rules.engine import RuleEngine
+from src.agent.storage import db
+from src.plugins.policy_plugin import PolicyPlugin
+from src.plugins.rag_plugin import RAGPlugin
+
+@pytest.fixture
+def rules(tmp_db, monkeypatch):
+    monkeypatch.setattr(store, "_CURRENT", None)
+    return store.current_rules(force=True)
+
+def _baseline(text):
+    # the original PolicyPlugin.flag decisions and _find_offending_excerpt
+    low = text.lower()
+    any_ = lambda terms: any(t.lower() in low for t in terms)
+    out = []
+    for rule in DEFAULT_RULES:
+        code = rule["code"]
+        ok_hints = not rule["hints_any"] or any_(rule["hints_any"])
+        ok_must_have = not rule["must_have"] or all(t.lower() in low for t in rule["must_have"])
+        violates = bool(rule["must_not"]) and any_(rule["must_not"])
+        if code == "prepayment_no_fees":
+            hit = ok_hints and bool(re.search(r"30\s*дн", text, flags=re.I) or "предварительного уведомления" in low
+                                    or any_(["комисси", "штраф", "иной платеж"]))
+        elif code == "penalty_cap_10":
+            hit = violates or bool(re.search(r"20\s*%|20\s*процент", text, flags=re.I))
+        elif code == "penalty_rate_le_credit_rate":
+            hit = ok_hints and not ok_must_have
+        else:
+            hit = ok_hints and ("дополнительные платежи" in low or "тариф" in low)
+        if not hit:
+            continue
+        excerpt = None
+        for term in rule["must_not"] + rule["hints_any"]:
+            m = re.search(re.escape(term), text, flags=re.I)
+            if m:
+                excerpt = re.sub(r"\s+", " ", text[max(0, m.start() - 120):m.end() + 220]).strip()
+                break
+        out.append((code, excerpt or text[:400]))
+    return out
+
+CLAUSES = [
+    "Заемщик вправе ДОСРОЧНО погасить кредит", "с предварительного уведомления за 30 дней",
+    "уплачивается Комиссия 2%", "неустойка 20 процентов", "ставка неустойки не более процентной ставки по кредиту",
+    "дополнительные платежи согласно Тарифам", "перечень расходов приведен в Приложении 6", "штраф",
+]
+
+def test_engine_matches_the_baseline_flag(rules):
+    plugin = PolicyPlugin()
+    texts = [". ".join(c) for n in range(len(CLAUSES) + 1) for c in itertools.combinations(CLAUSES, n)]
+    seen = set()
+    for text in texts:
+        got = [(it["violation_code"], it["offending_text"]) for it in plugin.evaluate(text)]
+        assert got == _baseline(text), text
+        seen.update(code for code, _ in got)
+    assert seen == {r["code"] for r in DEFAULT_RULES}
+
+def test_scan_finds_the_first_occurrence_of_every_term():
+    rnd = random.Random(7)
+    terms = ["ком", "комисс", "комиссия", "мисс", "с", "ия", "штраф", "раф", "%", "20%"]
+    engine = RuleEngine([{"hints_any": terms}])
+    for _ in range(300):
+        text = "".join(rnd.choice(["Комиссия ", "штраф", "20%", "мис", "с", " ", "ия"]) for _ in range(12))
+        scan = engine.scan(text)
+        assert scan.first == {t: text.lower().find(t) for t in terms if t in text.lower()}, text
+
+def test_rule_changes_apply_without_restart(rules, monkeypatch):
+    plugin = PolicyPlugin()
+    text = "Заемщик оплачивает страховку жизни у партнера банка"
+    assert plugin.evaluate(text) == []
+
+    monkeypatch.setenv("RULES_REFRESH_SEC", "0")
+    db.upsert_policy_rule({"code": "tied_insurance", "law_ref": "П.44", "title": "Tied insurance",
+                           "hints_any": ["страхов"], "predicate": {"terms_all": ["страхов", "партнер"]},
+                           "severity": "high", "reasons": {"en": "Tied products are prohibited."},
+                           "fixes": {"ru": "Страхование по выбору заемщика."}})
+    db.upsert_policy_rule({"code": "broken", "predicate": {"nope": []}})
+    (item,) = plugin.evaluate(text)
+    assert (item["violation_code"], item["severity"], item["reason_long"]) == ("tied_insurance", "high", "Tied products are prohibited.")
+    assert item["suggested_fix"] == {"ru": "Страхование по выбору заемщика.", "en": "", "ky": ""}
+    assert [a["code"] for a in rules.atoms if a["code"] == "tied_insurance"] == []  # old snapshot untouched
+
+    db.set_policy_rule_enabled("tied_insurance", False)
+    assert plugin.evaluate(text) == []
+
+def test_rule_set_is_cached_between_refreshes(rules, monkeypatch):
+    monkeypatch.setenv("RULES_REFRESH_SEC", "3600")
+    reads = []
+    monkeypatch.setattr(db, "rules_version", lambda *a: reads.append(1) or 0)
+    for _ in range(20):
+        assert store.current_rules() is rules
+    assert reads == []
+
+CONTRACT = "Заемщик вправе досрочно погасить кредит с уплатой комиссии. Неустойка 20% годовых. Дополнительные платежи по тарифам банка."
+
+def test_citations_are_one_batched_lookup(rules, monkeypatch):
+    monkeypatch.setenv("RAG_SEMANTIC_WEIGHT", "0")
+    monkeypatch.setattr(bm25, "_SHARED", None)
+    calls = []
+
+    class Rag(RAGPlugin):
+        def search(self, *a, **kw):
+            raise AssertionError("per-query search")
+
+        def search_many(self, queries, law_hints=None, top_k=3):
+            calls.append((list(queries), list(law_hints)))
+            return super().search_many(queries, law_hints, top_k)
+
+    items = asyncio.run(PolicyPlugin(rag=Rag()).flag(CONTRACT))
+    assert len(calls) == 1
+    assert calls[0] == ([it["title"] for it in items], [it["law_ref"] for it in items])
+    assert len(items) == 4
+    for it in items:
+        assert it["citations"] and it["law"]["ref"] == it["law_ref"]
+
+    idx = bm25.shared_index()
+    scored = []
+    monkeypatch.setattr(idx.index, "token_scores", lambda toks: scored.append(toks) or {})
+    again = asyncio.run(PolicyPlugin(rag=Rag()).flag(CONTRACT))  # next request: memo hits only
+    assert scored == []
+    assert [it["citations"] for it in again] == [it["citations"] for it in items]
+
+def test_citations_fall_back_to_per_query_search(rules):
+    class Rag:
+        def search(self, query, top_k, law_hint):
+            return [{"ref": law_hint, "title": query, "full_text": "t"}]
+
+    items = asyncio.run(PolicyPlugin(rag=Rag()).flag(CONTRACT))
+    assert [it["law"]["title"] for it in items] == [it["title"] for it in items]
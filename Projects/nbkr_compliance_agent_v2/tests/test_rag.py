@@ -0,0 +1,208 @@
+# tests/test_rag.py
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from src.agent.rag.bm25 import BM25Index, LawIndex
+from src.agent.rag.vector_store import SparseVectorStore, VectorStore, writer_lock
+from src.agent.storage import db
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+def _kb(doc_id, text, law_id="kb"):
+    return {"doc_id": doc_id, "title": doc_id, "text": text, "law_id": law_id, "meta": {"ref": doc_id}}
+
+def test_dense_store_replaces_and_compacts(tmp_db, tmp_path):
+    st = VectorStore("t", 3, root=tmp_path, refresh_sec=0)
+    st.add(["a", "b"], [[1, 0, 0], [0, 1, 0]])
+    assert st.search([1, 0.1, 0], top_k=1)[0][0] == "a"
+    st.add(["a"], [[0, 0, 1]])  # update: old row tombstoned
+    assert len(st) == 2
+    assert st.search([0, 0, 1], top_k=1)[0][0] == "a"
+    assert [d for d, _ in st.search([1, 0, 0], top_k=2)] != ["a", "a"]
+    st.compact()
+    assert len(db.vec_rows_load("t")) == 2
+    assert st.search([0, 1, 0], top_k=1)[0][0] == "b"
+
+def test_sparse_store_flushes_generations(tmp_db, tmp_path):
+    st = SparseVectorStore("s", 4, root=tmp_path, refresh_sec=0)
+    st.add(["a"], sp.csr_matrix(np.array([[1, 0, 0, 0]], np.float32)))
+    st.add(["b"], sp.csr_matrix(np.array([[0, 1, 0, 0]], np.float32)), kb_seq=1)
+    assert st.search(sp.csr_matrix([[0, 1, 0, 0]]), top_k=1)[0][0] == "b"
+    st.delete(["b"])
+    assert [d for d, _ in st.search(sp.csr_matrix([[0, 1, 0, 0]]), top_k=5)] == ["a"]
+
+def test_sparse_flush_appends_delta_segments(tmp_db, tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_SPARSE_MAX_SEGMENTS", "3")
+    st = SparseVectorStore("s", 4, root=tmp_path, refresh_sec=0)
+    row = lambda i: sp.csr_matrix(np.eye(4, dtype=np.float32)[[i]])
+    st.add(["a", "b"], sp.vstack([row(0), row(1)]), kb_seq=1)
+    first = st._segments()
+    first_ino = os.stat(st.dir / first[0] / "data.npy").st_ino
+    st.add(["c"], row(2), kb_seq=2)
+    st.add(["a"], row(3), kb_seq=3)  # update: tombstone + append
+    segs = st._segments()
+    assert len(segs) == 3 and segs[0] == first[0]
+    assert os.stat(st.dir / first[0] / "data.npy").st_ino == first_ino  # earlier rows not rewritten
+    assert [st.search(row(i), top_k=1)[0][0] for i in (1, 2, 3)] == ["b", "c", "a"]
+    assert all(score == 0 for _, score in st.search(row(0), top_k=5))  # the old "a" row is dead
+
+    st.add(["d"], row(0), kb_seq=4)  # the 4th segment would exceed the cap: merge
+    assert len(st._segments()) == 1 and sorted(p.name for p in st.dir.glob("g*")) == st._segments()
+    assert st.search(row(0), top_k=1)[0][0] == "d" and st.search(row(3), top_k=1)[0][0] == "a"
+    assert len(st) == 4
+
+def _writer(root, tag, n):
+    # another process appending n rows one add() at a time
+    code = textwrap.dedent(f"""
+        from src.agent.rag.vector_store import VectorStore
+        st = VectorStore("w", 2, root={str(root)!r})
+        for i in range({n}):
+            st.add(["{tag}%d" % i], [[1.0, float(i)]])
+    """)
+    return subprocess.Popen([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=dict(os.environ),
+                            stderr=subprocess.PIPE, text=True)
+
+def test_writers_in_other_processes_wait_for_the_lock(tmp_db, tmp_path):
+    with writer_lock(tmp_path):
+        proc = _writer(tmp_path, "p", 1)
+        with pytest.raises(subprocess.TimeoutExpired):
+            proc.wait(timeout=1.0)
+        assert db.vec_rows_load("w") == []
+    assert proc.wait(timeout=60) == 0, proc.stderr.read()
+    assert [d for _, d, _ in db.vec_rows_load("w")] == ["p0"]
+
+def test_concurrent_writers_never_share_a_row(tmp_db, tmp_path):
+    procs = [_writer(tmp_path, tag, 25) for tag in "ab"]
+    st = VectorStore("w", 2, root=tmp_path, refresh_sec=0)
+    for i in range(25):
+        st.add([f"c{i}"], [[0.0, 1.0]])
+    for p in procs:
+        assert p.wait(timeout=120) == 0, p.stderr.read()
+    rows = db.vec_rows_load("w")
+    assert [r for r, _, _ in rows] == list(range(75))
+    assert len({d for _, d, _ in rows}) == 75 and len(st) == 75
+
+def test_incremental_rebuild_follows_kb_changes(rag):
+    db.upsert_kb_docs([_kb("d1", "досрочное погашение кредита без комиссий"),
+                       _kb("d2", "персональные данные и согласие заемщика")])
+    assert rag.rebuild_index_if_needed()["embedded"] == 2
+    assert rag.rebuild_index_if_needed() == {"embedded": 0, "deleted": 0}
+    db.delete_kb_doc("d2")
+    rag.rebuild_index_if_needed()
+    assert len(rag.vector_store()) == 1
+    assert [h["doc_id"] for h in rag.search_kb("погашение", top_k=5)] == ["d1"]
+
+def test_bm25_index_add_replace_remove():
+    idx = BM25Index()
+    idx.add("a", "кредит досрочно", {"ref": "1"})
+    idx.add("b", "кредит ставка", {"ref": "2", "alias_refs": ["9"]})
+    idx.add("a", "ставка", {"ref": "1"})  # replace
+    assert "досрочно" not in idx.postings
+    assert set(idx.by_ref) == {"1", "2", "9"}
+    idx.remove("b")
+    idx.remove("missing")
+    assert len(idx) == 1 and set(idx.postings) == {"ставка"}
+    assert idx._total_len == 1 and set(idx.by_ref) == {"1"}
+
+def test_search_many_memo_follows_kb_changes(tmp_db, monkeypatch):
+    monkeypatch.setenv("RAG_SEMANTIC_WEIGHT", "0")
+    db.upsert_kb_docs([_kb("k1", "комиссия за досрочное погашение"), _kb("k2", "процентная ставка")])
+    li = LawIndex(refresh_sec=0)
+    qs = ["досрочное погашение", "ставка", "досрочное погашение"]
+    first = li.search_many(qs, top_k=2)
+    assert first == [li.search(q, top_k=2) for q in qs]
+    assert first[0][0]["ref"] == "k1" and first[1][0]["ref"] == "k2"
+    version, memo = li.version, len(li._memo)
+    first[0][0]["ref"] = "mutated"  # callers get copies
+    assert li.search("досрочное погашение", top_k=2)[0]["ref"] == "k1"
+    assert (li.version, len(li._memo)) == (version, memo)
+
+    db.upsert_kb_docs([_kb("k3", "досрочное погашение досрочное погашение без комиссии")])
+    assert li.search("досрочное погашение", top_k=2)[0]["ref"] == "k3"
+    assert li.version == version + 1
+    db.delete_kb_doc("k3")
+    assert li.search("досрочное погашение", top_k=2)[0]["ref"] == "k1"
+
+def test_citations_use_vector_store_for_unshared_wording(rag, monkeypatch):
+    db.upsert_kb_docs([_kb("x-early", "Досрочное погашение кредита допускается без комиссий и штрафов"),
+                       _kb("a-other", "Банк раскрывает эффективную процентную ставку до подписания")])
+    rag.rebuild_index_if_needed()  # the refresher's job; LawIndex only reads the store
+    # no BM25 token in common with "early": only the embedding can rank it above the ref-order padding
+    q = "досрочного погашении"
+    monkeypatch.setenv("RAG_SEMANTIC_WEIGHT", "0")
+    bm25_only = LawIndex(refresh_sec=0).search(q, top_k=1)
+    monkeypatch.setenv("RAG_SEMANTIC_WEIGHT", "0.3")
+    hybrid = LawIndex(refresh_sec=0).search(q, top_k=1)
+    assert bm25_only[0]["ref"] != "x-early"
+    assert hybrid[0]["ref"] == "x-early"
+    assert 0 < hybrid[0]["score"] < 0.5
+
+def test_refresh_never_embeds_and_picks_up_new_generations(rag, monkeypatch):
+    db.upsert_kb_docs([_kb("a-other", "Банк раскрывает эффективную процентную ставку до подписания")])
+    rag.rebuild_index_if_needed()
+    real = rag.rebuild_index_if_needed
+    monkeypatch.setattr(rag, "rebuild_index_if_needed", lambda *a, **kw: pytest.fail("embedded on the search path"))
+    monkeypatch.setattr(rag.vector_store(), "refresh_sec", 0)
+    li = LawIndex(refresh_sec=0)
+    q = "досрочного погашении"
+    assert li.search(q, top_k=1)[0]["ref"] == "a-other"
+
+    db.upsert_kb_docs([_kb("x-early", "Досрочное погашение кредита допускается без комиссий и штрафов")])
+    assert li.search(q, top_k=1)[0]["ref"] != "x-early"  # BM25 delta only: not embedded yet
+    version = li.version
+    real()  # what the background refresher does
+    assert li.search(q, top_k=1)[0]["ref"] == "x-early"
+    assert li.version == version + 1
+
+def _forget_vectorizer(rag):
+    # what a restarted process sees: only the persisted file
+    rag._vectorizer, rag._vectorizer_corpus, rag._tfidf_sig, rag._tfidf_ready, rag._store = None, None, None, False, None
+
+def test_seed_fit_is_not_persisted_and_refits_on_ingest(rag, tmp_path):
+    rag.warmup()  # fresh DB: fit on the seed corpus
+    assert not (tmp_path / "tfidf.joblib").exists()
+    seed_store = rag.vector_store().name
+
+    db.upsert_kb_docs([_kb(f"d{i}", f"Статья {i}. Заемщик вправе погасить кредит досрочно, уведомив банк за {i} дней")
+                       for i in range(20)])
+    assert rag.tfidf_stale()
+    assert rag.rebuild_index_if_needed()["embedded"] == 20
+    assert not rag.tfidf_stale()
+    assert (tmp_path / "tfidf.joblib").exists()
+    assert rag.vector_store().name != seed_store
+    assert not (tmp_path / "vectors" / seed_store).exists()
+    assert "погас" in rag._vectorizer.vocabulary_
+
+    _forget_vectorizer(rag)
+    assert not rag.tfidf_stale()  # loaded with its fingerprint, no refit
+    assert rag.rebuild_index_if_needed() == {"embedded": 0, "deleted": 0}
+
+    db.upsert_kb_docs([_kb("new", "Неустойка не может превышать процентную ставку по кредиту")])
+    store = rag.vector_store().name
+    assert not rag.tfidf_stale()  # 1 of 20 docs: embedded with the current vocabulary
+    assert rag.rebuild_index_if_needed() == {"embedded": 1, "deleted": 0}
+    assert rag.vector_store().name == store
+
+    rag.refit_tfidf()
+    assert rag.rebuild_index_if_needed()["embedded"] == 21
+    assert rag.search_kb("неустойка", top_k=1)[0]["doc_id"] == "new"
+
+def test_refit_waits_for_drift_past_the_threshold(rag, monkeypatch):
+    monkeypatch.setenv("RAG_TFIDF_REFIT_SHARE", "0.25")
+    db.upsert_kb_docs([_kb(f"d{i}", f"Статья {i}. Процентная ставка по кредиту номер {i}") for i in range(8)])
+    rag.rebuild_index_if_needed()
+    store = rag.vector_store().name
+    db.upsert_kb_docs([_kb("d0", "Статья 0. Изменённая редакция"), _kb("x1", "Новая статья")])
+    assert not rag.tfidf_stale()  # 2 of 8
+    assert rag.rebuild_index_if_needed() == {"embedded": 2, "deleted": 0}
+    db.delete_kb_doc("d1")
+    assert rag.tfidf_stale()  # 3 of 8
+    assert rag.rebuild_index_if_needed()["embedded"] == 8
+    assert rag.vector_store().name != store and not rag.tfidf_stale()
@@ -0,0 +1,71 @@
+# tests/test_scan.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.agent import scan
+from src.agent.storage import db
+
+@pytest.fixture
+def folder(tmp_db, tmp_path, monkeypatch):
+    root = tmp_path / "contracts"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.pdf").write_bytes(b"contract a")
+    (root / "sub" / "b.txt").write_bytes(b"contract b")
+    (root / "sub" / "copy-of-a.pdf").write_bytes(b"contract a")
+    (root / "notes.docx").write_bytes(b"not scanned")
+    (root / "~$lock.pdf").write_bytes(b"office lock file")
+    monkeypatch.setattr(scan, "worker_pool", lambda workers, nice: ThreadPoolExecutor(workers))
+    monkeypatch.setenv("SCAN_CHECKPOINT_EVERY", "1")
+    return root
+
+def _analyzer(monkeypatch, fail=(), stop_after=None):
+    calls = []
+
+    def analyze(path, goal):
+        if stop_after is not None and len(calls) >= stop_after:
+            raise KeyboardInterrupt
+        calls.append(path)
+        if any(path.endswith(f) for f in fail):
+            raise ValueError("unreadable scan")
+        return {"goal": goal, "flags": {"items": []}, "run_summary": {"timings_ms": {"ocr": 2.0, "policy": 1.0}}}
+
+    monkeypatch.setattr(scan, "analyze_file", analyze)
+    return calls
+
+def test_second_sweep_skips_analysed_files_without_rehashing(folder, monkeypatch):
+    calls = _analyzer(monkeypatch)
+    first = scan.scan_folder(str(folder), goal="sweep", workers=2)
+    assert sorted(p.rsplit("/", 1)[1] for p in calls) == ["a.pdf", "b.txt"]
+    assert (first["seen"], first["done"], first["skipped"], first["failed"]) == (3, 2, 1, 0)
+    assert first["stage_ms"] == {"ocr": 4.0, "policy": 2.0} and first["stage_ms_avg"] == {"ocr": 2.0, "policy": 1.0}
+    assert len(db.report_hashes("sweep")) == 2
+
+    monkeypatch.setattr(scan, "_sha256_file", lambda path: pytest.fail(f"re-hashed {path}"))
+    calls.clear()
+    again = scan.scan_folder(str(folder), goal="sweep", workers=2)
+    assert calls == [] and (again["skipped"], again["done"], again["status"]) == (3, 0, "done")
+    assert again["run_id"] != first["run_id"]
+
+def test_interrupted_sweep_resumes_its_run(folder, monkeypatch):
+    _analyzer(monkeypatch, stop_after=1)
+    with pytest.raises(KeyboardInterrupt):
+        scan.scan_folder(str(folder), goal="sweep", workers=1)
+    with db._conn() as c:
+        run = dict(c.execute("SELECT * FROM scan_runs").fetchone())
+    assert run["status"] == "interrupted" and run["files_done"] == 1
+
+    calls = _analyzer(monkeypatch)
+    res = scan.scan_folder(str(folder), goal="sweep", workers=1)
+    assert res["resumed"] and res["run_id"] == run["id"]
+    assert len(calls) == 1 and res["done"] == 1 and res["skipped"] == 2
+
+def test_failed_file_is_recorded_and_retried_next_sweep(folder, monkeypatch):
+    _analyzer(monkeypatch, fail=("b.txt",))
+    res = scan.scan_folder(str(folder), goal="sweep", workers=2)
+    assert (res["done"], res["failed"]) == (1, 1)
+    with db._conn() as c:
+        assert [r["status"] for r in c.execute("SELECT status FROM reports WHERE source LIKE '%b.txt'")] == ["error"]
+    calls = _analyzer(monkeypatch)
+    assert scan.scan_folder(str(folder), goal="sweep")["done"] == 1
+    assert [p.rsplit("/", 1)[1] for p in calls] == ["b.txt"]
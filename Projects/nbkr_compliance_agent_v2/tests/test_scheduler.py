@@ -0,0 +1,81 @@
+# tests/test_scheduler.py
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("apscheduler")
+
+from src.agent import scan
+from src.agent.scheduler import ScanScheduler, parse_trigger
+from src.agent.storage import db
+
+T0 = datetime(2026, 3, 4, 10, 30, tzinfo=timezone.utc)  # a Wednesday
+
+def _next(spec):
+    return parse_trigger(spec, timezone="UTC").get_next_fire_time(None, T0)
+
+def test_parse_trigger_semantics():
+    assert _next("0 2 * * *") == datetime(2026, 3, 5, 2, 0, tzinfo=timezone.utc)
+    assert _next("@nightly") == _next("daily") == _next("0 2 * * *")
+    assert _next("weekly") == datetime(2026, 3, 8, 2, 0, tzinfo=timezone.utc)
+    assert _next("*/15 * * * *") == datetime(2026, 3, 4, 10, 30, tzinfo=timezone.utc)
+    assert parse_trigger("every 6h").interval.total_seconds() == 6 * 3600
+    assert parse_trigger("30m").interval.total_seconds() == 1800
+    for bad in ("0 2 * *", "every 5 weeks", "sometimes"):
+        with pytest.raises(ValueError):
+            parse_trigger(bad)
+
+@pytest.fixture
+def sched(tmp_db, monkeypatch):
+    monkeypatch.setenv("SCHED_TIMEZONE", "UTC")
+    s = ScanScheduler()
+    yield s
+    if s._sched.running:
+        s.shutdown()
+
+def _jobs(s):
+    return {j.name: j.trigger for j in s._sched.get_jobs() if j.id.startswith("scan:")}
+
+def test_reload_follows_the_schedules_table(sched):
+    db.upsert_schedule("night", "/data/a", "0 2 * * *")
+    db.upsert_schedule("often", "/data/b", "every 2h", jitter_sec=0)
+    db.upsert_schedule("off", "/data/c", "daily", enabled=False)
+    db.upsert_schedule("broken", "/data/d", "when convenient")
+    assert sched.reload() == 2
+    assert set(_jobs(sched)) == {"night", "often"}
+    assert _jobs(sched)["night"].jitter == sched.default_jitter and _jobs(sched)["often"].jitter == 0
+
+    db.upsert_schedule("often", "/data/b", "every 4h", jitter_sec=0)
+    db.upsert_schedule("night", "/data/a", "0 2 * * *", enabled=False)
+    db.upsert_schedule("off", "/data/c", "daily")
+    assert sched.reload() == 2
+    assert set(_jobs(sched)) == {"often", "off"}
+    assert _jobs(sched)["often"].interval.total_seconds() == 4 * 3600
+
+def test_runs_are_claimed_and_recorded(sched, monkeypatch):
+    db.upsert_schedule("night", "/data/a", "daily", max_workers=3)
+    row = db.list_schedules()[0]
+    calls = []
+
+    def fake_scan(folder, workers):
+        calls.append((folder, workers))
+        assert not db.claim_schedule("night", sched.lease_sec)  # overlapping run is refused
+        return {"status": "done", "done": 40, "failed": 2, "files_per_sec": 4.2}
+
+    monkeypatch.setattr(scan, "scan_folder", fake_scan)
+    sched._run(row)
+    assert calls == [("/data/a", 3)]
+    after = db.list_schedules()[0]
+    assert after["running_since"] is None
+    assert (after["last_status"], after["last_files"], after["last_files_per_sec"]) == ("done", 42, 4.2)
+
+    assert db.claim_schedule("night", sched.lease_sec)  # held by another process
+    sched._run(row)
+    assert len(calls) == 1
+
+    db.finish_schedule_run("night", "done", 0, 0, 0, 0)
+    monkeypatch.setattr(scan, "scan_folder", lambda folder, workers: 1 / 0)
+    sched._run(row)
+    after = db.list_schedules()[0]
+    assert after["last_status"] == "error" and after["last_error"].startswith("ZeroDivisionError")
+    assert after["running_since"] is None